@@ -166,6 +166,28 @@ export class Web3WorkshopParametersStack extends cdk.Stack {
       parameterName: '/web3/rpc_endpoint_counterfactual',
     });
 
+    // counterfactual account address calculation: rpc (EntryPoint.getSenderAddress), offline (CREATE2) or verify
+    new ssm.StringParameter(this, 'aaAddressModeSSMParameter', {
+      stringValue: 'rpc',
+      parameterName: '/web3/aa/address_mode',
+    });
+
+    new ssm.StringParameter(this, 'aaAccountSaltSSMParameter', {
+      stringValue: '0',
+      parameterName: '/web3/aa/account_salt',
+    });
+
+    // SimpleAccountFactory.accountImplementation() and type(ERC1967Proxy).creationCode, required for offline mode
+    new ssm.StringParameter(this, 'aaAccountImplementationAddressSSMParameter', {
+      stringValue: 'none',
+      parameterName: '/web3/aa/account_implementation_address',
+    });
+
+    new ssm.StringParameter(this, 'aaAccountProxyCreationCodeSSMParameter', {
+      stringValue: 'none',
+      parameterName: '/web3/aa/account_proxy_creation_code',
+    });
+
     new ssm.StringParameter(this, 'alchemyPolicyIdTestnetSSMParameter', {
       stringValue: alchemyPolicyId.valueAsString,
       parameterName: '/web3/aa/alchemy_testnet_policy_id',
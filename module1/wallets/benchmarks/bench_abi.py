@@ -0,0 +1,123 @@
+#  Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#  SPDX-License-Identifier: MIT-0
+"""
+import-time and per-call benchmark for the precompiled ABI tables of the AA processing Lambda
+
+compares building web3 contract objects from aa_abi.py with encoding and decoding via aa_abi_compiled.py, import
+times are measured in fresh interpreters to include module loading
+
+usage: python benchmarks/bench_abi.py [--iterations 5000] [--imports 5]
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+import timeit
+
+AA_PROCESSING_DIR = os.path.join(
+    os.path.dirname(__file__), "..", "lib", "lambda", "aa_processing"
+)
+sys.path.insert(0, AA_PROCESSING_DIR)
+
+import web3  # noqa: E402
+from eth_abi import decode, encode  # noqa: E402
+
+from aa_abi import ACCOUNT_FACTORY_ABI, ENTRYPOINT_ABI  # noqa: E402
+from aa_abi_compiled import (  # noqa: E402
+    ACCOUNT_FACTORY_FUNCTIONS,
+    ENTRYPOINT_FUNCTIONS,
+    ERRORS_BY_SELECTOR,
+)
+
+ENTRYPOINT_ADDRESS = "0x5FF137D4b0FDCD49DcA30c7CF57E578a026d2789"
+OWNER = "0x8ABB13360b87Be5EEb1B98647A016adD927a136c"
+REVERT_DATA = (
+    "0x6ca7b8060000000000000000000000007bc12c4d795e513e7c86a720fc577d22b587be05"
+)
+
+IMPORT_STATEMENTS = {
+    "aa_abi + contracts": "import web3; from aa_abi import ENTRYPOINT_ABI, ACCOUNT_FACTORY_ABI; "
+    "w3 = web3.Web3(); w3.eth.contract(abi=ENTRYPOINT_ABI); w3.eth.contract(abi=ACCOUNT_FACTORY_ABI)",
+    "aa_abi_compiled": "import eth_abi; import aa_abi_compiled",
+}
+
+
+def measure_import(statement: str) -> float:
+    script = (
+        "import time; start = time.perf_counter(); "
+        f"{statement}; print(time.perf_counter() - start)"
+    )
+    output = subprocess.check_output(
+        [sys.executable, "-W", "ignore", "-c", script], cwd=AA_PROCESSING_DIR
+    )
+    return float(output)
+
+
+def contract_init_code() -> bytes:
+    contract = web3.Web3().eth.contract(abi=ACCOUNT_FACTORY_ABI)
+    return web3.Web3.to_bytes(
+        hexstr=contract.encodeABI(fn_name="createAccount", args=[OWNER, 0])
+    )
+
+
+def compiled_init_code() -> bytes:
+    selector, input_types = ACCOUNT_FACTORY_FUNCTIONS["createAccount"]
+    return selector + encode(input_types, [OWNER, 0])
+
+
+def contract_sender_calldata(init_code: bytes) -> str:
+    contract = web3.Web3().eth.contract(address=ENTRYPOINT_ADDRESS, abi=ENTRYPOINT_ABI)
+    return contract.encodeABI(fn_name="getSenderAddress", args=[init_code])
+
+
+def compiled_sender_calldata(init_code: bytes) -> bytes:
+    selector, input_types = ENTRYPOINT_FUNCTIONS["getSenderAddress"]
+    return selector + encode(input_types, [init_code])
+
+
+def sliced_revert_address() -> str:
+    return web3.Web3.to_checksum_address(REVERT_DATA[34:])
+
+
+def decoded_revert_address() -> str:
+    data = web3.Web3.to_bytes(hexstr=REVERT_DATA)
+    _, input_types = ERRORS_BY_SELECTOR[data[:4]]
+    return web3.Web3.to_checksum_address(decode(input_types, data[4:])[0])
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--iterations", type=int, default=5000)
+    parser.add_argument("--imports", type=int, default=5)
+    args = parser.parse_args()
+
+    init_code = compiled_init_code()
+    assert contract_init_code() == init_code
+    assert web3.Web3.to_bytes(
+        hexstr=contract_sender_calldata(init_code)
+    ) == compiled_sender_calldata(init_code)
+    assert sliced_revert_address() == decoded_revert_address()
+
+    print(f"{'import':<26}{'ms':>10}")
+    for name, statement in IMPORT_STATEMENTS.items():
+        elapsed = min(measure_import(statement) for _ in range(args.imports))
+        print(f"{name:<26}{elapsed * 1000:>10.1f}")
+
+    print()
+    print(f"{'call':<26}{'us/op':>10}{'ops/s':>12}")
+    for name, fn in (
+        ("createAccount contract", contract_init_code),
+        ("createAccount compiled", compiled_init_code),
+        ("getSender contract", lambda: contract_sender_calldata(init_code)),
+        ("getSender compiled", lambda: compiled_sender_calldata(init_code)),
+        ("revert data sliced", sliced_revert_address),
+        ("revert data decoded", decoded_revert_address),
+    ):
+        elapsed = min(timeit.repeat(fn, number=args.iterations, repeat=3))
+        per_op = elapsed / args.iterations
+        print(f"{name:<26}{per_op * 1e6:>10.2f}{1 / per_op:>12.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,151 @@
+#  Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#  SPDX-License-Identifier: MIT-0
+"""
+throughput of the account address backfill job against an in-memory DynamoDB stand-in
+
+the stand-in supports segmented Scan and BatchWriteItem with configurable per-call latency and a fraction of
+unprocessed items per batch, run it with different segment and worker counts to size the job for a table
+
+usage: python benchmarks/bench_backfill.py [--items 20000] [--segments 8] [--workers 4]
+"""
+
+import argparse
+import hashlib
+import os
+import random
+import sys
+import threading
+import time
+
+sys.path.insert(
+    0, os.path.join(os.path.dirname(__file__), "..", "lib", "lambda", "aa_processing")
+)
+sys.path.insert(
+    0, os.path.join(os.path.dirname(__file__), "..", "lib", "lambda", "web3_layer")
+)
+
+from eth_account import Account  # noqa: E402
+
+from backfill import run_backfill  # noqa: E402
+
+ACCOUNT_FACTORY_ADDRESS = "0x9406Cc6185a346906296840746125a0E44976454"
+ENTRYPOINT_ADDRESS = "0x5FF137D4b0FDCD49DcA30c7CF57E578a026d2789"
+
+
+class FakeDynamoDBClient:
+    def __init__(self, items: list, latency: float, unprocessed_ratio: float) -> None:
+        self.latency = latency
+        self.unprocessed_ratio = unprocessed_ratio
+        self.items = {item["key_id"]["S"]: item for item in items}
+        self.scan_calls = 0
+        self.batch_write_calls = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def segment_of(key_id: str, total_segments: int) -> int:
+        return int(hashlib.md5(key_id.encode()).hexdigest(), 16) % total_segments
+
+    def scan(
+        self,
+        TableName: str,
+        Segment: int,
+        TotalSegments: int,
+        Limit: int,
+        ExclusiveStartKey: dict = None,
+    ) -> dict:
+        time.sleep(self.latency)
+        with self._lock:
+            self.scan_calls += 1
+            key_ids = sorted(
+                key_id
+                for key_id in self.items
+                if self.segment_of(key_id, TotalSegments) == Segment
+            )
+
+        if ExclusiveStartKey:
+            key_ids = [
+                key_id
+                for key_id in key_ids
+                if key_id > ExclusiveStartKey["key_id"]["S"]
+            ]
+
+        page = key_ids[:Limit]
+        response = {"Items": [dict(self.items[key_id]) for key_id in page]}
+        if len(key_ids) > Limit:
+            response["LastEvaluatedKey"] = {"key_id": {"S": page[-1]}}
+
+        return response
+
+    def batch_write_item(self, RequestItems: dict) -> dict:
+        time.sleep(self.latency)
+        unprocessed = {}
+        with self._lock:
+            self.batch_write_calls += 1
+            for table_name, requests in RequestItems.items():
+                for request in requests:
+                    if random.random() < self.unprocessed_ratio:
+                        unprocessed.setdefault(table_name, []).append(request)
+                        continue
+                    item = request["PutRequest"]["Item"]
+                    self.items[item["key_id"]["S"]] = item
+
+        return {"UnprocessedItems": unprocessed}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--items", type=int, default=20000)
+    parser.add_argument("--segments", type=int, default=8)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--page-size", type=int, default=1000)
+    parser.add_argument("--latency", type=float, default=0.01)
+    parser.add_argument("--unprocessed-ratio", type=float, default=0.02)
+    args = parser.parse_args()
+
+    owners = [Account.create().address for _ in range(min(args.items, 1000))]
+    items = [
+        {
+            "key_id": {"S": f"key-{i:08d}"},
+            "ciphertext": {"S": "AQICAHg..."},
+            "address": {"S": owners[i % len(owners)]},
+        }
+        for i in range(args.items)
+    ]
+    client = FakeDynamoDBClient(items, args.latency, args.unprocessed_ratio)
+
+    account_parameters = {
+        "factory": ACCOUNT_FACTORY_ADDRESS,
+        "implementation": Account.create().address,
+        "proxy_creation_code": os.urandom(1142),
+        "salt": 0,
+        "address_inputs": {
+            "account_factory": ACCOUNT_FACTORY_ADDRESS,
+            "account_entrypoint": ENTRYPOINT_ADDRESS,
+            "account_salt": "0",
+        },
+    }
+
+    result = run_backfill(
+        client,
+        "kmsKeyTable",
+        account_parameters,
+        total_segments=args.segments,
+        workers=args.workers,
+        page_size=args.page_size,
+    )
+    assert all("account" in item for item in client.items.values())
+
+    print(
+        f"{'segments':<12}{'scanned':>10}{'updated':>10}{'seconds':>10}{'items/s':>10}"
+    )
+    print(
+        f"{result['segments']:<12}{result['scanned']:>10}{result['updated']:>10}"
+        f"{result['elapsed_seconds']:>10.2f}{result['items_per_second']:>10.0f}"
+    )
+    print(
+        f"scan calls: {client.scan_calls}, batch write calls: {client.batch_write_calls}"
+    )
+
+
+if __name__ == "__main__":
+    main()
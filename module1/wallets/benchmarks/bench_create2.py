@@ -0,0 +1,58 @@
+#  Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#  SPDX-License-Identifier: MIT-0
+"""
+micro-benchmark for the local CREATE2 counterfactual account address computation
+
+reports addresses per second for compute_account_address, the proxy creation code is random data of the size of
+type(ERC1967Proxy).creationCode since only its length affects the keccak cost
+
+usage: python benchmarks/bench_create2.py [--iterations 20000] [--creation-code-size 1142]
+"""
+
+import argparse
+import os
+import sys
+import timeit
+
+sys.path.insert(
+    0, os.path.join(os.path.dirname(__file__), "..", "lib", "lambda", "aa_processing")
+)
+
+from eth_account import Account  # noqa: E402
+
+from counterfactual import compute_account_address  # noqa: E402
+
+ACCOUNT_FACTORY_ADDRESS = "0x9406Cc6185a346906296840746125a0E44976454"
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--iterations", type=int, default=20000)
+    parser.add_argument("--creation-code-size", type=int, default=1142)
+    args = parser.parse_args()
+
+    proxy_creation_code = os.urandom(args.creation_code_size)
+    account_implementation = Account.create().address
+    owners = [Account.create().address for _ in range(1024)]
+
+    def compute(i: int = 0) -> str:
+        return compute_account_address(
+            factory=ACCOUNT_FACTORY_ADDRESS,
+            account_implementation=account_implementation,
+            proxy_creation_code=proxy_creation_code,
+            owner=owners[i % len(owners)],
+            salt=0,
+        )
+
+    counter = iter(range(1 << 62))
+    elapsed = min(
+        timeit.repeat(lambda: compute(next(counter)), number=args.iterations, repeat=3)
+    )
+    per_op = elapsed / args.iterations
+
+    print(f"{'operation':<26}{'us/op':>10}{'addresses/s':>14}")
+    print(f"{'compute_account_address':<26}{per_op * 1e6:>10.2f}{1 / per_op:>14.0f}")
+
+
+if __name__ == "__main__":
+    main()
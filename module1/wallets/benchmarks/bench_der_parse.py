@@ -0,0 +1,66 @@
+#  Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#  SPDX-License-Identifier: MIT-0
+"""
+micro-benchmark for decoding KMS ECC_SECG_P256K1 private keys (DER encoded PKCS#8) into signing accounts
+
+compares the direct DER-to-scalar fast path with the ecdsa SigningKey based path, both including Account.from_key
+
+usage: python benchmarks/bench_der_parse.py [--iterations 20000]
+"""
+
+import argparse
+import os
+import sys
+import timeit
+
+sys.path.insert(
+    0,
+    os.path.join(os.path.dirname(__file__), "..", "lib", "lambda", "userop_tx_signing"),
+)
+# shared modules of the web3 layer
+sys.path.insert(
+    0, os.path.join(os.path.dirname(__file__), "..", "lib", "lambda", "web3_layer")
+)
+os.environ.setdefault("AWS_DEFAULT_REGION", "us-east-1")
+
+from ecdsa import SigningKey, SECP256k1  # noqa: E402
+from eth_account import Account  # noqa: E402
+
+import lambda_function  # noqa: E402
+
+
+def ecdsa_path(key_der: bytes) -> Account:
+    key = SigningKey.from_der(key_der)
+    if key.curve.curve != SECP256k1.curve:
+        raise Exception("unexpected curve")
+    return Account.from_key(key.to_string().hex())
+
+
+def fast_path(key_der: bytes) -> Account:
+    return Account.from_key(lambda_function.extract_secp256k1_private_key(key_der))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--iterations", type=int, default=20000)
+    args = parser.parse_args()
+
+    key_der = SigningKey.generate(curve=SECP256k1).to_der(format="pkcs8")
+    assert ecdsa_path(key_der).address == fast_path(key_der).address
+
+    print(f"{'path':<22}{'us/op':>10}{'ops/s':>12}")
+    for name, fn in (
+        ("ecdsa SigningKey", lambda: ecdsa_path(key_der)),
+        ("direct DER scalar", lambda: fast_path(key_der)),
+        (
+            "DER scalar only",
+            lambda: lambda_function.extract_secp256k1_private_key(key_der),
+        ),
+    ):
+        elapsed = min(timeit.repeat(fn, number=args.iterations, repeat=3))
+        per_op = elapsed / args.iterations
+        print(f"{name:<22}{per_op * 1e6:>10.2f}{1 / per_op:>12.0f}")
+
+
+if __name__ == "__main__":
+    main()
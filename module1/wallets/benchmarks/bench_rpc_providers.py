@@ -0,0 +1,112 @@
+#  Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#  SPDX-License-Identifier: MIT-0
+"""
+benchmark for the pooled RPC provider registry of the web3 layer
+
+starts local JSON-RPC stand-ins (eth_chainId) with configurable latency and compares a new web3.HTTPProvider per
+request with the cached failover provider, followed by a run with a slow primary endpoint with and without hedging,
+per-endpoint metrics of the registry are printed at the end
+
+usage: python benchmarks/bench_rpc_providers.py [--requests 300] [--latency 0.002] [--slow-latency 0.05]
+"""
+
+import argparse
+import json
+import os
+import socket
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(
+    0, os.path.join(os.path.dirname(__file__), "..", "lib", "lambda", "web3_layer")
+)
+
+import web3  # noqa: E402
+
+import rpc_providers  # noqa: E402
+
+
+def start_rpc_stub(latency: float) -> str:
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def setup(self) -> None:
+            super().setup()
+            self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+        def do_POST(self) -> None:
+            request = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+            time.sleep(latency)
+            body = json.dumps(
+                {"jsonrpc": "2.0", "id": request["id"], "result": "0xaa36a7"}
+            ).encode()
+            # headers and body in a single write, keep-alive connections would otherwise stall on delayed ACKs
+            self.wfile.write(
+                b"HTTP/1.1 200 OK\r\nContent-Type: application/json\r\n"
+                + f"Content-Length: {len(body)}\r\n\r\n".encode()
+                + body
+            )
+
+        def log_message(self, *args) -> None:
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    return f"http://127.0.0.1:{server.server_address[1]}"
+
+
+def run(name: str, requests: int, get_w3) -> None:
+    start = time.perf_counter()
+    for _ in range(requests):
+        assert get_w3().eth.chain_id == 11155111
+    elapsed = time.perf_counter() - start
+    print(f"{name:<34}{elapsed / requests * 1000:>10.3f}{requests / elapsed:>10.0f}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=300)
+    parser.add_argument("--latency", type=float, default=0.002)
+    parser.add_argument("--slow-latency", type=float, default=0.05)
+    parser.add_argument("--hedge-after-ms", type=float, default=10)
+    args = parser.parse_args()
+
+    fast_endpoint = start_rpc_stub(args.latency)
+    slow_endpoint = start_rpc_stub(args.slow_latency)
+
+    print(f"{'provider':<34}{'ms/req':>10}{'req/s':>10}")
+    run(
+        "new HTTPProvider per request",
+        args.requests,
+        lambda: web3.Web3(web3.HTTPProvider(fast_endpoint)),
+    )
+    run("registry", args.requests, lambda: rpc_providers.get_web3(fast_endpoint))
+
+    # the slow endpoint is configured first and only demoted once its score is known
+    endpoints = f"{slow_endpoint},{fast_endpoint}"
+    run(
+        "registry slow primary",
+        args.requests,
+        lambda: rpc_providers.get_web3(endpoints),
+    )
+
+    os.environ["RPC_HEDGE_AFTER_MS"] = str(args.hedge_after_ms)
+    hedged_endpoints = f"{slow_endpoint}, {fast_endpoint}"
+    provider = rpc_providers.get_web3(hedged_endpoints).provider
+    # pin the slow endpoint as primary to measure hedging instead of the scoring
+    provider.ranked_endpoints = lambda: list(provider.endpoints)
+    run(
+        f"registry slow primary, hedge {args.hedge_after_ms:g}ms",
+        args.requests,
+        lambda: rpc_providers.get_web3(hedged_endpoints),
+    )
+
+    print()
+    print(json.dumps(rpc_providers.endpoint_metrics(), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+#  Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#  SPDX-License-Identifier: MIT-0
+"""
+throughput benchmark for the secp256k1 signing backends of the userop/tx signing Lambda
+
+measures signatures per second (signHash) and public key recoveries per second for every available backend, use
+the numbers to size signing concurrency
+
+usage: python benchmarks/bench_signing_backends.py [--iterations 2000]
+"""
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(
+    0,
+    os.path.join(os.path.dirname(__file__), "..", "lib", "lambda", "userop_tx_signing"),
+)
+
+from eth_account import Account  # noqa: E402
+from eth_keys.backends.coincurve import is_coincurve_available  # noqa: E402
+from eth_utils import keccak  # noqa: E402
+
+from signing_backend import SIGNING_BACKENDS, configure_signing_backend  # noqa: E402
+
+
+def run(backend_name: str, iterations: int) -> dict:
+    configure_signing_backend(backend_name)
+    account = Account.from_key(keccak(text="web3workshop benchmark key"))
+    hashes = [keccak(i.to_bytes(32, "big")) for i in range(iterations)]
+
+    start = time.perf_counter()
+    signatures = [account.signHash(msg_hash) for msg_hash in hashes]
+    sign_elapsed = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for msg_hash, signature in zip(hashes, signatures):
+        recovered = Account._recover_hash(
+            message_hash=msg_hash, vrs=(signature.v, signature.r, signature.s)
+        )
+    recover_elapsed = time.perf_counter() - start
+    assert recovered == account.address
+
+    return {
+        "sign_per_s": iterations / sign_elapsed,
+        "recover_per_s": iterations / recover_elapsed,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--iterations", type=int, default=2000)
+    args = parser.parse_args()
+
+    print(f"{'backend':<10}{'sign/s':>12}{'recover/s':>12}")
+    for backend_name in SIGNING_BACKENDS:
+        if backend_name == "native" and not is_coincurve_available():
+            print(f"{backend_name:<10}{'n/a (coincurve not installed)':>24}")
+            continue
+
+        result = run(backend_name, args.iterations)
+        print(
+            f"{backend_name:<10}{result['sign_per_s']:>12.0f}{result['recover_per_s']:>12.0f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+#  Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#  SPDX-License-Identifier: MIT-0
+"""
+per-stage latency report for the userop/tx signing Lambda
+
+invokes lambda_handler with stubbed SSM, DynamoDB and KMS clients in local metrics mode and prints p50/p95/p99 per
+signing stage, use it to compare changes to the signing path offline
+
+usage: python benchmarks/bench_signing_stages.py [--requests 200] [--keys 10] [--cache-ttl 0]
+"""
+
+import argparse
+import base64
+import contextlib
+import io
+import os
+import sys
+import time
+
+sys.path.insert(
+    0,
+    os.path.join(os.path.dirname(__file__), "..", "lib", "lambda", "userop_tx_signing"),
+)
+# shared modules of the web3 layer
+sys.path.insert(
+    0, os.path.join(os.path.dirname(__file__), "..", "lib", "lambda", "web3_layer")
+)
+os.environ.setdefault("AWS_DEFAULT_REGION", "us-east-1")
+os.environ["SIGNING_METRICS_MODE"] = "local"
+# every request of the run repeats the same payload per key - measure the signing path, not idempotent replays
+os.environ["POWERTOOLS_IDEMPOTENCY_DISABLED"] = "1"
+os.environ.update(
+    {
+        "KMS_KEY_TABLE": "kmsKeyTable",
+        "KMS_KEY_ID": "kmsKeyId",
+        "LOG_LEVEL_SSM_PARAM": "/app/log_level",
+        "RPC_ENDPOINT_SSM_PARAM": "/web3/rpc_endpoint_counterfactual",
+    }
+)
+
+from ecdsa import SigningKey, SECP256k1  # noqa: E402
+
+USEROP_HASH = "5033589a303c005b7e7818f4bf00e7361335f51f648be16c028951f90a1585d4"
+
+
+class StubSSMClient:
+    def __init__(self, latency: float) -> None:
+        self.latency = latency
+
+    def get_parameter(self, Name: str) -> dict:
+        time.sleep(self.latency)
+        return {"Parameter": {"Value": "WARNING"}}
+
+
+class StubDynamoDBClient:
+    def __init__(self, latency: float, keys: dict) -> None:
+        self.latency = latency
+        self.keys = keys
+
+    def get_item(self, TableName: str, Key: dict) -> dict:
+        time.sleep(self.latency)
+        key_der = self.keys[Key["key_id"]["S"]]
+        return {
+            "Item": {
+                "ciphertext": {"S": base64.standard_b64encode(key_der).decode()},
+                "address": {"S": "0x0000000000000000000000000000000000000000"},
+            }
+        }
+
+
+class StubKMSClient:
+    def __init__(self, latency: float) -> None:
+        self.latency = latency
+
+    def decrypt(
+        self, KeyId: str, CiphertextBlob: bytes, EncryptionContext: dict
+    ) -> dict:
+        time.sleep(self.latency)
+        return {"Plaintext": CiphertextBlob}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--keys", type=int, default=10)
+    parser.add_argument("--cache-ttl", type=float, default=0)
+    parser.add_argument("--ssm-latency", type=float, default=0.005)
+    parser.add_argument("--ddb-latency", type=float, default=0.008)
+    parser.add_argument("--kms-latency", type=float, default=0.015)
+    args = parser.parse_args()
+
+    os.environ["SIGNING_ACCOUNT_CACHE_TTL_SECONDS"] = str(args.cache_ttl)
+    os.environ["SIGNING_ACCOUNT_CACHE_MAX_ENTRIES"] = str(args.keys)
+
+    import lambda_function
+    import stage_metrics
+
+    keys = {
+        f"key-{i}": SigningKey.generate(curve=SECP256k1).to_der(format="pkcs8")
+        for i in range(args.keys)
+    }
+    lambda_function.client_ssm = StubSSMClient(args.ssm_latency)
+    lambda_function.client_ddb = StubDynamoDBClient(args.ddb_latency, keys)
+    lambda_function.client_kms = StubKMSClient(args.kms_latency)
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        for i in range(args.requests):
+            lambda_function.lambda_handler(
+                {
+                    "operation": "sign_userop",
+                    "userop_hash": USEROP_HASH,
+                    "key_id": f"key-{i % args.keys}",
+                    "sub": "sub",
+                },
+                None,
+            )
+
+    print(stage_metrics.aggregator.format_report())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,135 @@
+#  Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#  SPDX-License-Identifier: MIT-0
+"""
+stress benchmark for single-flight coalescing of key decrypts in the userop/tx signing Lambda
+
+runs bursts of concurrent signing requests against stubbed DynamoDB and KMS clients with simulated latency and
+compares the number of get_item/decrypt calls with and without single-flight coalescing (account cache disabled)
+
+usage: python benchmarks/bench_single_flight.py [--threads 64] [--keys 4] [--requests 512]
+"""
+
+import argparse
+import base64
+import contextlib
+import io
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(
+    0,
+    os.path.join(os.path.dirname(__file__), "..", "lib", "lambda", "userop_tx_signing"),
+)
+# shared modules of the web3 layer
+sys.path.insert(
+    0, os.path.join(os.path.dirname(__file__), "..", "lib", "lambda", "web3_layer")
+)
+os.environ.setdefault("AWS_DEFAULT_REGION", "us-east-1")
+os.environ["SIGNING_ACCOUNT_CACHE_TTL_SECONDS"] = "0"
+
+from ecdsa import SigningKey, SECP256k1  # noqa: E402
+
+import lambda_function  # noqa: E402
+from single_flight import SingleFlight  # noqa: E402
+
+USEROP_HASH = "5033589a303c005b7e7818f4bf00e7361335f51f648be16c028951f90a1585d4"
+
+
+class StubDynamoDBClient:
+    def __init__(self, latency: float, keys: dict) -> None:
+        self.latency = latency
+        self.keys = keys
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def get_item(self, TableName: str, Key: dict) -> dict:
+        with self._lock:
+            self.calls += 1
+        time.sleep(self.latency)
+        key_der = self.keys[Key["key_id"]["S"]]
+        return {
+            "Item": {
+                "ciphertext": {"S": base64.standard_b64encode(key_der).decode()},
+                "address": {"S": "0x0000000000000000000000000000000000000000"},
+            }
+        }
+
+
+class StubKMSClient:
+    def __init__(self, latency: float) -> None:
+        self.latency = latency
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def decrypt(
+        self, KeyId: str, CiphertextBlob: bytes, EncryptionContext: dict
+    ) -> dict:
+        with self._lock:
+            self.calls += 1
+        time.sleep(self.latency)
+        # stub "ciphertext" is the plaintext DER key
+        return {"Plaintext": CiphertextBlob}
+
+
+def run(args: argparse.Namespace, coalesce: bool) -> dict:
+    keys = {
+        f"key-{i}": SigningKey.generate(curve=SECP256k1).to_der(format="pkcs8")
+        for i in range(args.keys)
+    }
+    ddb = StubDynamoDBClient(args.ddb_latency, keys)
+    kms = StubKMSClient(args.kms_latency)
+    lambda_function.client_ddb = ddb
+    lambda_function.client_kms = kms
+    lambda_function.key_loads = SingleFlight()
+
+    if not coalesce:
+        provide = lambda_function.load_signing_account
+    else:
+        provide = lambda_function.provide_signing_account
+
+    def sign(i: int) -> str:
+        account = provide(f"key-{i % args.keys}", "sub")
+        return account.signHash(USEROP_HASH).signature.hex()
+
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        with ThreadPoolExecutor(max_workers=args.threads) as executor:
+            list(executor.map(sign, range(args.requests)))
+    elapsed = time.perf_counter() - start
+
+    return {
+        "get_item": ddb.calls,
+        "decrypt": kms.calls,
+        "elapsed_s": elapsed,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--threads", type=int, default=64)
+    parser.add_argument("--keys", type=int, default=4)
+    parser.add_argument("--requests", type=int, default=512)
+    parser.add_argument("--ddb-latency", type=float, default=0.010)
+    parser.add_argument("--kms-latency", type=float, default=0.020)
+    args = parser.parse_args()
+
+    baseline = run(args, coalesce=False)
+    coalesced = run(args, coalesce=True)
+
+    print(
+        f"{args.requests} requests, {args.threads} threads, {args.keys} distinct keys"
+    )
+    print(f"{'mode':<16}{'get_item':>10}{'decrypt':>10}{'elapsed_s':>12}")
+    for name, result in (("per-request", baseline), ("single-flight", coalesced)):
+        print(
+            f"{name:<16}{result['get_item']:>10}{result['decrypt']:>10}{result['elapsed_s']:>12.3f}"
+        )
+    saved = baseline["decrypt"] - coalesced["decrypt"]
+    print(f"decrypt calls saved: {saved} ({saved / baseline['decrypt'] * 100:.1f}%)")
+
+
+if __name__ == "__main__":
+    main()
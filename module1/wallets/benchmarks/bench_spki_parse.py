@@ -0,0 +1,117 @@
+#  Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#  SPDX-License-Identifier: MIT-0
+"""
+benchmark for deriving Ethereum addresses from KMS ECC_SECG_P256K1 public keys (DER encoded SubjectPublicKeyInfo)
+
+compares the previous implementation (asn1tools grammar compiled per call, keccak via web3.auto) with the fixed-layout
+SPKI fast path and the compiled-once asn1tools fallback of the key management Lambda, and the cold import time of
+the dependencies of both implementations (fresh interpreter per sample)
+
+usage: python benchmarks/bench_spki_parse.py [--iterations 20000] [--import-samples 5]
+"""
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import timeit
+
+LAMBDA_DIR = os.path.join(
+    os.path.dirname(__file__), "..", "lib", "lambda", "kms_key_management"
+)
+sys.path.insert(0, LAMBDA_DIR)
+os.environ.setdefault("AWS_DEFAULT_REGION", "us-east-1")
+
+import asn1tools  # noqa: E402
+from ecdsa import SECP256k1, SigningKey  # noqa: E402
+from web3.auto import w3  # noqa: E402
+
+import lambda_function  # noqa: E402
+
+
+def previous_calc_eth_address(pub_key: bytes) -> str:
+    key = asn1tools.compile_string(lambda_function.SUBJECT_ASN)
+    key_decoded = key.decode("SubjectPublicKeyInfo", pub_key)
+
+    pub_key_raw = key_decoded["subjectPublicKey"][0]
+    pub_key = pub_key_raw[1 : len(pub_key_raw)]
+
+    hex_address = w3.keccak(bytes(pub_key)).hex()
+
+    return w3.to_checksum_address("0x{}".format(hex_address[-40:]))
+
+
+def fallback_calc_eth_address(pub_key: bytes) -> str:
+    # non-matching length forces the compiled-once asn1tools path, trailing byte is ignored by the decoder
+    return lambda_function.calc_eth_address(pub_key + b"\x00")
+
+
+def import_time_ms(statement: str, samples: int) -> float:
+    code = (
+        "import time; start = time.perf_counter(); "
+        f"{statement}; print((time.perf_counter() - start) * 1000)"
+    )
+    timings = [
+        float(
+            subprocess.run(
+                [sys.executable, "-c", code],
+                check=True,
+                capture_output=True,
+                text=True,
+                cwd=LAMBDA_DIR,
+            ).stdout
+        )
+        for _ in range(samples)
+    ]
+
+    return statistics.median(timings)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--iterations", type=int, default=20000)
+    parser.add_argument("--import-samples", type=int, default=5)
+    args = parser.parse_args()
+
+    pub_key = SigningKey.generate(curve=SECP256k1).get_verifying_key().to_der()
+    expected = previous_calc_eth_address(pub_key)
+    assert lambda_function.calc_eth_address(pub_key) == expected
+    assert fallback_calc_eth_address(pub_key) == expected
+
+    print(f"{'import':<40}{'ms':>10}")
+    for name, statement in (
+        (
+            "asn1tools + web3.auto (previous)",
+            "import asn1tools; from web3.auto import w3",
+        ),
+        ("eth_utils (current)", "from eth_utils import keccak, to_checksum_address"),
+    ):
+        print(f"{name:<40}{import_time_ms(statement, args.import_samples):>10.1f}")
+
+    print()
+    print(f"{'calc_eth_address':<40}{'us/op':>10}{'ops/s':>12}")
+    for name, fn, iterations in (
+        (
+            "compile per call (previous)",
+            lambda: previous_calc_eth_address(pub_key),
+            max(1, args.iterations // 100),
+        ),
+        (
+            "asn1tools compiled once (fallback)",
+            lambda: fallback_calc_eth_address(pub_key),
+            args.iterations,
+        ),
+        (
+            "SPKI fast path",
+            lambda: lambda_function.calc_eth_address(pub_key),
+            args.iterations,
+        ),
+    ):
+        elapsed = min(timeit.repeat(fn, number=iterations, repeat=3))
+        per_op = elapsed / iterations
+        print(f"{name:<40}{per_op * 1e6:>10.2f}{1 / per_op:>12.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,292 @@
+#  Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#  SPDX-License-Identifier: MIT-0
+# generated by scripts/compile_abi.py from aa_abi.py - do not edit
+
+# name: (selector, input types)
+ENTRYPOINT_FUNCTIONS = {
+    "SIG_VALIDATION_FAILED": (
+        bytes.fromhex("8f41ec5a"),
+        (),
+    ),
+    "_validateSenderAndPaymaster": (
+        bytes.fromhex("957122ab"),
+        ("bytes", "address", "bytes"),
+    ),
+    "addStake": (
+        bytes.fromhex("0396cb60"),
+        ("uint32",),
+    ),
+    "balanceOf": (
+        bytes.fromhex("70a08231"),
+        ("address",),
+    ),
+    "depositTo": (
+        bytes.fromhex("b760faf9"),
+        ("address",),
+    ),
+    "deposits": (
+        bytes.fromhex("fc7e286d"),
+        ("address",),
+    ),
+    "getDepositInfo": (
+        bytes.fromhex("5287ce12"),
+        ("address",),
+    ),
+    "getNonce": (
+        bytes.fromhex("35567e1a"),
+        ("address", "uint192"),
+    ),
+    "getSenderAddress": (
+        bytes.fromhex("9b249f69"),
+        ("bytes",),
+    ),
+    "getUserOpHash": (
+        bytes.fromhex("a6193531"),
+        (
+            "(address,uint256,bytes,bytes,uint256,uint256,uint256,uint256,uint256,bytes,bytes)",
+        ),
+    ),
+    "handleAggregatedOps": (
+        bytes.fromhex("4b1d7cf5"),
+        (
+            "((address,uint256,bytes,bytes,uint256,uint256,uint256,uint256,uint256,bytes,bytes)[],address,bytes)[]",
+            "address",
+        ),
+    ),
+    "handleOps": (
+        bytes.fromhex("1fad948c"),
+        (
+            "(address,uint256,bytes,bytes,uint256,uint256,uint256,uint256,uint256,bytes,bytes)[]",
+            "address",
+        ),
+    ),
+    "incrementNonce": (
+        bytes.fromhex("0bd28e3b"),
+        ("uint192",),
+    ),
+    "innerHandleOp": (
+        bytes.fromhex("1d732756"),
+        (
+            "bytes",
+            "((address,uint256,uint256,uint256,uint256,address,uint256,uint256),bytes32,uint256,uint256,uint256)",
+            "bytes",
+        ),
+    ),
+    "nonceSequenceNumber": (
+        bytes.fromhex("1b2e01b8"),
+        ("address", "uint192"),
+    ),
+    "simulateHandleOp": (
+        bytes.fromhex("d6383f94"),
+        (
+            "(address,uint256,bytes,bytes,uint256,uint256,uint256,uint256,uint256,bytes,bytes)",
+            "address",
+            "bytes",
+        ),
+    ),
+    "simulateValidation": (
+        bytes.fromhex("ee219423"),
+        (
+            "(address,uint256,bytes,bytes,uint256,uint256,uint256,uint256,uint256,bytes,bytes)",
+        ),
+    ),
+    "unlockStake": (
+        bytes.fromhex("bb9fe6bf"),
+        (),
+    ),
+    "withdrawStake": (
+        bytes.fromhex("c23a5cea"),
+        ("address",),
+    ),
+    "withdrawTo": (
+        bytes.fromhex("205c2878"),
+        ("address", "uint256"),
+    ),
+}
+
+# name: (selector, input types)
+ENTRYPOINT_ERRORS = {
+    "ExecutionResult": (
+        bytes.fromhex("8b7ac980"),
+        ("uint256", "uint256", "uint48", "uint48", "bool", "bytes"),
+    ),
+    "FailedOp": (
+        bytes.fromhex("220266b6"),
+        ("uint256", "string"),
+    ),
+    "SenderAddressResult": (
+        bytes.fromhex("6ca7b806"),
+        ("address",),
+    ),
+    "SignatureValidationFailed": (
+        bytes.fromhex("86a9f750"),
+        ("address",),
+    ),
+    "ValidationResult": (
+        bytes.fromhex("e0cff05f"),
+        (
+            "(uint256,uint256,bool,uint48,uint48,bytes)",
+            "(uint256,uint256)",
+            "(uint256,uint256)",
+            "(uint256,uint256)",
+        ),
+    ),
+    "ValidationResultWithAggregation": (
+        bytes.fromhex("faecb4e4"),
+        (
+            "(uint256,uint256,bool,uint48,uint48,bytes)",
+            "(uint256,uint256)",
+            "(uint256,uint256)",
+            "(uint256,uint256)",
+            "(address,(uint256,uint256))",
+        ),
+    ),
+}
+
+# name: (topic, input types)
+ENTRYPOINT_EVENTS = {
+    "AccountDeployed": (
+        bytes.fromhex(
+            "d51a9c61267aa6196961883ecf5ff2da6619c37dac0fa92122513fb32c032d2d"
+        ),
+        ("bytes32", "address", "address", "address"),
+    ),
+    "BeforeExecution": (
+        bytes.fromhex(
+            "bb47ee3e183a558b1a2ff0874b079f3fc5478b7454eacf2bfc5af2ff5878f972"
+        ),
+        (),
+    ),
+    "Deposited": (
+        bytes.fromhex(
+            "2da466a7b24304f47e87fa2e1e5a81b9831ce54fec19055ce277ca2f39ba42c4"
+        ),
+        ("address", "uint256"),
+    ),
+    "SignatureAggregatorChanged": (
+        bytes.fromhex(
+            "575ff3acadd5ab348fe1855e217e0f3678f8d767d7494c9f9fefbee2e17cca4d"
+        ),
+        ("address",),
+    ),
+    "StakeLocked": (
+        bytes.fromhex(
+            "a5ae833d0bb1dcd632d98a8b70973e8516812898e19bf27b70071ebc8dc52c01"
+        ),
+        ("address", "uint256", "uint256"),
+    ),
+    "StakeUnlocked": (
+        bytes.fromhex(
+            "fa9b3c14cc825c412c9ed81b3ba365a5b459439403f18829e572ed53a4180f0a"
+        ),
+        ("address", "uint256"),
+    ),
+    "StakeWithdrawn": (
+        bytes.fromhex(
+            "b7c918e0e249f999e965cafeb6c664271b3f4317d296461500e71da39f0cbda3"
+        ),
+        ("address", "address", "uint256"),
+    ),
+    "UserOperationEvent": (
+        bytes.fromhex(
+            "49628fd1471006c1482da88028e9ce4dbb080b815c9b0344d39e5a8e6ec1419f"
+        ),
+        ("bytes32", "address", "address", "uint256", "bool", "uint256", "uint256"),
+    ),
+    "UserOperationRevertReason": (
+        bytes.fromhex(
+            "1c4fada7374c0a9ee8841fc38afe82932dc0f8e69012e927f061a8bae611a201"
+        ),
+        ("bytes32", "address", "uint256", "bytes"),
+    ),
+    "Withdrawn": (
+        bytes.fromhex(
+            "d1c19fbcd4551a5edfb66d43d2e337c04837afda3482b42bdf569a8fccdae5fb"
+        ),
+        ("address", "address", "uint256"),
+    ),
+}
+
+# name: output types
+ENTRYPOINT_FUNCTION_OUTPUTS = {
+    "SIG_VALIDATION_FAILED": ("uint256",),
+    "_validateSenderAndPaymaster": (),
+    "addStake": (),
+    "balanceOf": ("uint256",),
+    "depositTo": (),
+    "deposits": ("uint112", "bool", "uint112", "uint32", "uint48"),
+    "getDepositInfo": ("(uint112,bool,uint112,uint32,uint48)",),
+    "getNonce": ("uint256",),
+    "getSenderAddress": (),
+    "getUserOpHash": ("bytes32",),
+    "handleAggregatedOps": (),
+    "handleOps": (),
+    "incrementNonce": (),
+    "innerHandleOp": ("uint256",),
+    "nonceSequenceNumber": ("uint256",),
+    "simulateHandleOp": (),
+    "simulateValidation": (),
+    "unlockStake": (),
+    "withdrawStake": (),
+    "withdrawTo": (),
+}
+
+# name: (selector, input types)
+ACCOUNT_FACTORY_FUNCTIONS = {
+    "accountImplementation": (
+        bytes.fromhex("11464fbe"),
+        (),
+    ),
+    "createAccount": (
+        bytes.fromhex("5fbfb9cf"),
+        ("address", "uint256"),
+    ),
+    "getAddress": (
+        bytes.fromhex("8cb84e18"),
+        ("address", "uint256"),
+    ),
+}
+
+# name: (selector, input types)
+ACCOUNT_FACTORY_ERRORS = {}
+
+# name: (topic, input types)
+ACCOUNT_FACTORY_EVENTS = {}
+
+# name: output types
+ACCOUNT_FACTORY_FUNCTION_OUTPUTS = {
+    "accountImplementation": ("address",),
+    "createAccount": ("address",),
+    "getAddress": ("address",),
+}
+
+# name: (selector, input types)
+MULTICALL3_FUNCTIONS = {
+    "aggregate3": (
+        bytes.fromhex("82ad56cb"),
+        ("(address,bool,bytes)[]",),
+    ),
+    "getEthBalance": (
+        bytes.fromhex("4d2301cc"),
+        ("address",),
+    ),
+}
+
+# name: (selector, input types)
+MULTICALL3_ERRORS = {}
+
+# name: (topic, input types)
+MULTICALL3_EVENTS = {}
+
+# name: output types
+MULTICALL3_FUNCTION_OUTPUTS = {
+    "aggregate3": ("(bool,bytes)[]",),
+    "getEthBalance": ("uint256",),
+}
+
+# error selector to (name, input types) for decoding revert data
+ERRORS_BY_SELECTOR = {
+    selector: (name, input_types)
+    for errors in (ENTRYPOINT_ERRORS, ACCOUNT_FACTORY_ERRORS, MULTICALL3_ERRORS)
+    for name, (selector, input_types) in errors.items()
+}
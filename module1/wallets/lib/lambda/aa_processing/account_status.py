@@ -0,0 +1,195 @@
+#  Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#  SPDX-License-Identifier: MIT-0
+from typing import List, Optional
+
+from eth_abi import decode, encode
+
+from aa_abi_compiled import (
+    ENTRYPOINT_FUNCTIONS,
+    ENTRYPOINT_FUNCTION_OUTPUTS,
+    MULTICALL3_FUNCTIONS,
+    MULTICALL3_FUNCTION_OUTPUTS,
+)
+
+# https://github.com/mds1/multicall - same address on all supported chains
+MULTICALL3_ADDRESS = "0xcA11bde05977b3631167028862bE2a173976CA11"
+
+
+class MulticallUnavailable(Exception):
+    pass
+
+
+def encode_call(functions: dict, name: str, args: list) -> bytes:
+    selector, input_types = functions[name]
+
+    return selector + encode(input_types, args)
+
+
+def decode_uint(output_types: tuple, data: bytes) -> int:
+    return decode(output_types, data)[0]
+
+
+def account_record(
+    owner: str,
+    account: str,
+    code: str,
+    nonce: Optional[int],
+    deposit: Optional[int],
+    balance: Optional[int],
+) -> dict:
+    # wei amounts as decimal strings, they exceed the safe integer range of JSON clients
+    return {
+        "owner": owner,
+        "account": account,
+        "deployed": code not in (None, "0x"),
+        "nonce": nonce,
+        "deposit": str(deposit) if deposit is not None else None,
+        "balance": str(balance) if balance is not None else None,
+    }
+
+
+def fetch_with_multicall(
+    provider, owners: List[str], accounts: List[str], entrypoint: str, multicall: str
+) -> List[dict]:
+    """
+    one JSON-RPC batch: a single Multicall3 aggregate3 eth_call (nonce, deposit, balance of all accounts) and
+    eth_getCode per account
+    """
+    calls = []
+    for account in accounts:
+        calls.extend(
+            [
+                (
+                    entrypoint,
+                    True,
+                    encode_call(ENTRYPOINT_FUNCTIONS, "getNonce", [account, 0]),
+                ),
+                (
+                    entrypoint,
+                    True,
+                    encode_call(ENTRYPOINT_FUNCTIONS, "balanceOf", [account]),
+                ),
+                (
+                    multicall,
+                    True,
+                    encode_call(MULTICALL3_FUNCTIONS, "getEthBalance", [account]),
+                ),
+            ]
+        )
+
+    aggregate3_call = encode_call(MULTICALL3_FUNCTIONS, "aggregate3", [calls])
+    responses = provider.make_batch_request(
+        [
+            (
+                "eth_call",
+                [{"to": multicall, "data": f"0x{aggregate3_call.hex()}"}, "latest"],
+            )
+        ]
+        + [("eth_getCode", [account, "latest"]) for account in accounts]
+    )
+
+    multicall_response = responses[0]
+    if multicall_response.get("result") in (None, "0x"):
+        # no Multicall3 deployment on this chain or the aggregate call failed as a whole
+        raise MulticallUnavailable(f"aggregate3 failed: {multicall_response}")
+
+    (results,) = decode(
+        MULTICALL3_FUNCTION_OUTPUTS["aggregate3"],
+        bytes.fromhex(multicall_response["result"][2:]),
+    )
+
+    output_types = [
+        ENTRYPOINT_FUNCTION_OUTPUTS["getNonce"],
+        ENTRYPOINT_FUNCTION_OUTPUTS["balanceOf"],
+        MULTICALL3_FUNCTION_OUTPUTS["getEthBalance"],
+    ]
+
+    records = []
+    for i, (owner, account) in enumerate(zip(owners, accounts)):
+        nonce, deposit, balance = [
+            decode_uint(types, data) if success else None
+            for types, (success, data) in zip(output_types, results[3 * i : 3 * i + 3])
+        ]
+        records.append(
+            account_record(
+                owner, account, responses[1 + i].get("result"), nonce, deposit, balance
+            )
+        )
+
+    return records
+
+
+def fetch_with_batch(
+    provider, owners: List[str], accounts: List[str], entrypoint: str
+) -> List[dict]:
+    """
+    one JSON-RPC batch with eth_call getNonce/balanceOf, eth_getBalance and eth_getCode per account
+    """
+    batch = []
+    for account in accounts:
+        nonce_call = encode_call(ENTRYPOINT_FUNCTIONS, "getNonce", [account, 0])
+        deposit_call = encode_call(ENTRYPOINT_FUNCTIONS, "balanceOf", [account])
+        batch.extend(
+            [
+                (
+                    "eth_call",
+                    [{"to": entrypoint, "data": f"0x{nonce_call.hex()}"}, "latest"],
+                ),
+                (
+                    "eth_call",
+                    [{"to": entrypoint, "data": f"0x{deposit_call.hex()}"}, "latest"],
+                ),
+                ("eth_getBalance", [account, "latest"]),
+                ("eth_getCode", [account, "latest"]),
+            ]
+        )
+
+    responses = provider.make_batch_request(batch)
+
+    def result(response: dict, output_types: Optional[tuple] = None):
+        if "error" in response or response.get("result") in (None, "0x"):
+            return None
+        if output_types is None:
+            return int(response["result"], 16)
+        return decode_uint(output_types, bytes.fromhex(response["result"][2:]))
+
+    records = []
+    for i, (owner, account) in enumerate(zip(owners, accounts)):
+        nonce, deposit, balance, code = responses[4 * i : 4 * i + 4]
+        records.append(
+            account_record(
+                owner,
+                account,
+                code.get("result"),
+                result(nonce, ENTRYPOINT_FUNCTION_OUTPUTS["getNonce"]),
+                result(deposit, ENTRYPOINT_FUNCTION_OUTPUTS["balanceOf"]),
+                result(balance),
+            )
+        )
+
+    return records
+
+
+def fetch_account_status(
+    provider,
+    owners: List[str],
+    accounts: List[str],
+    entrypoint: str,
+    multicall: Optional[str] = MULTICALL3_ADDRESS,
+) -> List[dict]:
+    """
+    deployment status, EntryPoint nonce (key 0), EntryPoint deposit and balance per account, via Multicall3 if a
+    multicall address is given and falling back to a plain JSON-RPC batch otherwise
+    """
+    if not accounts:
+        return []
+
+    if multicall:
+        try:
+            return fetch_with_multicall(
+                provider, owners, accounts, entrypoint, multicall
+            )
+        except MulticallUnavailable:
+            pass
+
+    return fetch_with_batch(provider, owners, accounts, entrypoint)
@@ -0,0 +1,322 @@
+#  Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#  SPDX-License-Identifier: MIT-0
+"""
+bulk backfill of counterfactual account addresses for all keys of a key table
+
+required after the account factory, the entrypoint or the account salt has been changed, scans the key table (kmsKeyTable or the
+nitro secrets table) with parallel segments, computes the addresses locally via CREATE2 across a process pool and
+writes the items back with BatchWriteItem. Progress is checkpointed per segment so an interrupted run resumes where
+it stopped, as long as the account parameters (factory, entrypoint, implementation, proxy creation code and salt) are
+unchanged. The factory, entrypoint and salt are stored with each account as in SSM, the state machines compare them
+against SSM to detect outdated accounts.
+
+items are written back as a whole, the job should not run while keys are being created for new users
+
+usage: python backfill.py --table <key_table> [--segments 8] [--workers 4] [--checkpoint backfill_checkpoint.json]
+"""
+
+import argparse
+import json
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Optional
+
+import boto3
+from aws_lambda_powertools import Logger
+from eth_utils import keccak
+
+from counterfactual import compute_account_address
+from ddb_batch import batch_write_items
+
+ACCOUNT_PARAMETERS = {
+    "factory": "/web3/aa/account_factory_address",
+    "entrypoint": "/web3/aa/entrypoint_address",
+    "implementation": "/web3/aa/account_implementation_address",
+    "proxy_creation_code": "/web3/aa/account_proxy_creation_code",
+    "salt": "/web3/aa/account_salt",
+}
+
+# account parameters of the worker processes, set once per process by init_worker
+worker_parameters: dict = {}
+
+logger = Logger(service="account_backfill")
+
+
+def init_worker(
+    factory: str, implementation: str, proxy_creation_code: bytes, salt: int
+) -> None:
+    worker_parameters.update(
+        factory=factory,
+        implementation=implementation,
+        proxy_creation_code=proxy_creation_code,
+        salt=salt,
+    )
+
+
+def compute_owner_account(owner: str) -> str:
+    return compute_account_address(
+        factory=worker_parameters["factory"],
+        account_implementation=worker_parameters["implementation"],
+        proxy_creation_code=worker_parameters["proxy_creation_code"],
+        owner=owner,
+        salt=worker_parameters["salt"],
+    )
+
+
+def get_account_parameters(client_ssm) -> dict:
+    try:
+        response = client_ssm.get_parameters(Names=list(ACCOUNT_PARAMETERS.values()))
+    except Exception as e:
+        raise Exception(f"exception happened getting parameters from SSM: {e}")
+
+    values = {
+        parameter["Name"]: parameter["Value"] for parameter in response["Parameters"]
+    }
+    parameters = {
+        name: values.get(parameter_name)
+        for name, parameter_name in ACCOUNT_PARAMETERS.items()
+    }
+    for name, value in parameters.items():
+        if not value or value == "none":
+            raise Exception(f"SSM parameter for address calculation not set: {name}")
+
+    return {
+        "factory": parameters["factory"],
+        "implementation": parameters["implementation"],
+        "proxy_creation_code": bytes.fromhex(
+            parameters["proxy_creation_code"].removeprefix("0x")
+        ),
+        "salt": int(parameters["salt"], 0),
+        # stored with the accounts unaltered
+        "address_inputs": {
+            "account_factory": parameters["factory"],
+            "account_entrypoint": parameters["entrypoint"],
+            "account_salt": parameters["salt"],
+        },
+    }
+
+
+def checkpoint_identity(account_parameters: dict) -> dict:
+    """
+    all inputs of the address calculation, a checkpoint is only resumed for the same accounts
+    """
+    return {
+        "account_factory": account_parameters["factory"].lower(),
+        "account_entrypoint": account_parameters["address_inputs"][
+            "account_entrypoint"
+        ].lower(),
+        "account_implementation": account_parameters["implementation"].lower(),
+        "proxy_creation_code_hash": keccak(
+            account_parameters["proxy_creation_code"]
+        ).hex(),
+        "account_salt": str(account_parameters["salt"]),
+    }
+
+
+class Checkpoint:
+    """
+    per segment progress (last evaluated key, done flag, counters) persisted as json after every page
+    """
+
+    def __init__(
+        self, path: Optional[str], total_segments: int, identity: dict
+    ) -> None:
+        self.path = path
+        self._lock = threading.Lock()
+        self.state = {
+            "total_segments": total_segments,
+            "account_parameters": identity,
+            "segments": {},
+        }
+
+        if path and os.path.exists(path):
+            with open(path) as f:
+                state = json.load(f)
+            if state["total_segments"] != total_segments:
+                raise Exception(
+                    f"checkpoint was created with {state['total_segments']} segments, cannot resume with {total_segments}"
+                )
+            if state.get("account_parameters") != identity:
+                raise Exception(
+                    f"checkpoint was created for account parameters {state.get('account_parameters')}, remove it to "
+                    f"start over"
+                )
+            self.state = state
+
+    def segment(self, segment: int) -> dict:
+        with self._lock:
+            return dict(
+                self.state["segments"].get(
+                    str(segment),
+                    {
+                        "last_evaluated_key": None,
+                        "done": False,
+                        "scanned": 0,
+                        "updated": 0,
+                    },
+                )
+            )
+
+    def update(self, segment: int, progress: dict) -> None:
+        with self._lock:
+            self.state["segments"][str(segment)] = progress
+            if not self.path:
+                return
+
+            # write and rename so that an interrupted run never leaves a truncated checkpoint behind
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, "w") as f:
+                json.dump(self.state, f)
+            os.replace(tmp_path, self.path)
+
+
+def backfill_segment(
+    client_ddb,
+    table_name: str,
+    segment: int,
+    total_segments: int,
+    address_inputs: dict,
+    pool: ProcessPoolExecutor,
+    workers: int,
+    checkpoint: Checkpoint,
+    page_size: int,
+) -> dict:
+    progress = checkpoint.segment(segment)
+
+    while not progress["done"]:
+        scan_args = {
+            "TableName": table_name,
+            "Segment": segment,
+            "TotalSegments": total_segments,
+            "Limit": page_size,
+        }
+        if progress["last_evaluated_key"]:
+            scan_args["ExclusiveStartKey"] = progress["last_evaluated_key"]
+
+        response = client_ddb.scan(**scan_args)
+        items = [item for item in response.get("Items", []) if "address" in item]
+
+        accounts = pool.map(
+            compute_owner_account,
+            [item["address"]["S"] for item in items],
+            chunksize=max(1, len(items) // (workers * 4)),
+        )
+
+        updated_items = []
+        for item, account in zip(items, accounts):
+            attributes = {"account": account, **address_inputs}
+            if all(
+                item.get(name, {}).get("S") == value
+                for name, value in attributes.items()
+            ):
+                continue
+            updated_items.append(
+                {
+                    **item,
+                    **{name: {"S": value} for name, value in attributes.items()},
+                }
+            )
+
+        batch_write_items(client_ddb, table_name, updated_items)
+
+        progress = {
+            "last_evaluated_key": response.get("LastEvaluatedKey"),
+            "done": "LastEvaluatedKey" not in response,
+            "scanned": progress["scanned"] + len(response.get("Items", [])),
+            "updated": progress["updated"] + len(updated_items),
+        }
+        checkpoint.update(segment, progress)
+
+    return progress
+
+
+def run_backfill(
+    client_ddb,
+    table_name: str,
+    account_parameters: dict,
+    total_segments: int = 8,
+    workers: Optional[int] = None,
+    checkpoint_path: Optional[str] = None,
+    page_size: int = 1000,
+) -> dict:
+    checkpoint = Checkpoint(
+        checkpoint_path, total_segments, checkpoint_identity(account_parameters)
+    )
+
+    workers = workers or os.cpu_count() or 1
+    # items scanned by a previous, interrupted run do not count towards the throughput of this run
+    resumed = sum(
+        checkpoint.segment(segment)["scanned"] for segment in range(total_segments)
+    )
+
+    start = time.perf_counter()
+    with ProcessPoolExecutor(
+        max_workers=workers,
+        initializer=init_worker,
+        initargs=(
+            account_parameters["factory"],
+            account_parameters["implementation"],
+            account_parameters["proxy_creation_code"],
+            account_parameters["salt"],
+        ),
+    ) as pool, ThreadPoolExecutor(max_workers=total_segments) as scanners:
+        results = list(
+            scanners.map(
+                lambda segment: backfill_segment(
+                    client_ddb,
+                    table_name,
+                    segment,
+                    total_segments,
+                    account_parameters["address_inputs"],
+                    pool,
+                    workers,
+                    checkpoint,
+                    page_size,
+                ),
+                range(total_segments),
+            )
+        )
+    elapsed = time.perf_counter() - start
+
+    scanned = sum(result["scanned"] for result in results)
+    updated = sum(result["updated"] for result in results)
+
+    return {
+        "segments": total_segments,
+        "scanned": scanned,
+        "updated": updated,
+        "elapsed_seconds": round(elapsed, 3),
+        "resumed": resumed,
+        "items_per_second": round((scanned - resumed) / elapsed, 1) if elapsed else 0.0,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="recompute counterfactual account addresses for all keys of a key table"
+    )
+    parser.add_argument("--table", required=True, help="key table name")
+    parser.add_argument("--segments", type=int, default=8)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--page-size", type=int, default=1000)
+    parser.add_argument("--checkpoint", default="backfill_checkpoint.json")
+    args = parser.parse_args()
+
+    account_parameters = get_account_parameters(boto3.client("ssm"))
+
+    result = run_backfill(
+        boto3.client("dynamodb"),
+        args.table,
+        account_parameters,
+        total_segments=args.segments,
+        workers=args.workers,
+        checkpoint_path=args.checkpoint,
+        page_size=args.page_size,
+    )
+    logger.info("account address backfill completed", extra=result)
+
+
+if __name__ == "__main__":
+    main()
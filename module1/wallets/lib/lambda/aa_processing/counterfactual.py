@@ -0,0 +1,55 @@
+#  Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#  SPDX-License-Identifier: MIT-0
+import eth_typing
+from eth_abi import encode
+from eth_utils import keccak, to_checksum_address
+
+# SimpleAccount.initialize(address)
+INITIALIZE_SELECTOR = keccak(text="initialize(address)")[:4]
+
+
+def compute_create2_address(
+    deployer: str, salt: int, init_code_hash: bytes
+) -> eth_typing.ChecksumAddress:
+    # https://eips.ethereum.org/EIPS/eip-1014
+    address = keccak(
+        b"\xff"
+        + bytes.fromhex(deployer[2:] if deployer.startswith("0x") else deployer)
+        + salt.to_bytes(32, "big")
+        + init_code_hash
+    )[12:]
+
+    return to_checksum_address(address)
+
+
+def compute_account_init_code_hash(
+    proxy_creation_code: bytes, account_implementation: str, owner: str
+) -> bytes:
+    """
+    keccak256(type(ERC1967Proxy).creationCode ++ abi.encode(accountImplementation, initialize(owner))) as deployed by
+    SimpleAccountFactory.createAccount (ERC-4337 v0.6)
+    """
+    initialize_call = INITIALIZE_SELECTOR + encode(["address"], [owner])
+
+    return keccak(
+        proxy_creation_code
+        + encode(["address", "bytes"], [account_implementation, initialize_call])
+    )
+
+
+def compute_account_address(
+    factory: str,
+    account_implementation: str,
+    proxy_creation_code: bytes,
+    owner: str,
+    salt: int,
+) -> eth_typing.ChecksumAddress:
+    """
+    counterfactual SimpleAccount address for owner/salt without an RPC round trip, mirrors
+    SimpleAccountFactory.getAddress(owner, salt)
+    """
+    init_code_hash = compute_account_init_code_hash(
+        proxy_creation_code, account_implementation, owner
+    )
+
+    return compute_create2_address(factory, salt, init_code_hash)
@@ -3,22 +3,219 @@
 import boto3
 
 import os
+import threading
 import web3
 
 import web3.eth
 import eth_typing
+from eth_abi import decode, encode
+from collections import OrderedDict
+from eth_utils import to_checksum_address
 from web3.exceptions import ContractLogicError
 
 from aws_lambda_powertools import Logger
-from aa_abi import ENTRYPOINT_ABI, ACCOUNT_FACTORY_ABI
+from aa_abi_compiled import (
+    ACCOUNT_FACTORY_FUNCTIONS,
+    ENTRYPOINT_FUNCTIONS,
+    ERRORS_BY_SELECTOR,
+)
+from account_status import MULTICALL3_ADDRESS, fetch_account_status
+from counterfactual import compute_account_address
+from nonce_manager import (
+    NonceManager,
+    parse_nonce,
+    parse_nonce_key,
+    read_chain_nonce,
+)
+from rpc_providers import endpoint_metrics, get_web3
+from ssm_parameters import ParameterCache
 
 session = boto3.session.Session()
 client_ssm = boto3.client("ssm")
+client_ddb = boto3.client("dynamodb")
 
 logger = Logger()
 
+# SSM parameter values cached per warm container, refreshed after the ttl
+parameter_cache = ParameterCache(float(os.getenv("PARAMETER_CACHE_TTL_SECONDS", "60")))
+
+# counterfactual addresses never change for (factory, entrypoint, owner, salt), memoized per warm container with
+# least recently used entries being evicted first
+account_addresses: "OrderedDict[tuple, str]" = OrderedDict()
+account_addresses_lock = threading.Lock()
+ACCOUNT_ADDRESS_CACHE_MAX_ENTRIES = int(
+    os.getenv("ACCOUNT_ADDRESS_CACHE_MAX_ENTRIES", "4096")
+)
+
+MAX_ACCOUNT_STATUS_OWNERS = int(os.getenv("MAX_ACCOUNT_STATUS_OWNERS", "100"))
+MAX_NONCE_RESERVATION = int(os.getenv("MAX_NONCE_RESERVATION", "64"))
+
+
+def get_parameters(names: list) -> dict:
+    """
+    values of the given SSM parameters, fetched with a single GetParameters call on cache misses
+    """
+    return parameter_cache.get_parameters(client_ssm, names)
+
+
+def get_parameter(name: str) -> str:
+    return get_parameters([name])[name]
+
+
+def get_address_mode() -> str:
+    """
+    rpc: EntryPoint.getSenderAddress via JSON-RPC, offline: local CREATE2 computation, verify: both, RPC result wins
+    """
+    if not os.getenv("AA_ADDRESS_MODE_SSM_PARAM"):
+        return "rpc"
+
+    try:
+        address_mode = get_parameter(os.getenv("AA_ADDRESS_MODE_SSM_PARAM"))
+    except Exception as e:
+        raise Exception(f"exception happened getting parameter from SSM: {e}")
+
+    mode = address_mode.lower()
+    if mode not in ["rpc", "offline", "verify"]:
+        raise Exception(f"address mode not supported: {mode}")
+
+    return mode
+
+
+def get_account_salt_parameter() -> str:
+    """
+    salt as stored in SSM, persisted next to the account address to detect salt changes
+    """
+    if not os.getenv("AA_ACCOUNT_SALT_SSM_PARAM"):
+        return "0"
+
+    try:
+        return get_parameter(os.getenv("AA_ACCOUNT_SALT_SSM_PARAM"))
+    except Exception as e:
+        raise Exception(f"exception happened getting parameter from SSM: {e}")
+
+
+def get_account_salt() -> int:
+    return int(get_account_salt_parameter(), 0)
+
+
+def calc_account_address_offline(public_address: str) -> eth_typing.ChecksumAddress:
+    parameter_names = {
+        "factory": os.getenv("AA_ACCOUNT_FACTORY_ADDRESS_SSM_PARAM"),
+        "implementation": os.getenv("AA_ACCOUNT_IMPLEMENTATION_ADDRESS_SSM_PARAM"),
+        "proxy_creation_code": os.getenv("AA_ACCOUNT_PROXY_CREATION_CODE_SSM_PARAM"),
+    }
+    for name, parameter_name in parameter_names.items():
+        if not parameter_name:
+            raise Exception(
+                f"SSM parameter for offline address calculation missing: {name}"
+            )
+
+    try:
+        values = get_parameters(list(parameter_names.values()))
+    except Exception as e:
+        raise Exception(f"exception happened getting parameters from SSM: {e}")
+
+    parameters = {
+        name: values.get(parameter_name)
+        for name, parameter_name in parameter_names.items()
+    }
+    for name, value in parameters.items():
+        if not value or value == "none":
+            raise Exception(
+                f"SSM parameter for offline address calculation not set: {name}"
+            )
+
+    return compute_account_address(
+        factory=parameters["factory"],
+        account_implementation=parameters["implementation"],
+        proxy_creation_code=web3.Web3.to_bytes(
+            hexstr=parameters["proxy_creation_code"]
+        ),
+        owner=public_address,
+        salt=get_account_salt(),
+    )
+
+
+def get_account_factory_address() -> str:
+    try:
+        return get_parameter(os.getenv("AA_ACCOUNT_FACTORY_ADDRESS_SSM_PARAM"))
+    except Exception as e:
+        raise Exception(f"exception happened getting parameter from SSM: {e}")
+
+
+def get_entrypoint_address() -> str:
+    try:
+        return get_parameter(os.getenv("AA_ENTRYPOINT_ADDRESS_SSM_PARAM"))
+    except Exception as e:
+        raise Exception(f"exception happened getting parameter from SSM: {e}")
+
+
+def account_address_cache_key(
+    public_address: str, account_factory: str, address_mode: str
+) -> tuple:
+    return (
+        account_factory.lower(),
+        get_entrypoint_address().lower(),
+        public_address.lower(),
+        get_account_salt(),
+        address_mode,
+    )
+
+
+def get_cached_account_address(cache_key: tuple) -> str:
+    with account_addresses_lock:
+        counterfactual_address = account_addresses.get(cache_key)
+        if counterfactual_address:
+            account_addresses.move_to_end(cache_key)
+
+    return counterfactual_address
+
+
+def cache_account_address(cache_key: tuple, counterfactual_address: str) -> None:
+    # empty addresses (no rpc endpoint configured) are not cached
+    if not counterfactual_address:
+        return
+
+    with account_addresses_lock:
+        account_addresses[cache_key] = counterfactual_address
+        account_addresses.move_to_end(cache_key)
+        while len(account_addresses) > ACCOUNT_ADDRESS_CACHE_MAX_ENTRIES:
+            account_addresses.popitem(last=False)
+
+
+def get_account_address(
+    public_address: str, account_factory: str
+) -> eth_typing.ChecksumAddress:
+    address_mode = get_address_mode()
+    cache_key = account_address_cache_key(public_address, account_factory, address_mode)
+
+    counterfactual_address = get_cached_account_address(cache_key)
+    if counterfactual_address:
+        logger.debug(f"cached address: {counterfactual_address}")
+        return counterfactual_address
+
+    counterfactual_address = calc_account_address(public_address, address_mode)
+    cache_account_address(cache_key, counterfactual_address)
+
+    return counterfactual_address
+
+
+def calc_account_address(
+    public_address: str, address_mode: str
+) -> eth_typing.ChecksumAddress:
+
+    if address_mode == "offline":
+        try:
+            counterfactual_address = calc_account_address_offline(public_address)
+        except Exception as e:
+            raise Exception(
+                f"exception happened calculating counterfactual address offline: {e}"
+            )
+
+        logger.debug(f"calculated address (offline): {counterfactual_address}")
+
+        return counterfactual_address
 
-def get_account_address(public_address: str) -> eth_typing.ChecksumAddress:
     try:
         init_code = get_account_init_code(public_address)
     except Exception as e:
@@ -35,38 +232,63 @@ def get_account_address(public_address: str) -> eth_typing.ChecksumAddress:
 
     logger.debug(f"calculated address: {counterfactual_address}")
 
+    if address_mode == "verify" and counterfactual_address:
+        try:
+            offline_address = calc_account_address_offline(public_address)
+        except Exception as e:
+            logger.error(
+                f"exception happened verifying counterfactual address offline: {e}"
+            )
+        else:
+            if offline_address != counterfactual_address:
+                logger.error(
+                    f"offline counterfactual address ({offline_address}) differs from RPC result "
+                    f"({counterfactual_address}) for owner {public_address}"
+                )
+
     return counterfactual_address
 
 
 def call_entrypoint(init_code: bytes) -> eth_typing.ChecksumAddress:
     try:
-        entrypoint_address = client_ssm.get_parameter(
-            Name=os.getenv("AA_ENTRYPOINT_ADDRESS_SSM_PARAM")
-        )
-        rpc_endpoint = client_ssm.get_parameter(
-            Name=os.getenv("RPC_ENDPOINT_SSM_PARAM")
+        parameters = get_parameters(
+            [
+                os.getenv("AA_ENTRYPOINT_ADDRESS_SSM_PARAM"),
+                os.getenv("RPC_ENDPOINT_SSM_PARAM"),
+            ]
         )
     except Exception as e:
         raise Exception(f"exception happened getting parameter from SSM: {e}")
 
-    if rpc_endpoint["Parameter"]["Value"] == "my.rpc.endpoint":
+    entrypoint_address = parameters[os.getenv("AA_ENTRYPOINT_ADDRESS_SSM_PARAM")]
+    rpc_endpoint = parameters[os.getenv("RPC_ENDPOINT_SSM_PARAM")]
+
+    if rpc_endpoint == "my.rpc.endpoint":
         # if no rpc_endpoint parameter present just return empty ChecksumAddress
         return eth_typing.ChecksumAddress(eth_typing.HexAddress(eth_typing.HexStr("")))
 
-    w3 = web3.Web3(web3.HTTPProvider(rpc_endpoint["Parameter"]["Value"]))
-    entrypoint_contract = w3.eth.contract(
-        address=entrypoint_address["Parameter"]["Value"], abi=ENTRYPOINT_ABI
-    )
-    counterfactual_address = ""
+    # comma separated list of endpoints, pooled sessions are reused across warm invocations
+    w3 = get_web3(rpc_endpoint)
+    selector, input_types = ENTRYPOINT_FUNCTIONS["getSenderAddress"]
+    revert_data = ""
     try:
-        entrypoint_contract.functions.getSenderAddress(init_code).call()
+        w3.eth.call(
+            {
+                "to": entrypoint_address,
+                "data": selector + encode(input_types, [init_code]),
+            }
+        )
     except ContractLogicError as e:
         # function always reverts
-        counterfactual_address = e.data
+        revert_data = e.data
+    finally:
+        logger.debug(f"rpc endpoint metrics: {endpoint_metrics()}")
 
     try:
-        sender = counterfactual_address[34:]
-        sender_checksum_address = w3.to_checksum_address(sender)
+        error_name, (sender,) = decode_revert_data(revert_data)
+        if error_name != "SenderAddressResult":
+            raise Exception(f"unexpected revert reason: {error_name}")
+        sender_checksum_address = to_checksum_address(sender)
     except Exception as e:
         raise Exception(
             f"exception happened calculating Ethereum checksum address from AA address: {e}"
@@ -75,28 +297,205 @@ def call_entrypoint(init_code: bytes) -> eth_typing.ChecksumAddress:
     return sender_checksum_address
 
 
-def get_account_init_code(address: str) -> bytes:
+def decode_revert_data(revert_data: str) -> tuple:
+    """
+    decodes custom error revert data of the EntryPoint and account factory into (error name, values)
+    """
+    data = web3.Web3.to_bytes(hexstr=revert_data)
+    if data[:4] not in ERRORS_BY_SELECTOR:
+        raise Exception(f"unknown error selector in revert data: {data[:4].hex()}")
+
+    error_name, input_types = ERRORS_BY_SELECTOR[data[:4]]
+
+    return error_name, decode(input_types, data[4:])
+
+
+def call_entrypoint_batch(
+    w3: web3.Web3, entrypoint_address: str, init_codes: list
+) -> list:
+    """
+    EntryPoint.getSenderAddress for many init codes with a single JSON-RPC batch of eth_call requests
+    """
+    selector, input_types = ENTRYPOINT_FUNCTIONS["getSenderAddress"]
+    responses = w3.provider.make_batch_request(
+        [
+            (
+                "eth_call",
+                [
+                    {
+                        "to": entrypoint_address,
+                        "data": f"0x{(selector + encode(input_types, [init_code])).hex()}",
+                    },
+                    "latest",
+                ],
+            )
+            for init_code in init_codes
+        ]
+    )
+
+    sender_addresses = []
+    for response in responses:
+        # getSenderAddress always reverts, the sender is returned as custom error data
+        revert_data = response.get("error", {}).get("data")
+        if isinstance(revert_data, dict):
+            revert_data = revert_data.get("data")
+        if not isinstance(revert_data, str):
+            raise Exception(f"unexpected getSenderAddress response: {response}")
+
+        error_name, (sender,) = decode_revert_data(revert_data)
+        if error_name != "SenderAddressResult":
+            raise Exception(f"unexpected revert reason: {error_name}")
+        sender_addresses.append(to_checksum_address(sender))
+
+    return sender_addresses
+
+
+def get_account_addresses(
+    w3: web3.Web3, entrypoint_address: str, owners: list, account_factory: str
+) -> list:
+    """
+    counterfactual addresses of many owners, memoized addresses are reused and the others are calculated offline or
+    resolved with one JSON-RPC batch depending on the address mode
+    """
+    address_mode = get_address_mode()
+    cache_keys = [
+        account_address_cache_key(owner, account_factory, address_mode)
+        for owner in owners
+    ]
+    accounts = [get_cached_account_address(cache_key) for cache_key in cache_keys]
+    pending = [i for i, account in enumerate(accounts) if not account]
+    if not pending:
+        return accounts
+
+    if address_mode == "offline":
+        for i in pending:
+            accounts[i] = calc_account_address_offline(owners[i])
+    else:
+        sender_addresses = call_entrypoint_batch(
+            w3,
+            entrypoint_address,
+            [get_account_init_code(owners[i]) for i in pending],
+        )
+        for i, sender_address in zip(pending, sender_addresses):
+            accounts[i] = sender_address
+            if address_mode == "verify":
+                try:
+                    offline_address = calc_account_address_offline(owners[i])
+                except Exception as e:
+                    logger.error(
+                        f"exception happened verifying counterfactual address offline: {e}"
+                    )
+                    continue
+                if offline_address != sender_address:
+                    logger.error(
+                        f"offline counterfactual address ({offline_address}) differs from RPC result "
+                        f"({sender_address}) for owner {owners[i]}"
+                    )
+
+    for i in pending:
+        cache_account_address(cache_keys[i], accounts[i])
+
+    return accounts
+
+
+def get_account_status(owners: list) -> list:
+    # all parameters of the request with one GetParameters call, the address calculation is served from the cache
+    parameter_names = [
+        os.getenv(name)
+        for name in [
+            "AA_ENTRYPOINT_ADDRESS_SSM_PARAM",
+            "RPC_ENDPOINT_SSM_PARAM",
+            "AA_ACCOUNT_FACTORY_ADDRESS_SSM_PARAM",
+            "AA_ADDRESS_MODE_SSM_PARAM",
+            "AA_ACCOUNT_SALT_SSM_PARAM",
+            "AA_ACCOUNT_IMPLEMENTATION_ADDRESS_SSM_PARAM",
+            "AA_ACCOUNT_PROXY_CREATION_CODE_SSM_PARAM",
+        ]
+        if os.getenv(name)
+    ]
+    try:
+        parameters = get_parameters(parameter_names)
+    except Exception as e:
+        raise Exception(f"exception happened getting parameters from SSM: {e}")
+
+    entrypoint_address = parameters[os.getenv("AA_ENTRYPOINT_ADDRESS_SSM_PARAM")]
+    rpc_endpoint = parameters[os.getenv("RPC_ENDPOINT_SSM_PARAM")]
+    account_factory = parameters[os.getenv("AA_ACCOUNT_FACTORY_ADDRESS_SSM_PARAM")]
+
+    if rpc_endpoint == "my.rpc.endpoint":
+        raise Exception("no RPC endpoint configured")
+
+    w3 = get_web3(rpc_endpoint)
     try:
-        factory_address = client_ssm.get_parameter(
-            Name=os.getenv("AA_ACCOUNT_FACTORY_ADDRESS_SSM_PARAM")
+        accounts = get_account_addresses(
+            w3, entrypoint_address, owners, account_factory
+        )
+    except Exception as e:
+        raise Exception(f"exception happened calculating account addresses: {e}")
+
+    # MULTICALL3_ADDRESS=none forces plain JSON-RPC batches, e.g. for dev chains without a Multicall3 deployment
+    multicall_address = os.getenv("MULTICALL3_ADDRESS", MULTICALL3_ADDRESS)
+    if multicall_address.lower() == "none":
+        multicall_address = None
+
+    try:
+        return fetch_account_status(
+            w3.provider,
+            owners,
+            accounts,
+            entrypoint_address,
+            multicall_address,
+        )
+    finally:
+        logger.debug(f"rpc endpoint metrics: {endpoint_metrics()}")
+
+
+def get_chain_nonce(account: str, key: int) -> int:
+    try:
+        parameters = get_parameters(
+            [
+                os.getenv("AA_ENTRYPOINT_ADDRESS_SSM_PARAM"),
+                os.getenv("RPC_ENDPOINT_SSM_PARAM"),
+            ]
         )
     except Exception as e:
         raise Exception(f"exception happened getting parameter from SSM: {e}")
 
-    w3 = web3.Web3()
-    account_factory_contract = w3.eth.contract(abi=ACCOUNT_FACTORY_ABI)
-    # todo validate salt
-    account_factory_contract_call = account_factory_contract.encodeABI(
-        fn_name="createAccount", args=[address, 0]
+    entrypoint_address = parameters[os.getenv("AA_ENTRYPOINT_ADDRESS_SSM_PARAM")]
+    rpc_endpoint = parameters[os.getenv("RPC_ENDPOINT_SSM_PARAM")]
+
+    if rpc_endpoint == "my.rpc.endpoint":
+        raise Exception("no RPC endpoint configured")
+
+    w3 = get_web3(rpc_endpoint)
+    try:
+        return read_chain_nonce(w3, entrypoint_address, account, key)
+    finally:
+        logger.debug(f"rpc endpoint metrics: {endpoint_metrics()}")
+
+
+def get_nonce_manager() -> NonceManager:
+    if not os.getenv("NONCE_TABLE"):
+        raise Exception("environment config parameter missing: NONCE_TABLE")
+
+    return NonceManager(client_ddb, os.getenv("NONCE_TABLE"), get_chain_nonce)
+
+
+def get_account_init_code(address: str) -> bytes:
+    factory_address = get_account_factory_address()
+
+    selector, input_types = ACCOUNT_FACTORY_FUNCTIONS["createAccount"]
+    account_factory_contract_call = selector + encode(
+        input_types, [address, get_account_salt()]
     )
-    logger.debug(f"contract call encoding: {account_factory_contract_call}")
+    logger.debug(f"contract call encoding: 0x{account_factory_contract_call.hex()}")
 
     init_code = (
-        f"{factory_address['Parameter']['Value']}{account_factory_contract_call[2:]}"
+        web3.Web3.to_bytes(hexstr=factory_address) + account_factory_contract_call
     )
-    logger.debug(f"account init code: {init_code}")
+    logger.debug(f"account init code: 0x{init_code.hex()}")
 
-    return w3.to_bytes(hexstr=init_code)
+    return init_code
 
 
 def lambda_handler(event, context):
@@ -128,7 +527,11 @@ def lambda_handler(event, context):
         address = event["address"]
 
         try:
-            account_address = get_account_address(address)
+            account_factory = get_account_factory_address()
+            account_address = get_account_address(address, account_factory)
+            # address inputs are returned as stored in SSM to be compared against SSM by the state machines
+            account_entrypoint = get_entrypoint_address()
+            account_salt = get_account_salt_parameter()
         except Exception as e:
             raise Exception(
                 f"exception happened calculating the AA address for key_id({key_id})/address({address}): {e}"
@@ -136,10 +539,91 @@ def lambda_handler(event, context):
 
         return {
             "account": account_address,
+            "account_factory": account_factory,
+            "account_entrypoint": account_entrypoint,
+            "account_salt": account_salt,
             "backend": event["backend"],
             "address": event["address"],
             "key_id": event["key_id"],
         }
 
+    elif operation == "account_status":
+        owners = event.get("owners")
+        if not isinstance(owners, list) or not owners:
+            raise Exception("owners parameter in request must be a non-empty list")
+        if len(owners) > MAX_ACCOUNT_STATUS_OWNERS:
+            raise Exception(
+                f"number of owners ({len(owners)}) exceeds maximum of {MAX_ACCOUNT_STATUS_OWNERS}"
+            )
+
+        try:
+            accounts = get_account_status(owners)
+        except Exception as e:
+            raise Exception(f"exception happened getting account status: {e}")
+
+        return {"accounts": accounts}
+
+    elif operation == "reserve_nonce":
+        """
+        {
+          "operation": "reserve_nonce",
+          "account": "0x7BC12c4D795e513E7C86a720FC577d22b587Be05",
+          "key": "0x0",
+          "count": 2
+        }
+        """
+        account = event["account"]
+        count = int(event.get("count", 1))
+        if not 1 <= count <= MAX_NONCE_RESERVATION:
+            raise Exception(
+                f"count must be between 1 and {MAX_NONCE_RESERVATION}: {count}"
+            )
+
+        try:
+            key = parse_nonce_key(event.get("key", 0))
+            nonces = get_nonce_manager().reserve(account, key, count)
+        except Exception as e:
+            raise Exception(
+                f"exception happened reserving nonces for account ({account}): {e}"
+            )
+
+        return {"account": account, "nonces": [hex(nonce) for nonce in nonces]}
+
+    elif operation == "resync_nonce":
+        """
+        {
+          "operation": "resync_nonce",
+          "account": "0x7BC12c4D795e513E7C86a720FC577d22b587Be05",
+          "key": "0x0",
+          "failed_nonce": "0x5"
+        }
+        """
+        account = event["account"]
+
+        try:
+            key = parse_nonce_key(event.get("key", 0))
+            failed_nonce = event.get("failed_nonce")
+            if failed_nonce is not None:
+                failed_nonce = parse_nonce(failed_nonce)
+            result = get_nonce_manager().resync(account, key, failed_nonce)
+        except Exception as e:
+            raise Exception(
+                f"exception happened resyncing nonce for account ({account}): {e}"
+            )
+
+        if not result["resynced"]:
+            return {"account": account, "resynced": False}
+
+        return {
+            "account": account,
+            "resynced": True,
+            "previous_nonce": (
+                hex(result["previous_nonce"])
+                if result["previous_nonce"] is not None
+                else None
+            ),
+            "next_nonce": hex(result["next_nonce"]),
+        }
+
     else:
         raise Exception(f"operation not supported: {operation}")
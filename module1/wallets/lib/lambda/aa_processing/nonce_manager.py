@@ -0,0 +1,191 @@
+#  Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#  SPDX-License-Identifier: MIT-0
+"""
+optimistic nonce allocation for parallel user operations of the same smart account
+
+EntryPoint nonces are 2D (v0.6): the upper 192 bits are a key chosen by the sender and the lower 64 bits a sequence
+per key, so independent flows using different keys never wait for each other. The manager keeps a cursor with the
+next free sequence per (account, key) in DynamoDB and hands out sequences with an atomic ADD, the chain is only read
+to initialize a cursor and when a caller reports a gap or a reverted user operation (resync).
+"""
+
+import time
+from typing import Callable, List, Optional
+
+from eth_abi import decode, encode
+from eth_utils import to_checksum_address
+
+from aa_abi_compiled import ENTRYPOINT_FUNCTIONS, ENTRYPOINT_FUNCTION_OUTPUTS
+from aws_errors import is_conditional_check_failure
+
+NONCE_SEQUENCE_BITS = 64
+NONCE_SEQUENCE_MASK = (1 << NONCE_SEQUENCE_BITS) - 1
+MAX_NONCE_KEY = (1 << 192) - 1
+
+# attempts to reserve when concurrent requests race on the initialization of the same cursor
+MAX_RESERVE_ATTEMPTS = 3
+
+
+def compose_nonce(key: int, sequence: int) -> int:
+    return (key << NONCE_SEQUENCE_BITS) | sequence
+
+
+def split_nonce(nonce: int) -> tuple:
+    return nonce >> NONCE_SEQUENCE_BITS, nonce & NONCE_SEQUENCE_MASK
+
+
+def parse_nonce(value) -> int:
+    # hex strings as used by bundlers, decimal strings and integers
+    if isinstance(value, str):
+        value = int(value, 0)
+    if not isinstance(value, int) or isinstance(value, bool) or value < 0:
+        raise ValueError(f"nonce must be a non-negative integer: {value}")
+
+    return value
+
+
+def parse_nonce_key(key) -> int:
+    key = parse_nonce(key)
+    if key > MAX_NONCE_KEY:
+        raise ValueError(f"nonce key exceeds 192 bits: {key}")
+
+    return key
+
+
+def read_chain_nonce(w3, entrypoint: str, account: str, key: int) -> int:
+    """
+    EntryPoint.getNonce(account, key) - full nonce including the key in the upper 192 bits
+    """
+    selector, input_types = ENTRYPOINT_FUNCTIONS["getNonce"]
+    result = w3.eth.call(
+        {
+            "to": to_checksum_address(entrypoint),
+            "data": selector + encode(input_types, [account, key]),
+        }
+    )
+
+    return decode(ENTRYPOINT_FUNCTION_OUTPUTS["getNonce"], result)[0]
+
+
+class NonceManager:
+    """
+    per-(account, nonce key) sequence cursors in DynamoDB (partition key account, sort key nonce_key)
+    """
+
+    def __init__(
+        self,
+        client_ddb,
+        table_name: str,
+        get_chain_nonce: Callable[[str, int], int],
+    ) -> None:
+        self.client_ddb = client_ddb
+        self.table_name = table_name
+        self.get_chain_nonce = get_chain_nonce
+
+    def item_key(self, account: str, key: int) -> dict:
+        return {"account": {"S": account}, "nonce_key": {"S": str(key)}}
+
+    def chain_sequence(self, account: str, key: int) -> int:
+        chain_key, sequence = split_nonce(self.get_chain_nonce(account, key))
+        if chain_key != key:
+            raise Exception(f"unexpected nonce key returned by EntryPoint: {chain_key}")
+
+        return sequence
+
+    def reserve(self, account: str, key: int = 0, count: int = 1) -> List[int]:
+        """
+        reserve count consecutive nonces, concurrent callers always receive disjoint ranges
+        """
+        if count < 1:
+            raise ValueError("count must be positive")
+
+        account = to_checksum_address(account)
+        for _ in range(MAX_RESERVE_ATTEMPTS):
+            try:
+                response = self.client_ddb.update_item(
+                    TableName=self.table_name,
+                    Key=self.item_key(account, key),
+                    UpdateExpression="ADD next_sequence :count SET updated_at = :now",
+                    ConditionExpression="attribute_exists(next_sequence)",
+                    ExpressionAttributeValues={
+                        ":count": {"N": str(count)},
+                        ":now": {"N": str(int(time.time()))},
+                    },
+                    ReturnValues="UPDATED_OLD",
+                )
+                start = int(response["Attributes"]["next_sequence"]["N"])
+                return [compose_nonce(key, start + i) for i in range(count)]
+            except Exception as e:
+                if not is_conditional_check_failure(e):
+                    raise
+
+            # no cursor yet, initialize it from the chain - only one of concurrent initializations succeeds, the
+            # others retry the atomic reservation against the new cursor
+            start = self.chain_sequence(account, key)
+            try:
+                self.client_ddb.put_item(
+                    TableName=self.table_name,
+                    Item={
+                        **self.item_key(account, key),
+                        "next_sequence": {"N": str(start + count)},
+                        "updated_at": {"N": str(int(time.time()))},
+                    },
+                    ConditionExpression="attribute_not_exists(next_sequence)",
+                )
+                return [compose_nonce(key, start + i) for i in range(count)]
+            except Exception as e:
+                if not is_conditional_check_failure(e):
+                    raise
+
+        raise Exception(
+            f"could not reserve nonce for account ({account}) and key ({key}) after {MAX_RESERVE_ATTEMPTS} attempts"
+        )
+
+    def resync(
+        self, account: str, key: int = 0, failed_nonce: Optional[int] = None
+    ) -> dict:
+        """
+        reset the cursor to the EntryPoint nonce after a gap or a reverted user operation
+
+        with failed_nonce the cursor is only reset if it is still ahead of that nonce, so multiple failures reported
+        for the same gap rewind the cursor once
+        """
+        account = to_checksum_address(account)
+        sequence = self.chain_sequence(account, key)
+
+        update = {
+            "TableName": self.table_name,
+            "Key": self.item_key(account, key),
+            "UpdateExpression": "SET next_sequence = :sequence, updated_at = :now",
+            "ExpressionAttributeValues": {
+                ":sequence": {"N": str(sequence)},
+                ":now": {"N": str(int(time.time()))},
+            },
+            "ReturnValues": "UPDATED_OLD",
+        }
+        if failed_nonce is not None:
+            failed_key, failed_sequence = split_nonce(failed_nonce)
+            if failed_key != key:
+                raise ValueError(f"failed nonce does not belong to nonce key {key}")
+            update["ConditionExpression"] = (
+                "attribute_not_exists(next_sequence) OR next_sequence > :failed"
+            )
+            update["ExpressionAttributeValues"][":failed"] = {"N": str(failed_sequence)}
+
+        try:
+            response = self.client_ddb.update_item(**update)
+        except Exception as e:
+            if not is_conditional_check_failure(e):
+                raise
+            # cursor already rewound below the failed nonce
+            return {"resynced": False}
+
+        previous = response.get("Attributes", {}).get("next_sequence")
+
+        return {
+            "resynced": True,
+            "previous_nonce": (
+                compose_nonce(key, int(previous["N"])) if previous else None
+            ),
+            "next_nonce": compose_nonce(key, sequence),
+        }
@@ -0,0 +1,253 @@
+#  Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#  SPDX-License-Identifier: MIT-0
+"""
+bulk key provisioning for user migrations
+
+subs are processed in chunks: existing sub mappings are skipped (BatchGetItem), key pairs for the remaining subs are
+generated concurrently with a bounded thread pool whose concurrency adapts to KMS throttling (additive increase,
+multiplicative decrease), and key and mapping items are written with BatchWriteItem - key items first so that a
+mapping never points to a missing key. The index of the next unprocessed sub is checkpointed after every chunk.
+
+BatchWriteItem does not support conditions, provisioning should run before the migrated users sign in
+"""
+
+import json
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, List, Optional
+
+from aws_errors import is_throttling_error
+from ddb_batch import batch_write_items
+
+BATCH_GET_MAX_KEYS = 100
+BATCH_MAX_RETRIES = 8
+
+KEY_GENERATION_MAX_ATTEMPTS = 8
+
+
+class AdaptiveConcurrencyLimiter:
+    """
+    AIMD concurrency limit: +1 after a full window of successful requests, halved on throttling
+    """
+
+    def __init__(self, max_limit: int, initial_limit: Optional[int] = None) -> None:
+        self.max_limit = max_limit
+        self.limit = initial_limit or max(1, max_limit // 2)
+        self.in_flight = 0
+        self.successes = 0
+        self.throttles = 0
+        self._condition = threading.Condition()
+
+    def acquire(self) -> None:
+        with self._condition:
+            while self.in_flight >= self.limit:
+                self._condition.wait()
+            self.in_flight += 1
+
+    def release(self, throttled: bool) -> None:
+        with self._condition:
+            self.in_flight -= 1
+            if throttled:
+                self.throttles += 1
+                self.successes = 0
+                self.limit = max(1, self.limit // 2)
+            else:
+                self.successes += 1
+                if self.successes >= self.limit and self.limit < self.max_limit:
+                    self.successes = 0
+                    self.limit += 1
+            self._condition.notify_all()
+
+
+def generate_with_backoff(
+    generate_key: Callable[[str], dict], limiter: AdaptiveConcurrencyLimiter, sub: str
+) -> dict:
+    for attempt in range(KEY_GENERATION_MAX_ATTEMPTS):
+        limiter.acquire()
+        throttled = False
+        try:
+            return generate_key(sub)
+        except Exception as e:
+            if not is_throttling_error(e) or attempt == KEY_GENERATION_MAX_ATTEMPTS - 1:
+                raise
+            throttled = True
+        finally:
+            limiter.release(throttled)
+
+        # full jitter exponential backoff
+        time.sleep(random.uniform(0, min(5.0, 0.05 * 2**attempt)))
+
+    raise Exception(f"key generation for sub ({sub}) throttled")
+
+
+def existing_subs(client_ddb, mapping_table: str, subs: List[str]) -> set:
+    found = set()
+    for start in range(0, len(subs), BATCH_GET_MAX_KEYS):
+        request_items = {
+            mapping_table: {
+                "Keys": [
+                    {"sub": {"S": sub}}
+                    for sub in subs[start : start + BATCH_GET_MAX_KEYS]
+                ],
+                "ProjectionExpression": "#sub",
+                "ExpressionAttributeNames": {"#sub": "sub"},
+            }
+        }
+        for attempt in range(BATCH_MAX_RETRIES):
+            response = client_ddb.batch_get_item(RequestItems=request_items)
+            found.update(
+                item["sub"]["S"]
+                for item in response["Responses"].get(mapping_table, [])
+            )
+            request_items = response.get("UnprocessedKeys") or {}
+            if not request_items:
+                break
+            time.sleep(min(2.0, 0.05 * 2**attempt))
+        else:
+            raise Exception("unprocessed keys left after BatchGetItem retries")
+
+    return found
+
+
+def provision_chunk(
+    client_ddb,
+    key_table: str,
+    mapping_table: str,
+    generate_key: Callable[[str], dict],
+    executor: ThreadPoolExecutor,
+    limiter: AdaptiveConcurrencyLimiter,
+    subs: List[str],
+) -> dict:
+    # duplicates within the manifest would be rejected by BatchWriteItem
+    subs = list(dict.fromkeys(subs))
+    existing = existing_subs(client_ddb, mapping_table, subs)
+    pending = [sub for sub in subs if sub not in existing]
+
+    keys = list(
+        executor.map(
+            lambda sub: generate_with_backoff(generate_key, limiter, sub), pending
+        )
+    )
+
+    batch_write_items(
+        client_ddb,
+        key_table,
+        [
+            {
+                "key_id": {"S": key["key_id"]},
+                "ciphertext": {"S": key["ciphertext"]},
+                "address": {"S": key["address"]},
+            }
+            for key in keys
+        ],
+    )
+    batch_write_items(
+        client_ddb,
+        mapping_table,
+        [
+            {
+                "sub": {"S": sub},
+                "key_id": {"S": key["key_id"]},
+                "backend": {"S": key["backend"]},
+            }
+            for sub, key in zip(pending, keys)
+        ],
+    )
+
+    return {"provisioned": len(pending), "skipped": len(subs) - len(pending)}
+
+
+class S3Checkpoint:
+    """
+    next sub index of a manifest run, stored next to the manifest as <manifest key>.checkpoint.json
+    """
+
+    def __init__(self, client_s3, bucket: str, key: str) -> None:
+        self.client_s3 = client_s3
+        self.bucket = bucket
+        self.key = f"{key}.checkpoint.json"
+
+    def load(self) -> int:
+        try:
+            response = self.client_s3.get_object(Bucket=self.bucket, Key=self.key)
+        except self.client_s3.exceptions.NoSuchKey:
+            return 0
+
+        return json.loads(response["Body"].read())["next_index"]
+
+    def save(self, next_index: int) -> None:
+        self.client_s3.put_object(
+            Bucket=self.bucket,
+            Key=self.key,
+            Body=json.dumps({"next_index": next_index}).encode(),
+        )
+
+
+def load_manifest(client_s3, bucket: str, key: str) -> List[str]:
+    """
+    JSON array of subs or one sub per line
+    """
+    body = client_s3.get_object(Bucket=bucket, Key=key)["Body"].read().decode("utf-8")
+    if body.lstrip().startswith("["):
+        return json.loads(body)
+
+    return [line.strip() for line in body.splitlines() if line.strip()]
+
+
+def provision_keys(
+    client_ddb,
+    key_table: str,
+    mapping_table: str,
+    generate_key: Callable[[str], dict],
+    subs: List[str],
+    start_index: int = 0,
+    workers: int = 16,
+    chunk_size: int = 250,
+    checkpoint: Optional[Callable[[int], None]] = None,
+    should_stop: Callable[[], bool] = lambda: False,
+) -> dict:
+    """
+    provision keys for subs[start_index:], stops after the current chunk once should_stop returns True
+    """
+    limiter = AdaptiveConcurrencyLimiter(max_limit=workers)
+    provisioned = 0
+    skipped = 0
+    next_index = start_index
+    start = time.perf_counter()
+
+    with ThreadPoolExecutor(
+        max_workers=workers, thread_name_prefix="key-provisioning"
+    ) as executor:
+        while next_index < len(subs) and not should_stop():
+            chunk = subs[next_index : next_index + chunk_size]
+            result = provision_chunk(
+                client_ddb,
+                key_table,
+                mapping_table,
+                generate_key,
+                executor,
+                limiter,
+                chunk,
+            )
+            provisioned += result["provisioned"]
+            skipped += result["skipped"]
+            next_index += len(chunk)
+            if checkpoint:
+                checkpoint(next_index)
+
+    elapsed = time.perf_counter() - start
+
+    return {
+        "total": len(subs),
+        "start_index": start_index,
+        "next_index": next_index,
+        "complete": next_index >= len(subs),
+        "provisioned": provisioned,
+        "skipped": skipped,
+        "elapsed_seconds": round(elapsed, 3),
+        "keys_per_second": round(provisioned / elapsed, 1) if elapsed > 0 else 0.0,
+        "concurrency_limit": limiter.limit,
+        "throttled_requests": limiter.throttles,
+    }
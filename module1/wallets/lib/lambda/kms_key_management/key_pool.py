@@ -0,0 +1,285 @@
+#  Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#  SPDX-License-Identifier: MIT-0
+"""
+pool of pre-generated KMS data key pairs for the first login of new users
+
+the pool table holds a fixed number of slots (partition key slot, 0..size-1). A scheduled refiller generates key
+pairs for empty slots, encrypted under the encryption context {"pool_key_id": <key_id>} since the owner is not known
+yet. Filled slots are indexed by the available slots index (partition key pool_state, sort key slot), a new user
+queries it for a few filled slots from a random position onwards and reserves one with a conditional UpdateItem that
+takes it out of the index - an empty pool costs up to two Queries, a drained pool never probes empty slots. The ciphertext
+is then re-encrypted to the {"sub": <sub>} encryption context the signing Lambda decrypts with, so the private key is
+never in plaintext outside of KMS. The slot is deleted after the re-encryption succeeded and put back into the index
+if it failed; reservations abandoned by a failed invocation are deleted by the refiller.
+"""
+
+import base64
+import random
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Optional
+
+from aws_errors import is_conditional_check_failure
+
+POOL_ENCRYPTION_CONTEXT_KEY = "pool_key_id"
+AVAILABLE_SLOTS_INDEX = "availableSlots"
+POOL_STATE_AVAILABLE = "available"
+# reservations outlive the Lambda invocation that made them only if it failed between reservation and deletion
+RESERVATION_TIMEOUT_SECONDS = 900
+
+
+def reserve_slot(
+    client_ddb, table_name: str, slot: int, claim_id: str
+) -> Optional[dict]:
+    """
+    atomically take an available slot out of the index and return its key pair, None if the slot is empty or was
+    reserved concurrently. The item stays in the table until the claim either completes or is released
+    """
+    try:
+        response = client_ddb.update_item(
+            TableName=table_name,
+            Key={"slot": {"N": str(slot)}},
+            UpdateExpression="REMOVE pool_state SET claim_id = :claim_id, claimed_at = :now",
+            ConditionExpression="pool_state = :available",
+            ExpressionAttributeValues={
+                ":available": {"S": POOL_STATE_AVAILABLE},
+                ":claim_id": {"S": claim_id},
+                ":now": {"N": str(int(time.time()))},
+            },
+            ReturnValues="ALL_NEW",
+        )
+    except Exception as e:
+        if is_conditional_check_failure(e):
+            return None
+        raise
+
+    item = response["Attributes"]
+
+    return {
+        "key_id": item["key_id"]["S"],
+        "ciphertext": item["ciphertext"]["S"],
+        "address": item["address"]["S"],
+    }
+
+
+def release_slot(client_ddb, table_name: str, slot: int, claim_id: str) -> None:
+    # the key pair has not been bound to a user, it is made available to the next claim again
+    try:
+        client_ddb.update_item(
+            TableName=table_name,
+            Key={"slot": {"N": str(slot)}},
+            UpdateExpression="SET pool_state = :available REMOVE claim_id, claimed_at",
+            ConditionExpression="claim_id = :claim_id",
+            ExpressionAttributeValues={
+                ":available": {"S": POOL_STATE_AVAILABLE},
+                ":claim_id": {"S": claim_id},
+            },
+        )
+    except Exception as e:
+        if not is_conditional_check_failure(e):
+            raise
+
+
+def delete_reserved_slot(client_ddb, table_name: str, slot: int, claim_id: str) -> None:
+    # a reservation that has been removed concurrently (see refill_pool) has already freed the slot
+    try:
+        client_ddb.delete_item(
+            TableName=table_name,
+            Key={"slot": {"N": str(slot)}},
+            ConditionExpression="claim_id = :claim_id",
+            ExpressionAttributeValues={":claim_id": {"S": claim_id}},
+        )
+    except Exception as e:
+        if not is_conditional_check_failure(e):
+            raise
+
+
+def available_slots(client_ddb, table_name: str, pool_size: int, limit: int) -> list:
+    """
+    up to limit filled slots from the eventually consistent index, slots may have been claimed in the meantime
+
+    the index is read from a random slot onwards, wrapping around to the first slot, so that concurrent claims start
+    at different positions of the pool instead of all competing for the lowest slots
+    """
+    start = random.randrange(pool_size)
+    slots = []
+    # slots below the start are only read if the start is not the first slot
+    for condition in (">=", "<") if start else (">=",):
+        response = client_ddb.query(
+            TableName=table_name,
+            IndexName=AVAILABLE_SLOTS_INDEX,
+            KeyConditionExpression=f"pool_state = :available AND slot {condition} :start",
+            ExpressionAttributeValues={
+                ":available": {"S": POOL_STATE_AVAILABLE},
+                ":start": {"N": str(start)},
+            },
+            Limit=limit - len(slots),
+        )
+        slots.extend(int(item["slot"]["N"]) for item in response["Items"])
+        if len(slots) >= limit:
+            break
+
+    return slots
+
+
+def claim_pooled_key(
+    client_ddb,
+    client_kms,
+    table_name: str,
+    kms_key_id: str,
+    pool_size: int,
+    sub: str,
+    attempts: int = 3,
+) -> Optional[dict]:
+    """
+    claim a pre-generated key pair and bind it to sub, None if no key could be claimed within attempts
+
+    a slot is reserved before its key pair is re-encrypted and only deleted afterwards, a failed re-encryption puts the
+    slot back into the pool. The candidates are tried in random order
+    """
+    slots = available_slots(client_ddb, table_name, pool_size, min(attempts, pool_size))
+    random.shuffle(slots)
+    claim_id = str(uuid.uuid4())
+    for slot in slots:
+        pooled_key = reserve_slot(client_ddb, table_name, slot, claim_id)
+        if pooled_key is None:
+            continue
+
+        try:
+            response = client_kms.re_encrypt(
+                CiphertextBlob=base64.standard_b64decode(pooled_key["ciphertext"]),
+                SourceEncryptionContext={
+                    POOL_ENCRYPTION_CONTEXT_KEY: pooled_key["key_id"]
+                },
+                SourceKeyId=kms_key_id,
+                DestinationKeyId=kms_key_id,
+                DestinationEncryptionContext={"sub": sub},
+            )
+        except Exception:
+            release_slot(client_ddb, table_name, slot, claim_id)
+            raise
+
+        delete_reserved_slot(client_ddb, table_name, slot, claim_id)
+
+        return {
+            "ciphertext": base64.standard_b64encode(response["CiphertextBlob"]).decode(
+                "utf-8"
+            ),
+            "address": pooled_key["address"],
+            "key_id": pooled_key["key_id"],
+        }
+
+    return None
+
+
+def scan_slots(client_ddb, table_name: str, pool_size: int) -> tuple:
+    """
+    (empty slots, filled slots missing from the available slots index, (slot, claim_id) of abandoned reservations)
+    """
+    occupied = set()
+    unindexed = []
+    abandoned = []
+    expired = time.time() - RESERVATION_TIMEOUT_SECONDS
+    scan_kwargs = {
+        "TableName": table_name,
+        "ProjectionExpression": "slot, pool_state, claim_id, claimed_at",
+    }
+    while True:
+        response = client_ddb.scan(**scan_kwargs)
+        for item in response["Items"]:
+            slot = int(item["slot"]["N"])
+            occupied.add(slot)
+            if "claim_id" in item:
+                if int(item["claimed_at"]["N"]) < expired:
+                    abandoned.append((slot, item["claim_id"]["S"]))
+            elif "pool_state" not in item:
+                unindexed.append(slot)
+        if "LastEvaluatedKey" not in response:
+            break
+        scan_kwargs["ExclusiveStartKey"] = response["LastEvaluatedKey"]
+
+    empty = [slot for slot in range(pool_size) if slot not in occupied]
+
+    return empty, unindexed, abandoned
+
+
+def index_slot(client_ddb, table_name: str, slot: int) -> None:
+    # key pairs pooled before the available slots index existed, claimable once indexed
+    try:
+        client_ddb.update_item(
+            TableName=table_name,
+            Key={"slot": {"N": str(slot)}},
+            UpdateExpression="SET pool_state = :available",
+            ConditionExpression="attribute_exists(slot) AND attribute_not_exists(claim_id)",
+            ExpressionAttributeValues={":available": {"S": POOL_STATE_AVAILABLE}},
+        )
+    except Exception as e:
+        if not is_conditional_check_failure(e):
+            raise
+
+
+def refill_pool(
+    client_ddb,
+    client_kms,
+    table_name: str,
+    kms_key_id: str,
+    pool_size: int,
+    calc_eth_address: Callable[[bytes], str],
+    workers: int = 8,
+) -> dict:
+    """
+    generate key pairs for all empty slots of the pool, returns the number of keys added
+    """
+    start = time.perf_counter()
+    slots, unindexed, abandoned = scan_slots(client_ddb, table_name, pool_size)
+    for slot in unindexed:
+        index_slot(client_ddb, table_name, slot)
+    # the key pair of an abandoned reservation may have been handed out already, it is never made available again
+    for slot, claim_id in abandoned:
+        delete_reserved_slot(client_ddb, table_name, slot, claim_id)
+        slots.append(slot)
+
+    def fill(slot: int) -> bool:
+        key_id = str(uuid.uuid4())
+        data_key_pair = client_kms.generate_data_key_pair_without_plaintext(
+            EncryptionContext={POOL_ENCRYPTION_CONTEXT_KEY: key_id},
+            KeyId=kms_key_id,
+            KeyPairSpec="ECC_SECG_P256K1",
+        )
+        try:
+            client_ddb.put_item(
+                TableName=table_name,
+                Item={
+                    "slot": {"N": str(slot)},
+                    "pool_state": {"S": POOL_STATE_AVAILABLE},
+                    "key_id": {"S": key_id},
+                    "ciphertext": {
+                        "S": base64.standard_b64encode(
+                            data_key_pair["PrivateKeyCiphertextBlob"]
+                        ).decode("utf-8")
+                    },
+                    "address": {"S": calc_eth_address(data_key_pair["PublicKey"])},
+                    "created_at": {"N": str(int(time.time()))},
+                },
+                # a concurrent refill run may have filled the slot in the meantime
+                ConditionExpression="attribute_not_exists(slot)",
+            )
+        except Exception as e:
+            if is_conditional_check_failure(e):
+                return False
+            raise
+
+        return True
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        added = sum(executor.map(fill, slots))
+
+    return {
+        "pool_size": pool_size,
+        "empty_slots": len(slots),
+        "indexed": len(unindexed),
+        "abandoned_reservations": len(abandoned),
+        "added": added,
+        "elapsed_seconds": round(time.perf_counter() - start, 3),
+    }
@@ -3,49 +3,93 @@
 import boto3
 import os
 import logging
-import asn1tools
 import base64
 import uuid
-from web3.auto import w3
+from botocore.config import Config
+from eth_utils import keccak, to_checksum_address
+
+from bulk_provision import S3Checkpoint, load_manifest, provision_keys
+from key_pool import claim_pooled_key, refill_pool
 
 session = boto3.session.Session()
-client_kms = boto3.client("kms")
+# bulk provisioning generates key pairs from a pool of worker threads
+client_kms = boto3.client(
+    "kms",
+    config=Config(
+        max_pool_connections=max(10, int(os.getenv("BULK_PROVISION_WORKERS", "10")))
+    ),
+)
 client_ssm = boto3.client("ssm")
+client_ddb = boto3.client("dynamodb")
+client_s3 = boto3.client("s3")
 kms_key_id = os.getenv("KMS_KEY_ID")
 
+# pre-generated key pairs for new users, disabled if no pool table is configured
+key_pool_table = os.getenv("KEY_POOL_TABLE")
+key_pool_size = int(os.getenv("KEY_POOL_SIZE", "100"))
+
 logger = logging.getLogger()
 
 
-def calc_eth_address(pub_key: bytes) -> str:
-    SUBJECT_ASN = """
-    Key DEFINITIONS ::= BEGIN
+SUBJECT_ASN = """
+Key DEFINITIONS ::= BEGIN
+
+SubjectPublicKeyInfo  ::=  SEQUENCE  {
+   algorithm         AlgorithmIdentifier,
+   subjectPublicKey  BIT STRING
+ }
+
+AlgorithmIdentifier  ::=  SEQUENCE  {
+    algorithm   OBJECT IDENTIFIER,
+    parameters  ANY DEFINED BY algorithm OPTIONAL
+  }
+
+END
+"""
+
+# DER header of a SubjectPublicKeyInfo (RFC 5480) with id-ecPublicKey/secp256k1 and a 66 byte BIT STRING:
+# SEQUENCE(86) { SEQUENCE(16) { OID 1.2.840.10045.2.1, OID 1.3.132.0.10 }, BIT STRING(66) 0 unused bits }
+SPKI_SECP256K1_PREFIX = bytes.fromhex("3056301006072a8648ce3d020106052b8104000a034200")
+UNCOMPRESSED_POINT = 0x04
+UNCOMPRESSED_POINT_LENGTH = 65
+
+# asn1tools grammar of the fallback path, compiled on first use
+subject_asn = None
 
-    SubjectPublicKeyInfo  ::=  SEQUENCE  {
-       algorithm         AlgorithmIdentifier,
-       subjectPublicKey  BIT STRING
-     }
 
-    AlgorithmIdentifier  ::=  SEQUENCE  {
-        algorithm   OBJECT IDENTIFIER,
-        parameters  ANY DEFINED BY algorithm OPTIONAL
-      }
+def extract_public_key_point(pub_key: bytes) -> bytes:
+    """
+    64 byte x || y coordinates of a DER encoded secp256k1 SubjectPublicKeyInfo as returned by KMS
 
-    END
+    the layout is fixed for uncompressed secp256k1 keys, anything else falls back to the asn1tools decoder
     """
+    if (
+        len(pub_key) == len(SPKI_SECP256K1_PREFIX) + UNCOMPRESSED_POINT_LENGTH
+        and pub_key.startswith(SPKI_SECP256K1_PREFIX)
+        and pub_key[len(SPKI_SECP256K1_PREFIX)] == UNCOMPRESSED_POINT
+    ):
+        return pub_key[len(SPKI_SECP256K1_PREFIX) + 1 :]
+
+    logger.debug("SPKI fast path not applicable, falling back to asn1tools")
+
+    global subject_asn
+    if subject_asn is None:
+        import asn1tools
+
+        subject_asn = asn1tools.compile_string(SUBJECT_ASN)
 
-    key = asn1tools.compile_string(SUBJECT_ASN)
-    key_decoded = key.decode("SubjectPublicKeyInfo", pub_key)
+    key_decoded = subject_asn.decode("SubjectPublicKeyInfo", pub_key)
 
     pub_key_raw = key_decoded["subjectPublicKey"][0]
-    pub_key = pub_key_raw[1 : len(pub_key_raw)]
 
-    # https://www.oreilly.com/library/view/mastering-ethereum/9781491971932/ch04.html
-    hex_address = w3.keccak(bytes(pub_key)).hex()
-    eth_address = "0x{}".format(hex_address[-40:])
+    return bytes(pub_key_raw[1 : len(pub_key_raw)])
+
 
-    eth_checksum_addr = w3.to_checksum_address(eth_address)
+def calc_eth_address(pub_key: bytes) -> str:
+    pub_key = extract_public_key_point(pub_key)
 
-    return eth_checksum_addr
+    # https://www.oreilly.com/library/view/mastering-ethereum/9781491971932/ch04.html
+    return to_checksum_address(keccak(pub_key)[-20:])
 
 
 def lambda_handler(event, context):
@@ -62,6 +106,32 @@ def lambda_handler(event, context):
     if not sub:
         raise Exception("sub parameter missing in request")
 
+    if key_pool_table:
+        try:
+            pooled_key = claim_pooled_key(
+                client_ddb,
+                client_kms,
+                key_pool_table,
+                kms_key_id,
+                key_pool_size,
+                sub,
+                attempts=int(os.getenv("KEY_POOL_CLAIM_ATTEMPTS", "3")),
+            )
+        except Exception as e:
+            # a claimed key that could not be re-encrypted is dropped, the user gets a freshly generated key
+            logger.error(f"exception happened claiming key from pool: {e}")
+            pooled_key = None
+
+        if pooled_key:
+            logger.debug(f"claimed pooled key: {pooled_key['key_id']}")
+            return {**pooled_key, "backend": "kms"}
+
+        logger.warning("key pool exhausted, generating key pair")
+
+    return generate_key(sub)
+
+
+def generate_key(sub: str) -> dict:
     try:
         data_key_pair = client_kms.generate_data_key_pair_without_plaintext(
             EncryptionContext={"sub": sub},
@@ -98,3 +168,110 @@ def lambda_handler(event, context):
         "key_id": str(uuid.uuid4()),
         "backend": "kms",
     }
+
+
+def refill_handler(event, context):
+    """
+    scheduled refill of the key pool, generates key pairs for all empty pool slots
+    """
+    try:
+        log_level = client_ssm.get_parameter(Name=os.environ["LOG_LEVEL_SSM_PARAM"])
+    except Exception as e:
+        raise e
+    else:
+        logger.setLevel(log_level["Parameter"]["Value"])
+
+    if not key_pool_table:
+        raise Exception("environment config parameter missing: KEY_POOL_TABLE")
+
+    try:
+        result = refill_pool(
+            client_ddb,
+            client_kms,
+            key_pool_table,
+            kms_key_id,
+            key_pool_size,
+            calc_eth_address,
+            workers=int(os.getenv("KEY_POOL_REFILL_WORKERS", "8")),
+        )
+    except Exception as e:
+        logger.error(f"exception happened refilling key pool: {e}")
+        raise
+
+    logger.info(f"key pool refill: {result}")
+
+    return result
+
+
+def bulk_provision_handler(event, context):
+    """
+    provisions keys for a list of subs, e.g. for user migrations
+
+    {"subs": ["68090fe5-1c30-4292-b92a-90e29afb35c4", ...], "start_index": 0}
+    or
+    {"manifest": {"bucket": "my-bucket", "key": "migration/subs.txt"}}
+
+    the run stops before the Lambda timeout and returns next_index, manifest runs resume from the checkpoint stored
+    next to the manifest when invoked again
+    """
+    try:
+        log_level = client_ssm.get_parameter(Name=os.environ["LOG_LEVEL_SSM_PARAM"])
+    except Exception as e:
+        raise e
+    else:
+        logger.setLevel(log_level["Parameter"]["Value"])
+
+    config = ["KMS_KEY_ID", "KMS_KEY_TABLE", "KEY_MAPPING_TABLE"]
+    for param in config:
+        if param not in os.environ or not os.getenv(param):
+            raise Exception(f"environment config parameter missing: {param}")
+
+    checkpoint = None
+    if "manifest" in event:
+        bucket = event["manifest"]["bucket"]
+        key = event["manifest"]["key"]
+        try:
+            subs = load_manifest(client_s3, bucket, key)
+        except Exception as e:
+            raise Exception(
+                f"exception happened loading manifest (s3://{bucket}/{key}): {e}"
+            )
+
+        s3_checkpoint = S3Checkpoint(client_s3, bucket, key)
+        start_index = event.get("start_index", s3_checkpoint.load())
+        checkpoint = s3_checkpoint.save
+    elif "subs" in event:
+        subs = event["subs"]
+        start_index = event.get("start_index", 0)
+    else:
+        raise Exception("either subs or manifest parameter must be specified")
+
+    if not isinstance(subs, list) or not all(
+        isinstance(sub, str) and sub for sub in subs
+    ):
+        raise Exception("subs must be a list of non-empty strings")
+
+    # leave time for the chunk in progress and the checkpoint
+    stop_before_ms = int(os.getenv("BULK_PROVISION_STOP_BEFORE_MS", "120000"))
+
+    try:
+        result = provision_keys(
+            client_ddb,
+            os.environ["KMS_KEY_TABLE"],
+            os.environ["KEY_MAPPING_TABLE"],
+            generate_key,
+            subs,
+            start_index=start_index,
+            workers=int(os.getenv("BULK_PROVISION_WORKERS", "16")),
+            chunk_size=int(os.getenv("BULK_PROVISION_CHUNK_SIZE", "250")),
+            checkpoint=checkpoint,
+            should_stop=lambda: context is not None
+            and context.get_remaining_time_in_millis() < stop_before_ms,
+        )
+    except Exception as e:
+        logger.error(f"exception happened provisioning keys: {e}")
+        raise
+
+    logger.info(f"bulk key provisioning: {result}")
+
+    return result
@@ -4,20 +4,249 @@ import boto3
 import json
 import os
 import logging
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError
+
+from ssm_parameters import ParameterCache
 
 session = boto3.session.Session()
 client_stepfunctions = boto3.client("stepfunctions")
 client_ssm = boto3.client("ssm")
+client_ddb = boto3.client("dynamodb")
 logger = logging.getLogger()
 
+# SSM parameter values cached per warm container, refreshed after the ttl
+parameter_cache = ParameterCache(float(os.getenv("PARAMETER_CACHE_TTL_SECONDS", "60")))
+
+# Cognito aborts the trigger after 5 seconds independent of the Lambda timeout, claims without account address are
+# returned if the state machine has not completed DEADLINE_MARGIN_MS before the deadline
+TRIGGER_DEADLINE_MS = int(os.getenv("TRIGGER_DEADLINE_MS", "5000"))
+DEADLINE_MARGIN_MS = int(os.getenv("DEADLINE_MARGIN_MS", "1000"))
+METRICS_NAMESPACE = os.getenv("PRE_TOKEN_METRICS_NAMESPACE", "Web3Workshop/PreTokenGen")
+
+# SSM parameters the account address is derived from, stored under the key names with the account in the key table
+ACCOUNT_ADDRESS_INPUT_PARAMS = {
+    "account_factory": "AA_ACCOUNT_FACTORY_ADDRESS_SSM_PARAM",
+    "account_entrypoint": "AA_ENTRYPOINT_ADDRESS_SSM_PARAM",
+    "account_salt": "AA_ACCOUNT_SALT_SSM_PARAM",
+}
+
+# synchronous state machine executions are awaited with a timeout, an abandoned execution keeps running in AWS and
+# blocks its worker until start_sync_execution returns
+SF_MAX_WORKERS = 4
+sf_executor = ThreadPoolExecutor(
+    max_workers=SF_MAX_WORKERS, thread_name_prefix="pre-token-sf"
+)
+sf_executor_lock = threading.Lock()
+stale_futures = set()
+
+
+def get_parameters(names: list) -> dict:
+    """
+    values of the given SSM parameters, fetched with a single GetParameters call on cache misses
+    """
+    return parameter_cache.get_parameters(client_ssm, names)
+
+
+def read_key_record(sub: str) -> dict:
+    """
+    key_id, backend, address, account and the account address inputs of sub from the mapping and key table, empty dict
+    if the user has no key yet - account attributes are empty strings if not stored
+    """
+    mapping = client_ddb.get_item(
+        TableName=os.environ["KEY_MAPPING_TABLE"],
+        Key={"sub": {"S": sub}},
+        ProjectionExpression="key_id, backend",
+    )
+    if "Item" not in mapping or "key_id" not in mapping["Item"]:
+        return {}
+
+    key_id = mapping["Item"]["key_id"]["S"]
+    key = client_ddb.get_item(
+        TableName=os.environ["KMS_KEY_TABLE"],
+        Key={"key_id": {"S": key_id}},
+        ProjectionExpression=", ".join(
+            ["address", "account", *ACCOUNT_ADDRESS_INPUT_PARAMS]
+        ),
+    )
+    item = key.get("Item", {})
+    if not item.get("address", {}).get("S"):
+        return {}
+
+    return {
+        "key_id": key_id,
+        "backend": mapping["Item"]["backend"]["S"],
+        "address": item["address"]["S"],
+        "account": item.get("account", {}).get("S", ""),
+        **{
+            name: item.get(name, {}).get("S", "")
+            for name in ACCOUNT_ADDRESS_INPUT_PARAMS
+        },
+    }
+
+
+def lookup_claims_fast_path(sub: str, address_inputs: dict) -> dict:
+    """
+    claims of a returning user read directly from the mapping and key table
+
+    returns an empty dict if the user is new or the key record is incomplete (no account address or an account address
+    calculated for a different account factory, entrypoint or salt), these cases are handled by the state machine
+    """
+    record = read_key_record(sub)
+    if not record:
+        return {}
+
+    if not record["account"] or any(
+        record[name] != value for name, value in address_inputs.items()
+    ):
+        logger.debug(f"account address missing or outdated: {record['key_id']}")
+        return {}
+
+    return record
+
+
+def submit_step_function(pre_token_gen_sf_arn: str, sub: str, email: str) -> Future:
+    """
+    lookup_claims_step_function on the executor, which is replaced once all workers are blocked by abandoned
+    executions so that a login never queues behind them
+    """
+    global sf_executor
+
+    with sf_executor_lock:
+        stale_futures.difference_update(
+            [future for future in stale_futures if future.done()]
+        )
+        if len(stale_futures) >= SF_MAX_WORKERS:
+            logger.warning(
+                f"{len(stale_futures)} abandoned state machine executions pending, replacing executor"
+            )
+            # the blocked threads exit once their executions return
+            sf_executor.shutdown(wait=False)
+            sf_executor = ThreadPoolExecutor(
+                max_workers=SF_MAX_WORKERS, thread_name_prefix="pre-token-sf"
+            )
+            stale_futures.clear()
+
+        return sf_executor.submit(
+            lookup_claims_step_function, pre_token_gen_sf_arn, sub, email
+        )
+
+
+def abandon_step_function(future: Future) -> bool:
+    """
+    gives up waiting for an execution, True if it is still in flight - a queued execution is cancelled instead
+    """
+    if future.cancel():
+        return False
+
+    with sf_executor_lock:
+        stale_futures.add(future)
+
+    return True
+
+
+def degraded_claims(
+    pre_token_gen_sf_arn: str, sub: str, email: str, start_backfill: bool = True
+) -> dict:
+    """
+    claims without account address for a user whose key record exists, the account address is calculated by an
+    asynchronous execution of the state machine and returned with the next token refresh
+
+    no backfill is started while the synchronous execution is still in flight, it stores the account address itself
+    """
+    record = read_key_record(sub)
+    if not record:
+        raise Exception(f"key for sub ({sub}) not available before trigger deadline")
+
+    if not start_backfill:
+        return {**record, "account": ""}
+
+    try:
+        client_stepfunctions.start_execution(
+            stateMachineArn=pre_token_gen_sf_arn,
+            name=f"account_backfill-{sub}-{int(time.time() * 1000)}",
+            input=json.dumps({"sub": sub, "email": email}),
+        )
+    except Exception as e:
+        # the claims are valid without account address, the next login retries the calculation
+        logger.error(f"exception happened starting account address backfill: {e}")
+
+    return {**record, "account": ""}
+
+
+def emit_metrics(path: str, degraded: bool, latency_ms: float) -> None:
+    """
+    CloudWatch Embedded Metric Format, the dimensionless set gives the overall degraded rate
+
+    written as a single JSON line to stdout - CloudWatch only extracts metrics from log events that are a JSON object,
+    the Lambda runtime prefixes the lines of logger with level, timestamp and request id. Metrics are emitted
+    independent of the application log level configured via SSM
+    """
+    print(
+        json.dumps(
+            {
+                "_aws": {
+                    "Timestamp": int(time.time() * 1000),
+                    "CloudWatchMetrics": [
+                        {
+                            "Namespace": METRICS_NAMESPACE,
+                            "Dimensions": [[], ["path"]],
+                            "Metrics": [
+                                {"Name": "Degraded", "Unit": "Count"},
+                                {"Name": "Latency", "Unit": "Milliseconds"},
+                            ],
+                        }
+                    ],
+                },
+                "path": path,
+                "Degraded": int(degraded),
+                "Latency": round(latency_ms, 3),
+            }
+        ),
+        flush=True,
+    )
+
+
+def lookup_claims_step_function(
+    pre_token_gen_sf_arn: str, sub: str, email: str
+) -> dict:
+    try:
+        response_stepfunctions_start = client_stepfunctions.start_sync_execution(
+            stateMachineArn=pre_token_gen_sf_arn,
+            name="{}-{}".format("key_id_lookup", sub),
+            input=json.dumps({"sub": sub, "email": email}),
+        )
+    except Exception as e:
+        logger.error(f"exception happened: {e}")
+        raise
+
+    logger.debug(f"stepfunction start: {response_stepfunctions_start}")
+
+    output = response_stepfunctions_start["output"]
+
+    return json.loads(output)
+
 
 def lambda_handler(event, context):
+    start = time.perf_counter()
+    fast_path_enabled = bool(
+        os.getenv("KEY_MAPPING_TABLE")
+        and os.getenv("KMS_KEY_TABLE")
+        and all(os.getenv(env) for env in ACCOUNT_ADDRESS_INPUT_PARAMS.values())
+    )
+    parameter_names = [os.environ["LOG_LEVEL_SSM_PARAM"]]
+    if fast_path_enabled:
+        parameter_names.extend(
+            os.environ[env] for env in ACCOUNT_ADDRESS_INPUT_PARAMS.values()
+        )
+
     try:
-        log_level = client_ssm.get_parameter(Name=os.environ["LOG_LEVEL_SSM_PARAM"])
+        parameters = get_parameters(parameter_names)
     except Exception as e:
         raise e
     else:
-        logger.setLevel(log_level["Parameter"]["Value"])
+        logger.setLevel(parameters[os.environ["LOG_LEVEL_SSM_PARAM"]])
 
     # todo key mode configurable ia ssm
     key_mode = os.getenv("KEY_MODE")
@@ -36,20 +265,50 @@ def lambda_handler(event, context):
     sub = event["request"]["userAttributes"]["sub"]
     email = event["request"]["userAttributes"]["email"]
 
-    try:
-        response_stepfunctions_start = client_stepfunctions.start_sync_execution(
-            stateMachineArn=pre_token_gen_sf_arn,
-            name="{}-{}".format("key_id_lookup", sub),
-            input=json.dumps({"sub": sub, "email": email}),
-        )
-    except Exception as e:
-        logger.error(f"exception happened: {e}")
-        raise
+    output_parsed = {}
+    # key records of the nitro backend are stored in a different table, always resolved by the state machine
+    if fast_path_enabled and key_mode == "KMS":
+        try:
+            output_parsed = lookup_claims_fast_path(
+                sub,
+                {
+                    name: parameters[os.environ[env]]
+                    for name, env in ACCOUNT_ADDRESS_INPUT_PARAMS.items()
+                },
+            )
+        except Exception as e:
+            logger.warning(f"exception happened in key lookup fast path: {e}")
 
-    logger.debug(f"stepfunction start: {response_stepfunctions_start}")
+    path = "fast_path"
+    if output_parsed:
+        logger.debug(f"key lookup fast path: {output_parsed}")
+    else:
+        path = "step_function"
+        future = submit_step_function(pre_token_gen_sf_arn, sub, email)
+        # degraded claims require the direct table access of the kms key mode
+        if fast_path_enabled and key_mode == "KMS":
+            remaining_ms = TRIGGER_DEADLINE_MS - (time.perf_counter() - start) * 1000
+            if context is not None:
+                remaining_ms = min(remaining_ms, context.get_remaining_time_in_millis())
+            timeout = max(0.0, remaining_ms - DEADLINE_MARGIN_MS) / 1000
+        else:
+            timeout = None
 
-    output = response_stepfunctions_start["output"]
-    output_parsed = json.loads(output)
+        try:
+            output_parsed = future.result(timeout=timeout)
+        except TimeoutError:
+            logger.warning(
+                f"state machine did not complete within {timeout:.3f}s, issuing claims without account address"
+            )
+            path = "degraded"
+            output_parsed = degraded_claims(
+                pre_token_gen_sf_arn,
+                sub,
+                email,
+                start_backfill=not abandon_step_function(future),
+            )
+
+    emit_metrics(path, path == "degraded", (time.perf_counter() - start) * 1000)
 
     key_id = output_parsed["key_id"]
     public_address = output_parsed["address"]
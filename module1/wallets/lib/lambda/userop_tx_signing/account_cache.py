@@ -0,0 +1,108 @@
+#  Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#  SPDX-License-Identifier: MIT-0
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+from eth_account.signers.local import LocalAccount
+
+
+class _CacheEntry:
+    __slots__ = ("account", "key_material", "expires_at")
+
+    def __init__(
+        self, account: LocalAccount, key_material: bytearray, expires_at: float
+    ) -> None:
+        self.account = account
+        self.key_material = key_material
+        self.expires_at = expires_at
+
+    def release(self) -> None:
+        """
+        drops the references of the cache to the account, this is not an erasure of the key material - eth_account and
+        eth_keys keep immutable copies that stay in memory until garbage collected. Only the bytearray handed to the
+        cache is overwritten
+        """
+        for i in range(len(self.key_material)):
+            self.key_material[i] = 0
+        self.account = None
+
+
+class SigningAccountCache:
+    """
+    in-memory cache for decrypted signing accounts keyed by (key_id, sub)
+
+    entries expire after ttl_seconds, the number of entries is capped by max_entries with least recently used
+    entries being evicted first, the cache drops its references to expired or evicted accounts
+    """
+
+    def __init__(self, ttl_seconds: float, max_entries: int) -> None:
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries: "OrderedDict[Tuple[str, str], _CacheEntry]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.ttl_seconds > 0 and self.max_entries > 0
+
+    def get(self, key_id: str, sub: str) -> Optional[LocalAccount]:
+        if not self.enabled:
+            return None
+
+        cache_key = (key_id, sub)
+        with self._lock:
+            entry = self._entries.get(cache_key)
+            if entry is None:
+                self.misses += 1
+                return None
+
+            if entry.expires_at <= time.monotonic():
+                del self._entries[cache_key]
+                entry.release()
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(cache_key)
+            self.hits += 1
+
+            return entry.account
+
+    def put(
+        self, key_id: str, sub: str, account: LocalAccount, key_material: bytearray
+    ) -> None:
+        if not self.enabled:
+            return
+
+        cache_key = (key_id, sub)
+        entry = _CacheEntry(account, key_material, time.monotonic() + self.ttl_seconds)
+        with self._lock:
+            previous = self._entries.pop(cache_key, None)
+            if previous is not None:
+                previous.release()
+
+            self._entries[cache_key] = entry
+
+            while len(self._entries) > self.max_entries:
+                _, evicted = self._entries.popitem(last=False)
+                evicted.release()
+                self.evictions += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            for entry in self._entries.values():
+                entry.release()
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "size": len(self._entries),
+            }
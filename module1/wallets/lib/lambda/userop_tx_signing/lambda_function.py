@@ -2,6 +2,8 @@
 #  SPDX-License-Identifier: MIT-0
 import os
 import base64
+import json
+import time
 import boto3
 import eth_account
 import web3
@@ -10,14 +12,51 @@ from eth_account import Account
 from ecdsa import SigningKey, SECP256k1
 
 from aws_lambda_powertools import Logger
+from aws_lambda_powertools.utilities.idempotency import idempotent
+from account_cache import SigningAccountCache
+from single_flight import SingleFlight
+from stage_metrics import instrument_stages, set_cache_status, stage
+from typed_data import hash_typed_data
+from userop import eth_signed_message_hash, hash_userop
+from signing_backend import configure_signing_backend
+from signing_idempotency import create_idempotency_config, create_persistence_layer
+from rpc_providers import get_web3
+from aws_errors import is_throttling_error
 
 session = boto3.session.Session()
 client_ssm = boto3.client("ssm")
 client_kms = boto3.client("kms")
 client_ddb = boto3.client("dynamodb")
+client_sqs = boto3.client("sqs")
 
 logger = Logger()
 
+# secp256k1 backend used for signing: auto (native if available), native (coincurve) or python
+signing_backend = configure_signing_backend(os.getenv("SIGNING_BACKEND", "auto"))
+logger.info(f"signing backend: {signing_backend}")
+
+# warm container cache for decrypted signing accounts - disabled if ttl or max entries are set to 0
+account_cache = SigningAccountCache(
+    ttl_seconds=float(os.getenv("SIGNING_ACCOUNT_CACHE_TTL_SECONDS", "0")),
+    max_entries=int(os.getenv("SIGNING_ACCOUNT_CACHE_MAX_ENTRIES", "0")),
+)
+
+# concurrent requests for the same (key_id, sub) share one DynamoDB lookup and KMS decryption
+key_loads = SingleFlight()
+
+DER_INTEGER = 0x02
+DER_OCTET_STRING = 0x04
+DER_SEQUENCE = 0x30
+# OID 1.2.840.10045.2.1 (id-ecPublicKey) followed by OID 1.3.132.0.10 (secp256k1)
+EC_SECP256K1_ALGORITHM_IDENTIFIER = bytes.fromhex("06072a8648ce3d020106052b8104000a")
+
+# duplicate signing requests (client retries) return the stored result without touching DynamoDB/KMS
+idempotency_persistence_layer = create_persistence_layer()
+idempotency_config = create_idempotency_config()
+
+# chain id per RPC endpoint, resolved once for the lifetime of the container
+chain_ids = {}
+
 
 def get_chain_id() -> int:
     try:
@@ -29,7 +68,11 @@ def get_chain_id() -> int:
             f"exception happened getting RPC_ENDPOINT parameter from SSM: {e}"
         )
 
-    w3 = web3.Web3(web3.HTTPProvider(rpc_endpoint["Parameter"]["Value"]))
+    rpc_endpoint_url = rpc_endpoint["Parameter"]["Value"]
+    if rpc_endpoint_url in chain_ids:
+        return chain_ids[rpc_endpoint_url]
+
+    w3 = get_web3(rpc_endpoint_url)
 
     try:
         chain_id = w3.eth.chain_id
@@ -38,24 +81,39 @@ def get_chain_id() -> int:
             f"exception happened getting chain_id via provided RPC endpoint: {e}"
         )
 
+    chain_ids[rpc_endpoint_url] = chain_id
+
     return chain_id
 
 
+def get_entrypoint_address() -> str:
+    try:
+        entrypoint_address = client_ssm.get_parameter(
+            Name=os.getenv("AA_ENTRYPOINT_ADDRESS_SSM_PARAM")
+        )
+    except Exception as e:
+        raise Exception(
+            f"exception happened getting AA_ENTRYPOINT_ADDRESS parameter from SSM: {e}"
+        )
+
+    return entrypoint_address["Parameter"]["Value"]
+
+
 def get_encrypted_kms_key(key_id: str) -> dict:
     kms_key_table = os.getenv("KMS_KEY_TABLE")
     print(f"get_encrypted_kms_key key_id: {key_id}")
     try:
-        encrypted_kms_key = client_ddb.get_item(
-            TableName=kms_key_table, 
-            Key={"key_id": {"S": key_id}}
-        )
+        with stage("ddb_get_item"):
+            encrypted_kms_key = client_ddb.get_item(
+                TableName=kms_key_table, Key={"key_id": {"S": key_id}}
+            )
     except Exception as e:
         raise Exception(
             f"exception happened getting encrypted key (key_id: {key_id}) from DynamoDB: {e}"
         )
-    
+
     print(f"encrypted_kms_key DDB item: {encrypted_kms_key}")
-    
+
     if "Item" not in encrypted_kms_key:
         logger.warning(f"no encrypted key found for key_id: {key_id}")
         return {}
@@ -74,11 +132,12 @@ def get_encrypted_kms_key(key_id: str) -> dict:
 
 def decrypt_encrypted_kms_key(ciphertext: bytes, sub: str) -> bytes:
     try:
-        plaintext_key = client_kms.decrypt(
-            KeyId=os.getenv("KMS_KEY_ID"),
-            CiphertextBlob=ciphertext,
-            EncryptionContext={"sub": sub},
-        )
+        with stage("kms_decrypt"):
+            plaintext_key = client_kms.decrypt(
+                KeyId=os.getenv("KMS_KEY_ID"),
+                CiphertextBlob=ciphertext,
+                EncryptionContext={"sub": sub},
+            )
     except Exception as e:
         raise Exception(
             f"exception happened decrypting encrypted key with context ({sub}): {e}"
@@ -87,7 +146,71 @@ def decrypt_encrypted_kms_key(ciphertext: bytes, sub: str) -> bytes:
     return plaintext_key["Plaintext"]
 
 
-def parse_der_encoded_private_key(key_der: bytes) -> str:
+def read_der_element(data: bytes, offset: int, tag: int) -> tuple:
+    """
+    read DER element with the expected tag at offset and return (value_start, value_end)
+    """
+    if offset + 2 > len(data) or data[offset] != tag:
+        raise ValueError(f"unexpected DER tag at offset {offset}")
+
+    length = data[offset + 1]
+    offset += 2
+    if length & 0x80:
+        length_bytes = length & 0x7F
+        if length_bytes not in (1, 2) or offset + length_bytes > len(data):
+            raise ValueError("unsupported DER length encoding")
+        length = int.from_bytes(data[offset : offset + length_bytes], "big")
+        offset += length_bytes
+
+    if offset + length > len(data):
+        raise ValueError("DER element exceeds input")
+
+    return offset, offset + length
+
+
+def extract_secp256k1_private_key(key_der: bytes) -> bytes:
+    """
+    extract the 32-byte secp256k1 private key scalar from a DER encoded PKCS#8 PrivateKeyInfo (RFC 5208) wrapping a
+    SEC1 ECPrivateKey (RFC 5915) as returned by KMS for ECC_SECG_P256K1 data key pairs
+
+    raises ValueError if the input does not match the expected layout
+    """
+    start, end = read_der_element(key_der, 0, DER_SEQUENCE)
+    if end != len(key_der):
+        raise ValueError("trailing data after PrivateKeyInfo")
+
+    # version INTEGER 0 (PKCS#8) or 1 (OneAsymmetricKey, RFC 5958)
+    start, offset = read_der_element(key_der, start, DER_INTEGER)
+    if key_der[start:offset] not in (b"\x00", b"\x01"):
+        raise ValueError("unsupported PrivateKeyInfo version")
+
+    # privateKeyAlgorithm SEQUENCE { id-ecPublicKey, secp256k1 }
+    start, offset = read_der_element(key_der, offset, DER_SEQUENCE)
+    if key_der[start:offset] != EC_SECP256K1_ALGORITHM_IDENTIFIER:
+        raise ValueError("algorithm identifier is not id-ecPublicKey/secp256k1")
+
+    # privateKey OCTET STRING containing ECPrivateKey SEQUENCE
+    start, _ = read_der_element(key_der, offset, DER_OCTET_STRING)
+    ec_start, _ = read_der_element(key_der, start, DER_SEQUENCE)
+
+    # ECPrivateKey version INTEGER 1
+    version_start, offset = read_der_element(key_der, ec_start, DER_INTEGER)
+    if key_der[version_start:offset] != b"\x01":
+        raise ValueError("unsupported ECPrivateKey version")
+
+    start, end = read_der_element(key_der, offset, DER_OCTET_STRING)
+    if end - start != 32:
+        raise ValueError(f"unexpected private key length: {end - start}")
+
+    return key_der[start:end]
+
+
+def parse_der_encoded_private_key(key_der: bytes) -> bytes:
+    try:
+        return extract_secp256k1_private_key(key_der)
+    except ValueError as e:
+        logger.debug(f"DER fast path not applicable, falling back to ecdsa: {e}")
+
     try:
         key = SigningKey.from_der(key_der)
     except Exception as e:
@@ -98,12 +221,24 @@ def parse_der_encoded_private_key(key_der: bytes) -> str:
             f"private key type different from SECP256K1 curve: {key.curve.curve}"
         )
 
-    key_serialized = key.to_string().hex()
+    key_serialized = key.to_string()
 
     return key_serialized
 
 
 def provide_signing_account(key_id: str, sub: str) -> eth_account.Account:
+    account = account_cache.get(key_id, sub)
+    if account is not None:
+        set_cache_status("hit")
+        logger.debug(f"signing account cache hit: {account_cache.stats()}")
+        return account
+
+    set_cache_status("miss")
+
+    return key_loads.do((key_id, sub), lambda: load_signing_account(key_id, sub))
+
+
+def load_signing_account(key_id: str, sub: str) -> eth_account.Account:
     try:
         encrypted_kms_key = get_encrypted_kms_key(key_id)
     except Exception as e:
@@ -117,24 +252,31 @@ def provide_signing_account(key_id: str, sub: str) -> eth_account.Account:
         raise Exception(f"exception happened decrypting key:{e}")
 
     try:
-        key = parse_der_encoded_private_key(plaintext_kms_key)
+        with stage("der_parse"):
+            key = parse_der_encoded_private_key(plaintext_kms_key)
     except Exception as e:
         raise Exception(f"exception happened parsing EC private key: {e}")
 
+    key_material = bytearray(key)
+    del key
+
     try:
         # key is DER encoded -> contains public ke portion per default
-        account = Account.from_key(key)
+        with stage("account_init"):
+            account = Account.from_key(bytes(key_material))
     except Exception as e:
         raise Exception(
             f"exception happened instantiating signer instance from provided private key: {e}"
         )
 
+    account_cache.put(key_id, sub, account, key_material)
+    logger.debug(f"signing account cache miss: {account_cache.stats()}")
+
     return account
 
 
 def sign_tx(tx_hash: str, key_id: str, sub: str) -> str:
-    # todo tbd chain_id EIP155
-    #  chain_id = get_chain_id()
+    # signs a precomputed hash - use sign_transaction for EIP-155 replay protected transactions
     try:
         account = provide_signing_account(key_id, sub)
     except Exception as e:
@@ -143,10 +285,10 @@ def sign_tx(tx_hash: str, key_id: str, sub: str) -> str:
         )
 
     try:
-        # todo EIP155 not in effect yet - web3py using typed tx to determine v
+        # plain hash signing - v = v + 27
         #  https://github.com/ethereum/eth-account/blob/master/eth_account/_utils/signing.py#L43
-        #  current schema is v = v + 27
-        tx_hash_signature = account.signHash(tx_hash).signature.hex()
+        with stage("sign_hash"):
+            tx_hash_signature = account.signHash(tx_hash).signature.hex()
     except Exception as e:
         raise Exception(
             f"exception happened signing provided transaction hash with signer instance: {e}"
@@ -154,12 +296,47 @@ def sign_tx(tx_hash: str, key_id: str, sub: str) -> str:
 
     del account
 
-    # todo tbd return v, r, s
-    #  reduce(lambda a, b: str(a) + str(b), tx_hash_signature)
-
     return tx_hash_signature
 
 
+def sign_transaction(transaction: dict, key_id: str, sub: str) -> dict:
+    """
+    sign an unsigned legacy, EIP-2930 or EIP-1559 transaction
+
+    the transaction type is derived from the provided fields, chainId is resolved via the configured RPC endpoint if
+    not part of the transaction so that EIP-155 replay protection is always in effect
+    """
+    transaction = dict(transaction)
+
+    if "chainId" not in transaction:
+        try:
+            transaction["chainId"] = get_chain_id()
+        except Exception as e:
+            raise Exception(f"exception happened resolving chain_id: {e}")
+
+    try:
+        account = provide_signing_account(key_id, sub)
+    except Exception as e:
+        raise Exception(
+            f"exception happened providing local signing account for transaction signing:{e}"
+        )
+
+    try:
+        with stage("sign_transaction"):
+            signed_transaction = account.sign_transaction(transaction)
+    except Exception as e:
+        raise Exception(
+            f"exception happened signing provided transaction with signer instance: {e}"
+        )
+
+    del account
+
+    return {
+        "raw_transaction": web3.Web3.to_hex(signed_transaction.rawTransaction),
+        "transaction_hash": web3.Web3.to_hex(signed_transaction.hash),
+    }
+
+
 def sign_userop(userop_hash: str, key_id: str, sub: str) -> str:
     try:
         account = provide_signing_account(key_id, sub)
@@ -172,7 +349,8 @@ def sign_userop(userop_hash: str, key_id: str, sub: str) -> str:
         # legacy v schema for signature right now v = v + 27
         # expecting ERC-191 hash https://eips.ethereum.org/EIPS/eip-191
         # account.sign_message()
-        userop_hash_signature = account.signHash(userop_hash).signature.hex()
+        with stage("sign_hash"):
+            userop_hash_signature = account.signHash(userop_hash).signature.hex()
         # userop_hash_signature = sign_message_hash(account.)
     except Exception as e:
         raise Exception(
@@ -184,6 +362,121 @@ def sign_userop(userop_hash: str, key_id: str, sub: str) -> str:
     return userop_hash_signature
 
 
+def sign_userop_struct(userop: dict, key_id: str, sub: str) -> dict:
+    """
+    compute the EntryPoint v0.6 userOpHash of a full UserOperation locally and sign it
+
+    the entrypoint address is taken from SSM and the chain id from the configured RPC endpoint (cached per container),
+    the signature covers the EIP-191 digest of the userOpHash as verified by SimpleAccount
+    """
+    try:
+        entrypoint_address = get_entrypoint_address()
+        chain_id = get_chain_id()
+    except Exception as e:
+        raise Exception(f"exception happened resolving entrypoint and chain_id: {e}")
+
+    try:
+        with stage("userop_hash"):
+            userop_hash = hash_userop(userop, entrypoint_address, chain_id)
+    except Exception as e:
+        raise Exception(f"exception happened hashing userop: {e}")
+
+    try:
+        account = provide_signing_account(key_id, sub)
+    except Exception as e:
+        raise Exception(
+            f"exception happened providing local signing account for userop signing:{e}"
+        )
+
+    try:
+        with stage("sign_hash"):
+            userop_hash_signature = account.signHash(
+                eth_signed_message_hash(userop_hash)
+            ).signature.hex()
+    except Exception as e:
+        raise Exception(
+            f"exception happened signing userop hash with signer instance: {e}"
+        )
+
+    del account
+
+    return {
+        "userop_hash": userop_hash.hex(),
+        "userop_hash_signature": userop_hash_signature,
+        "entrypoint": entrypoint_address,
+        "chain_id": chain_id,
+    }
+
+
+def sign_typed_data(typed_data: dict, key_id: str, sub: str) -> dict:
+    """
+    sign EIP-712 typed data, domain separators and type hashes are memoized across invocations
+    """
+    try:
+        with stage("typed_data_hash"):
+            typed_data_hash = hash_typed_data(typed_data)
+    except Exception as e:
+        raise Exception(f"exception happened hashing EIP-712 typed data: {e}")
+
+    try:
+        account = provide_signing_account(key_id, sub)
+    except Exception as e:
+        raise Exception(
+            f"exception happened providing local signing account for typed data signing:{e}"
+        )
+
+    try:
+        with stage("sign_hash"):
+            typed_data_signature = account.signHash(typed_data_hash).signature.hex()
+    except Exception as e:
+        raise Exception(
+            f"exception happened signing typed data hash with signer instance: {e}"
+        )
+
+    del account
+
+    return {
+        "typed_data_hash": typed_data_hash.hex(),
+        "typed_data_signature": typed_data_signature,
+    }
+
+
+def sign_batch(items: list, key_id: str, sub: str) -> list:
+    """
+    sign a list of userop and/or tx hashes for the same key_id/sub with a single key load and decryption
+
+    each item is expected to contain either a userop_hash or a tx_hash, results are returned in request order and
+    failures are reported per item instead of failing the whole batch
+    """
+    try:
+        account = provide_signing_account(key_id, sub)
+    except Exception as e:
+        raise Exception(
+            f"exception happened providing local signing account for batch signing:{e}"
+        )
+
+    signatures = []
+    for idx, item in enumerate(items):
+        try:
+            if "userop_hash" in item:
+                with stage("sign_hash"):
+                    signature = account.signHash(item["userop_hash"]).signature.hex()
+                signatures.append({"userop_hash_signature": signature})
+            elif "tx_hash" in item:
+                with stage("sign_hash"):
+                    signature = account.signHash(item["tx_hash"]).signature.hex()
+                signatures.append({"tx_hash_signature": signature})
+            else:
+                raise Exception("either userop_hash or tx_hash must be specified")
+        except Exception as e:
+            logger.warning(f"exception happened signing batch item ({idx}): {e}")
+            signatures.append({"error": f"exception happened signing item: {e}"})
+
+    del account
+
+    return signatures
+
+
 def get_recovery_id(
     msg_hash: str, r: int, s: int, eth_checksum_addr: str, chain_id: int
 ) -> dict:
@@ -199,6 +492,8 @@ def get_recovery_id(
     return {}
 
 
+@instrument_stages
+@idempotent(persistence_store=idempotency_persistence_layer, config=idempotency_config)
 def lambda_handler(event, context):
     config = [
         "KMS_KEY_TABLE",
@@ -211,7 +506,8 @@ def lambda_handler(event, context):
             raise Exception(f"environment config parameter missing: {param}")
 
     try:
-        log_level = client_ssm.get_parameter(Name=os.environ["LOG_LEVEL_SSM_PARAM"])
+        with stage("ssm_log_level"):
+            log_level = client_ssm.get_parameter(Name=os.environ["LOG_LEVEL_SSM_PARAM"])
     except Exception as e:
         raise e
     else:
@@ -245,6 +541,41 @@ def lambda_handler(event, context):
 
         return {"userop_hash_signature": userop_hash_signature}
 
+    if operation == "sign_userop_struct":
+        """
+        {
+          "operation": "sign_userop_struct",
+          "userop": {
+            "sender": "0x7BC12c4D795e513E7C86a720FC577d22b587Be05",
+            "nonce": "0x0",
+            "initCode": "0x",
+            "callData": "0xb61d27f6",
+            "callGasLimit": "0x88b8",
+            "verificationGasLimit": "0x11170",
+            "preVerificationGas": "0xb7d8",
+            "maxFeePerGas": "0x77359400",
+            "maxPriorityFeePerGas": "0x3b9aca00",
+            "paymasterAndData": "0x",
+            "signature": "0x"
+          },
+          "key_id": "acb2ff44-db6a-4bf0-ad00-c499c64d676c",
+          "sub": "68090fe5-1c30-4292-b92a-90e29afb35c4"
+        }
+        """
+        userop = event["userop"]
+        key_id = event["key_id"]
+        sub = event["sub"]
+
+        if not isinstance(userop, dict):
+            raise Exception("userop parameter in request must be an object")
+
+        try:
+            signed_userop = sign_userop_struct(userop, key_id, sub)
+        except Exception as e:
+            raise Exception(f"exception happened signing userop: {e}")
+
+        return signed_userop
+
     if operation == "sign_tx":
         """
         {
@@ -268,5 +599,362 @@ def lambda_handler(event, context):
 
         return {"tx_hash_signature": tx_hash_signature}
 
+    if operation == "sign_transaction":
+        """
+        {
+          "operation": "sign_transaction",
+          "transaction": {
+            "type": 2,
+            "nonce": 0,
+            "to": "0x4159186832d06a97732c6c25bA8bF58F46E457f4",
+            "value": 1000000000000000,
+            "gas": 21000,
+            "maxFeePerGas": 2000000000,
+            "maxPriorityFeePerGas": 1000000000,
+            "data": "0x"
+          },
+          "key_id": "acb2ff44-db6a-4bf0-ad00-c499c64d676c",
+          "sub": "68090fe5-1c30-4292-b92a-90e29afb35c4"
+        }
+        """
+        transaction = event["transaction"]
+        key_id = event["key_id"]
+        sub = event["sub"]
+
+        if not isinstance(transaction, dict):
+            raise Exception("transaction parameter in request must be an object")
+
+        try:
+            signed_transaction = sign_transaction(transaction, key_id, sub)
+        except Exception as e:
+            raise Exception(f"exception happened signing transaction: {e}")
+
+        return signed_transaction
+
+    if operation == "sign_typed_data":
+        """
+        {
+          "operation": "sign_typed_data",
+          "typed_data": {
+            "types": {
+              "Permit": [
+                {"name": "owner", "type": "address"},
+                {"name": "spender", "type": "address"},
+                {"name": "value", "type": "uint256"},
+                {"name": "nonce", "type": "uint256"},
+                {"name": "deadline", "type": "uint256"}
+              ]
+            },
+            "primaryType": "Permit",
+            "domain": {
+              "name": "Token",
+              "version": "1",
+              "chainId": 11155111,
+              "verifyingContract": "0x4159186832d06a97732c6c25bA8bF58F46E457f4"
+            },
+            "message": {
+              "owner": "0x950F572174cf111F4785F525603a5Ef19a2185F5",
+              "spender": "0x4159186832d06a97732c6c25bA8bF58F46E457f4",
+              "value": 1000,
+              "nonce": 0,
+              "deadline": 1700000000
+            }
+          },
+          "key_id": "acb2ff44-db6a-4bf0-ad00-c499c64d676c",
+          "sub": "68090fe5-1c30-4292-b92a-90e29afb35c4"
+        }
+        """
+        typed_data = event["typed_data"]
+        key_id = event["key_id"]
+        sub = event["sub"]
+
+        for field in ["types", "primaryType", "domain", "message"]:
+            if field not in typed_data:
+                raise Exception(f"typed_data parameter missing field: {field}")
+
+        try:
+            typed_data_signature = sign_typed_data(typed_data, key_id, sub)
+        except Exception as e:
+            raise Exception(f"exception happened signing typed data: {e}")
+
+        return typed_data_signature
+
+    if operation == "sign_batch":
+        """
+        {
+          "operation": "sign_batch",
+          "items": [
+            {"userop_hash": "5033589a303c005b7e7818f4bf00e7361335f51f648be16c028951f90a1585d4"},
+            {"tx_hash": "5033589a303c005b7e7818f4bf00e7361335f51f648be16c028951f90a1585d4"}
+          ],
+          "key_id": "acb2ff44-db6a-4bf0-ad00-c499c64d676c",
+          "sub": "68090fe5-1c30-4292-b92a-90e29afb35c4"
+        }
+        """
+        items = event["items"]
+        key_id = event["key_id"]
+        sub = event["sub"]
+
+        if not isinstance(items, list) or not items:
+            raise Exception("items parameter in request must be a non-empty list")
+
+        max_batch_size = int(os.getenv("MAX_SIGNING_BATCH_SIZE", "100"))
+        if len(items) > max_batch_size:
+            raise Exception(
+                f"batch size ({len(items)}) exceeds maximum batch size ({max_batch_size})"
+            )
+
+        try:
+            signatures = sign_batch(items, key_id, sub)
+        except Exception as e:
+            raise Exception(f"exception happened signing batch: {e}")
+
+        return {"signatures": signatures}
+
     else:
         raise Exception(f"operation not supported: {operation}")
+
+
+def defer_messages(records: list) -> None:
+    """
+    hide throttled messages for an exponentially growing delay (by receive count) before SQS delivers them again,
+    messages keep the queue visibility timeout if no request queue url is configured
+    """
+    queue_url = os.getenv("SIGNING_REQUEST_QUEUE_URL")
+    if not queue_url:
+        return
+
+    base_seconds = int(os.getenv("SIGNING_THROTTLE_BACKOFF_SECONDS", "30"))
+    max_seconds = int(os.getenv("SIGNING_THROTTLE_BACKOFF_MAX_SECONDS", "600"))
+    for chunk_start in range(0, len(records), 10):
+        chunk = records[chunk_start : chunk_start + 10]
+        entries = []
+        for idx, record in enumerate(chunk):
+            receive_count = int(
+                record.get("attributes", {}).get("ApproximateReceiveCount", "1")
+            )
+            entries.append(
+                {
+                    "Id": str(idx),
+                    "ReceiptHandle": record["receiptHandle"],
+                    "VisibilityTimeout": min(
+                        max_seconds, base_seconds * 2 ** (receive_count - 1)
+                    ),
+                }
+            )
+        try:
+            client_sqs.change_message_visibility_batch(
+                QueueUrl=queue_url, Entries=entries
+            )
+        except Exception as e:
+            # messages become visible again after the queue visibility timeout
+            logger.warning(f"exception happened deferring throttled messages: {e}")
+
+
+def write_signing_results(results: list) -> set:
+    """
+    persist signing results in the results table or send them to the reply queue
+
+    returns the message ids of results that could not be delivered
+    """
+    results_table = os.getenv("SIGNING_RESULTS_TABLE")
+    reply_queue_url = os.getenv("SIGNING_REPLY_QUEUE_URL")
+    failed = set()
+
+    if results_table:
+        expires_at = str(
+            int(time.time()) + int(os.getenv("SIGNING_RESULTS_TTL_SECONDS", "86400"))
+        )
+        # BatchWriteItem rejects duplicate keys within one request
+        message_ids = {}
+        for result in results:
+            message_ids.setdefault(result["request_id"], []).append(
+                result["message_id"]
+            )
+        results = list({result["request_id"]: result for result in results}.values())
+
+        for chunk_start in range(0, len(results), 25):
+            chunk = results[chunk_start : chunk_start + 25]
+            request_items = {
+                results_table: [
+                    {
+                        "PutRequest": {
+                            "Item": {
+                                "request_id": {"S": result["request_id"]},
+                                "key_id": {"S": result["key_id"]},
+                                "signature": {"S": result["signature"]},
+                                "expires_at": {"N": expires_at},
+                            }
+                        }
+                    }
+                    for result in chunk
+                ]
+            }
+            try:
+                for attempt in range(3):
+                    response = client_ddb.batch_write_item(RequestItems=request_items)
+                    request_items = response.get("UnprocessedItems", {})
+                    if not request_items:
+                        break
+                    # unprocessed items are the result of throttling
+                    time.sleep(0.05 * 2**attempt)
+            except Exception as e:
+                logger.error(f"exception happened writing signing results: {e}")
+                for result in chunk:
+                    failed.update(message_ids[result["request_id"]])
+                continue
+
+            for request in request_items.get(results_table, []):
+                failed.update(
+                    message_ids[request["PutRequest"]["Item"]["request_id"]["S"]]
+                )
+
+    elif reply_queue_url:
+        for chunk_start in range(0, len(results), 10):
+            chunk = results[chunk_start : chunk_start + 10]
+            try:
+                response = client_sqs.send_message_batch(
+                    QueueUrl=reply_queue_url,
+                    Entries=[
+                        {
+                            "Id": str(idx),
+                            "MessageBody": json.dumps(
+                                {
+                                    "request_id": result["request_id"],
+                                    "key_id": result["key_id"],
+                                    "signature": result["signature"],
+                                }
+                            ),
+                        }
+                        for idx, result in enumerate(chunk)
+                    ],
+                )
+            except Exception as e:
+                logger.error(f"exception happened sending signing results: {e}")
+                failed.update(result["message_id"] for result in chunk)
+                continue
+
+            for entry in response.get("Failed", []):
+                failed.add(chunk[int(entry["Id"])]["message_id"])
+
+    else:
+        raise Exception(
+            "either SIGNING_RESULTS_TABLE or SIGNING_REPLY_QUEUE_URL must be configured"
+        )
+
+    return failed
+
+
+def sqs_handler(event, context):
+    """
+    consumes batches of signing requests from SQS
+
+    messages are grouped by (key_id, sub) so that every key is loaded and decrypted once per batch, signatures are
+    written to the results table or reply queue and failed messages are reported as partial batch failures
+
+    malformed messages and items fail individually, a key that cannot be loaded fails the messages of its group. If
+    loading a key is throttled by DynamoDB or KMS, the messages of this and all remaining groups are handed back to SQS
+    with an exponential backoff instead of being retried right away
+
+    message body:
+    {
+      "request_id": "3f1b1a4e-6c0b-4d5e-9f0a-1b2c3d4e5f60",
+      "operation": "sign_userop",
+      "userop_hash": "5033589a303c005b7e7818f4bf00e7361335f51f648be16c028951f90a1585d4",
+      "key_id": "acb2ff44-db6a-4bf0-ad00-c499c64d676c",
+      "sub": "68090fe5-1c30-4292-b92a-90e29afb35c4"
+    }
+    """
+    config = [
+        "KMS_KEY_TABLE",
+        "KMS_KEY_ID",
+        "LOG_LEVEL_SSM_PARAM",
+    ]
+    for param in config:
+        if param not in os.environ or not os.getenv(param):
+            raise Exception(f"environment config parameter missing: {param}")
+
+    try:
+        log_level = client_ssm.get_parameter(Name=os.environ["LOG_LEVEL_SSM_PARAM"])
+    except Exception as e:
+        raise e
+    else:
+        logger.setLevel(log_level["Parameter"]["Value"])
+
+    failed_message_ids = set()
+    records = {record["messageId"]: record for record in event.get("Records", [])}
+    groups = {}
+    for record in event.get("Records", []):
+        message_id = record["messageId"]
+        try:
+            request = json.loads(record["body"])
+            operation = request["operation"]
+            if operation == "sign_userop":
+                item = {"userop_hash": request["userop_hash"]}
+            elif operation == "sign_tx":
+                item = {"tx_hash": request["tx_hash"]}
+            else:
+                raise Exception(f"operation not supported: {operation}")
+
+            groups.setdefault((request["key_id"], request["sub"]), []).append(
+                (message_id, request.get("request_id", message_id), item)
+            )
+        except Exception as e:
+            logger.error(f"exception happened parsing message ({message_id}): {e}")
+            failed_message_ids.add(message_id)
+
+    results = []
+    deferred_message_ids = []
+    for (key_id, sub), messages in groups.items():
+        if deferred_message_ids:
+            # throttled, further key loads in this invocation would be throttled as well
+            deferred_message_ids.extend(message_id for message_id, _, _ in messages)
+            continue
+
+        try:
+            signatures = sign_batch([item for _, _, item in messages], key_id, sub)
+        except Exception as e:
+            if is_throttling_error(e):
+                logger.warning(
+                    f"signing batch for key_id ({key_id}) throttled, deferring remaining messages: {e}"
+                )
+                deferred_message_ids.extend(message_id for message_id, _, _ in messages)
+            else:
+                logger.error(
+                    f"exception happened signing batch for key_id ({key_id}): {e}"
+                )
+                failed_message_ids.update(message_id for message_id, _, _ in messages)
+            continue
+
+        for (message_id, request_id, _), signature in zip(messages, signatures):
+            if "error" in signature:
+                failed_message_ids.add(message_id)
+                continue
+
+            results.append(
+                {
+                    "message_id": message_id,
+                    "request_id": request_id,
+                    "key_id": key_id,
+                    "signature": signature.get("userop_hash_signature")
+                    or signature.get("tx_hash_signature"),
+                }
+            )
+
+    if results:
+        failed_message_ids.update(write_signing_results(results))
+
+    if deferred_message_ids:
+        defer_messages([records[message_id] for message_id in deferred_message_ids])
+        failed_message_ids.update(deferred_message_ids)
+
+    logger.info(
+        f"processed {len(records)} signing requests in {len(groups)} key groups, "
+        f"{len(failed_message_ids)} failed ({len(deferred_message_ids)} deferred after throttling)"
+    )
+
+    return {
+        "batchItemFailures": [
+            {"itemIdentifier": message_id} for message_id in sorted(failed_message_ids)
+        ]
+    }
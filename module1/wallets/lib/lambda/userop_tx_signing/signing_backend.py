@@ -0,0 +1,40 @@
+#  Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#  SPDX-License-Identifier: MIT-0
+import os
+
+from eth_keys.backends.coincurve import is_coincurve_available
+
+# native: libsecp256k1 via coincurve, python: pure python implementation of eth_keys
+SIGNING_BACKENDS = {
+    "native": "eth_keys.backends.CoinCurveECCBackend",
+    "python": "eth_keys.backends.NativeECCBackend",
+}
+
+
+def resolve_signing_backend(name: str) -> str:
+    name = name.lower()
+    if name == "auto":
+        return "native" if is_coincurve_available() else "python"
+
+    if name not in SIGNING_BACKENDS:
+        raise Exception(
+            f"signing backend not supported: {name} (supported: auto, {', '.join(SIGNING_BACKENDS)})"
+        )
+
+    if name == "native" and not is_coincurve_available():
+        raise Exception("native signing backend requires coincurve to be installed")
+
+    return name
+
+
+def configure_signing_backend(name: str) -> str:
+    """
+    select the eth_keys backend used by eth_account for signing and recovery
+
+    eth_keys resolves the backend class via ECC_BACKEND_CLASS whenever a key object is created, so the setting
+    applies to all accounts created afterwards
+    """
+    backend_name = resolve_signing_backend(name)
+    os.environ["ECC_BACKEND_CLASS"] = SIGNING_BACKENDS[backend_name]
+
+    return backend_name
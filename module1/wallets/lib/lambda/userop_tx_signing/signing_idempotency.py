@@ -0,0 +1,122 @@
+#  Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#  SPDX-License-Identifier: MIT-0
+import datetime
+import os
+import threading
+from typing import Any, Dict
+
+from aws_lambda_powertools.utilities.idempotency import (
+    BasePersistenceLayer,
+    DynamoDBPersistenceLayer,
+    IdempotencyConfig,
+)
+from aws_lambda_powertools.utilities.idempotency.exceptions import (
+    IdempotencyItemAlreadyExistsError,
+    IdempotencyItemNotFoundError,
+)
+from aws_lambda_powertools.utilities.idempotency.persistence.base import DataRecord
+
+# (operation, signed payload, key_id, sub) - payload is the hash for sign_userop/sign_tx and the userop struct,
+# transaction, typed data or batch items for the other operations
+SIGNING_IDEMPOTENCY_KEY = "[operation, userop_hash, userop, tx_hash, transaction, typed_data, items, key_id, sub]"
+
+
+def has_item_errors(result) -> bool:
+    # sign_batch reports failures per item, e.g. a transient KMS or DynamoDB error
+    return isinstance(result, dict) and any(
+        "error" in item for item in result.get("signatures", [])
+    )
+
+
+class ItemErrorsNotPersistedMixin:
+    """
+    responses with item errors are not persisted, a retry signs the batch again instead of replaying the errors for
+    the idempotency ttl
+    """
+
+    def save_success(self, data: Dict[str, Any], result: dict) -> None:
+        if has_item_errors(result):
+            self.delete_record(
+                data=data, exception=Exception("response contains item errors")
+            )
+            return
+
+        super().save_success(data=data, result=result)
+
+
+class SigningDynamoDBPersistenceLayer(
+    ItemErrorsNotPersistedMixin, DynamoDBPersistenceLayer
+):
+    pass
+
+
+class InMemoryPersistenceLayer(ItemErrorsNotPersistedMixin, BasePersistenceLayer):
+    """
+    idempotency records kept in memory of the warm Lambda container, used if no idempotency table is configured
+    """
+
+    def __init__(self) -> None:
+        super().__init__()
+        self._records: Dict[str, DataRecord] = {}
+        self._lock = threading.Lock()
+
+    def _get_record(self, idempotency_key) -> DataRecord:
+        with self._lock:
+            record = self._records.get(idempotency_key)
+
+        if record is None:
+            raise IdempotencyItemNotFoundError
+
+        return record
+
+    def _put_record(self, data_record: DataRecord) -> None:
+        now = datetime.datetime.now()
+        with self._lock:
+            existing = self._records.get(data_record.idempotency_key)
+            if (
+                existing is not None
+                and not existing.is_expired
+                and not (
+                    existing.status == "INPROGRESS"
+                    and existing.in_progress_expiry_timestamp is not None
+                    and existing.in_progress_expiry_timestamp
+                    < int(now.timestamp() * 1000)
+                )
+            ):
+                raise IdempotencyItemAlreadyExistsError
+
+            self._records[data_record.idempotency_key] = data_record
+
+            # drop expired records so the store does not grow unbounded in long-lived containers
+            for key in [
+                key for key, record in self._records.items() if record.is_expired
+            ]:
+                del self._records[key]
+
+    def _update_record(self, data_record: DataRecord) -> None:
+        with self._lock:
+            self._records[data_record.idempotency_key] = data_record
+
+    def _delete_record(self, data_record: DataRecord) -> None:
+        with self._lock:
+            self._records.pop(data_record.idempotency_key, None)
+
+
+def create_persistence_layer() -> BasePersistenceLayer:
+    """
+    DynamoDB backed persistence (shared across containers) if IDEMPOTENCY_TABLE is configured, in-memory otherwise
+    """
+    idempotency_table = os.getenv("IDEMPOTENCY_TABLE")
+    if idempotency_table:
+        return SigningDynamoDBPersistenceLayer(table_name=idempotency_table)
+
+    return InMemoryPersistenceLayer()
+
+
+def create_idempotency_config() -> IdempotencyConfig:
+    return IdempotencyConfig(
+        event_key_jmespath=SIGNING_IDEMPOTENCY_KEY,
+        expires_after_seconds=int(os.getenv("IDEMPOTENCY_TTL_SECONDS", "300")),
+        # local cache in front of DynamoDB so that retries hitting the same container skip the table lookup
+        use_local_cache=bool(os.getenv("IDEMPOTENCY_TABLE")),
+    )
@@ -0,0 +1,138 @@
+#  Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#  SPDX-License-Identifier: MIT-0
+import contextvars
+import functools
+import math
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Optional
+
+from aws_lambda_powertools import Logger
+
+METRICS_NAMESPACE = os.getenv("SIGNING_METRICS_NAMESPACE", "Web3Workshop/Signing")
+
+# metrics are emitted independent of the application log level configured via SSM
+metrics_logger = Logger(service="userop_tx_signing_metrics", level="INFO")
+
+current_timer: contextvars.ContextVar = contextvars.ContextVar(
+    "current_timer", default=None
+)
+
+
+class StageTimer:
+    def __init__(self, operation: str) -> None:
+        self.operation = operation
+        self.cache = "none"
+        self.stages: Dict[str, float] = {}
+
+    def record(self, name: str, duration_ms: float) -> None:
+        self.stages[name] = self.stages.get(name, 0.0) + duration_ms
+
+    def to_emf(self) -> dict:
+        return {
+            "_aws": {
+                "Timestamp": int(time.time() * 1000),
+                "CloudWatchMetrics": [
+                    {
+                        "Namespace": METRICS_NAMESPACE,
+                        "Dimensions": [["operation", "cache"]],
+                        "Metrics": [
+                            {"Name": name, "Unit": "Milliseconds"}
+                            for name in self.stages
+                        ],
+                    }
+                ],
+            },
+            "operation": self.operation,
+            "cache": self.cache,
+            **{name: round(duration, 3) for name, duration in self.stages.items()},
+        }
+
+
+class StageLatencyAggregator:
+    """
+    collects stage latencies across a local run and reports p50/p95/p99 per stage
+    """
+
+    def __init__(self) -> None:
+        self.samples: Dict[str, List[float]] = {}
+        self._lock = threading.Lock()
+
+    def add(self, timer: StageTimer) -> None:
+        with self._lock:
+            for name, duration in timer.stages.items():
+                self.samples.setdefault(name, []).append(duration)
+
+    def reset(self) -> None:
+        with self._lock:
+            self.samples.clear()
+
+    @staticmethod
+    def percentile(samples: List[float], p: float) -> float:
+        # nearest-rank percentile
+        ordered = sorted(samples)
+        return ordered[max(0, math.ceil(p / 100 * len(ordered)) - 1)]
+
+    def report(self) -> Dict[str, dict]:
+        with self._lock:
+            return {
+                name: {
+                    "count": len(samples),
+                    "p50": self.percentile(samples, 50),
+                    "p95": self.percentile(samples, 95),
+                    "p99": self.percentile(samples, 99),
+                }
+                for name, samples in self.samples.items()
+            }
+
+    def format_report(self) -> str:
+        lines = [f"{'stage':<16}{'count':>8}{'p50_ms':>10}{'p95_ms':>10}{'p99_ms':>10}"]
+        for name, stats in self.report().items():
+            lines.append(
+                f"{name:<16}{stats['count']:>8}{stats['p50']:>10.3f}{stats['p95']:>10.3f}{stats['p99']:>10.3f}"
+            )
+        return "\n".join(lines)
+
+
+# SIGNING_METRICS_MODE=local aggregates latencies in-process instead of emitting EMF log lines
+local_mode = os.getenv("SIGNING_METRICS_MODE", "emf").lower() == "local"
+aggregator = StageLatencyAggregator()
+
+
+@contextmanager
+def stage(name: str):
+    timer: Optional[StageTimer] = current_timer.get()
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        if timer is not None:
+            timer.record(name, (time.perf_counter() - start) * 1000)
+
+
+def set_cache_status(status: str) -> None:
+    timer: Optional[StageTimer] = current_timer.get()
+    if timer is not None:
+        timer.cache = status
+
+
+def instrument_stages(handler: Callable) -> Callable:
+    @functools.wraps(handler)
+    def wrapper(event, context):
+        operation = (
+            event.get("operation", "unknown") if isinstance(event, dict) else "unknown"
+        )
+        timer = StageTimer(operation)
+        token = current_timer.set(timer)
+        try:
+            return handler(event, context)
+        finally:
+            current_timer.reset(token)
+            if local_mode:
+                aggregator.add(timer)
+            elif timer.stages:
+                metrics_logger.info("signing stage latency", extra=timer.to_emf())
+
+    return wrapper
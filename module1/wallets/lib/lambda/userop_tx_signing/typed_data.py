@@ -0,0 +1,159 @@
+#  Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#  SPDX-License-Identifier: MIT-0
+import functools
+import json
+import re
+
+from eth_abi import encode
+from eth_utils import keccak, to_bytes
+
+# https://eips.ethereum.org/EIPS/eip-712#definition-of-domainseparator
+EIP712_DOMAIN_FIELDS = [
+    ("name", "string"),
+    ("version", "string"),
+    ("chainId", "uint256"),
+    ("verifyingContract", "address"),
+    ("salt", "bytes32"),
+]
+
+# outermost dimension of an array type, nested arrays (T[][], T[2][]) are encoded recursively
+ARRAY_TYPE = re.compile(r"^(.+)\[(\d*)\]$")
+ARRAY_DIMENSIONS = re.compile(r"(\[\d*\])+$")
+
+
+def canonical_json(value) -> str:
+    return json.dumps(value, sort_keys=True, separators=(",", ":"))
+
+
+def find_dependencies(primary_type: str, types: dict, found: list) -> list:
+    primary_type = ARRAY_DIMENSIONS.sub("", primary_type)
+    if primary_type in found or primary_type not in types:
+        return found
+
+    found.append(primary_type)
+    for field in types[primary_type]:
+        find_dependencies(field["type"], types, found)
+
+    return found
+
+
+def encode_type(primary_type: str, types: dict) -> str:
+    dependencies = find_dependencies(primary_type, types, [])
+    dependencies.remove(primary_type)
+
+    return "".join(
+        f"{name}({','.join(field['type'] + ' ' + field['name'] for field in types[name])})"
+        for name in [primary_type] + sorted(dependencies)
+    )
+
+
+@functools.lru_cache(maxsize=1024)
+def type_hash(primary_type: str, types_json: str) -> bytes:
+    return keccak(text=encode_type(primary_type, json.loads(types_json)))
+
+
+def encode_field(field_type: str, value, types: dict, types_json: str) -> tuple:
+    if field_type in types:
+        return "bytes32", hash_struct(field_type, value, types, types_json)
+
+    array_type = ARRAY_TYPE.match(field_type)
+    if array_type:
+        item_type, length = array_type.groups()
+        if length and int(length) != len(value):
+            raise ValueError(f"{field_type} expects {length} items, got {len(value)}")
+        encoded_items = [
+            encode_field(item_type, item, types, types_json) for item in value
+        ]
+        return "bytes32", keccak(
+            encode(
+                [abi_type for abi_type, _ in encoded_items],
+                [item for _, item in encoded_items],
+            )
+        )
+
+    if field_type == "string":
+        return "bytes32", keccak(text=value)
+
+    if field_type == "bytes":
+        return "bytes32", keccak(
+            to_bytes(hexstr=value) if isinstance(value, str) else value
+        )
+
+    if field_type.startswith("bytes"):
+        return field_type, to_bytes(hexstr=value) if isinstance(value, str) else value
+
+    if field_type.startswith(("uint", "int")):
+        return field_type, int(value, 0) if isinstance(value, str) else value
+
+    return field_type, value
+
+
+def hash_struct(primary_type: str, data: dict, types: dict, types_json: str) -> bytes:
+    encoded_fields = [
+        encode_field(field["type"], data[field["name"]], types, types_json)
+        for field in types[primary_type]
+    ]
+
+    return keccak(
+        type_hash(primary_type, types_json)
+        + encode(
+            [abi_type for abi_type, _ in encoded_fields],
+            [value for _, value in encoded_fields],
+        )
+    )
+
+
+@functools.lru_cache(maxsize=256)
+def domain_separator(domain_json: str, domain_type_json: str) -> bytes:
+    """
+    memoized per (chainId, verifyingContract, name, version, salt) and EIP712Domain type schema
+    """
+    domain_types = {"EIP712Domain": json.loads(domain_type_json)}
+
+    return hash_struct(
+        "EIP712Domain",
+        json.loads(domain_json),
+        domain_types,
+        canonical_json(domain_types),
+    )
+
+
+def hash_typed_data(typed_data: dict) -> bytes:
+    """
+    EIP-712 digest keccak256("\\x19\\x01" || domainSeparator || hashStruct(message)) of the provided typed data
+
+    a primaryType of EIP712Domain signs the domain itself, the message hash is omitted as in eth-sig-util
+    """
+    types = dict(typed_data["types"])
+    domain = typed_data["domain"]
+
+    domain_type = types.pop("EIP712Domain", None)
+    if domain_type is None:
+        domain_type = [
+            {"name": name, "type": field_type}
+            for name, field_type in EIP712_DOMAIN_FIELDS
+            if name in domain
+        ]
+
+    separator = domain_separator(canonical_json(domain), canonical_json(domain_type))
+    primary_type = typed_data["primaryType"]
+    if primary_type == "EIP712Domain":
+        return keccak(b"\x19\x01" + separator)
+
+    if primary_type not in types:
+        raise ValueError(f"primaryType {primary_type} not defined in types")
+
+    types_json = canonical_json(types)
+
+    return keccak(
+        b"\x19\x01"
+        + separator
+        + hash_struct(primary_type, typed_data["message"], types, types_json)
+    )
+
+
+def cache_info() -> dict:
+    return {
+        "domain_separator": domain_separator.cache_info()._asdict(),
+        "type_hash": type_hash.cache_info()._asdict(),
+    }
@@ -0,0 +1,71 @@
+#  Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#  SPDX-License-Identifier: MIT-0
+from eth_abi import encode
+from eth_utils import keccak, to_bytes, to_checksum_address
+
+# ERC-4337 v0.6 UserOperation fields in EntryPoint.getUserOpHash pack order, dynamic fields are hashed
+USEROP_FIELDS = [
+    ("sender", "address"),
+    ("nonce", "uint256"),
+    ("initCode", "bytes"),
+    ("callData", "bytes"),
+    ("callGasLimit", "uint256"),
+    ("verificationGasLimit", "uint256"),
+    ("preVerificationGas", "uint256"),
+    ("maxFeePerGas", "uint256"),
+    ("maxPriorityFeePerGas", "uint256"),
+    ("paymasterAndData", "bytes"),
+]
+
+PACKED_USEROP_TYPES = [
+    "bytes32" if field_type == "bytes" else field_type
+    for _, field_type in USEROP_FIELDS
+]
+
+
+def to_uint(value) -> int:
+    # bundler JSON-RPC encodes quantities as hex strings, decimal strings and ints are accepted as well
+    if isinstance(value, int) and not isinstance(value, bool):
+        return value
+    if isinstance(value, str):
+        return int(value, 16) if value.startswith(("0x", "0X")) else int(value)
+
+    raise ValueError(f"unsupported quantity: {value!r}")
+
+
+def pack_userop(userop: dict) -> bytes:
+    """
+    abi encoding of the UserOperation without signature as in UserOperationLib.pack (EntryPoint v0.6)
+    """
+    values = []
+    for name, field_type in USEROP_FIELDS:
+        if name not in userop:
+            raise ValueError(f"userop missing field: {name}")
+
+        value = userop[name]
+        if field_type == "address":
+            values.append(to_checksum_address(value))
+        elif field_type == "bytes":
+            values.append(keccak(to_bytes(hexstr=value or "0x")))
+        else:
+            values.append(to_uint(value))
+
+    return encode(PACKED_USEROP_TYPES, values)
+
+
+def hash_userop(userop: dict, entrypoint: str, chain_id: int) -> bytes:
+    """
+    userOpHash as returned by EntryPoint.getUserOpHash (v0.6): keccak256(abi.encode(keccak256(pack(userOp)),
+    entryPoint, chainId))
+    """
+    return keccak(
+        encode(
+            ["bytes32", "address", "uint256"],
+            [keccak(pack_userop(userop)), to_checksum_address(entrypoint), chain_id],
+        )
+    )
+
+
+def eth_signed_message_hash(message_hash: bytes) -> bytes:
+    # ECDSA.toEthSignedMessageHash - EIP-191 version 0x45 digest of a 32 byte hash as verified by SimpleAccount
+    return keccak(b"\x19Ethereum Signed Message:\n32" + message_hash)
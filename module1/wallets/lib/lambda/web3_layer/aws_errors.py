@@ -0,0 +1,38 @@
+#  Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#  SPDX-License-Identifier: MIT-0
+"""
+classification of AWS service errors raised by boto3 clients, shipped with the web3 layer
+"""
+
+from typing import Optional
+
+THROTTLING_ERROR_CODES = {
+    "ThrottlingException",
+    "ProvisionedThroughputExceededException",
+    "RequestLimitExceeded",
+    "LimitExceededException",
+}
+
+
+def error_code(e: BaseException) -> Optional[str]:
+    response = getattr(e, "response", None)
+    if not isinstance(response, dict):
+        return None
+
+    return response.get("Error", {}).get("Code")
+
+
+def is_throttling_error(e: BaseException) -> bool:
+    """
+    True if e or one of the exceptions it has been raised from is an AWS throttling error
+    """
+    while e is not None:
+        if error_code(e) in THROTTLING_ERROR_CODES:
+            return True
+        e = e.__cause__ or e.__context__
+
+    return False
+
+
+def is_conditional_check_failure(e: BaseException) -> bool:
+    return error_code(e) == "ConditionalCheckFailedException"
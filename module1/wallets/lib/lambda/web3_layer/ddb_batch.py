@@ -0,0 +1,35 @@
+#  Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#  SPDX-License-Identifier: MIT-0
+"""
+DynamoDB batch writes with retries of unprocessed items, shipped with the web3 layer
+"""
+
+import time
+from typing import List
+
+BATCH_WRITE_MAX_ITEMS = 25
+BATCH_WRITE_MAX_RETRIES = 8
+
+
+def batch_write_items(client_ddb, table_name: str, items: List[dict]) -> None:
+    """
+    put items with BatchWriteItem in requests of up to 25 items, unprocessed items are retried with exponential backoff
+    """
+    for start in range(0, len(items), BATCH_WRITE_MAX_ITEMS):
+        request_items = {
+            table_name: [
+                {"PutRequest": {"Item": item}}
+                for item in items[start : start + BATCH_WRITE_MAX_ITEMS]
+            ]
+        }
+
+        for attempt in range(BATCH_WRITE_MAX_RETRIES):
+            response = client_ddb.batch_write_item(RequestItems=request_items)
+            request_items = response.get("UnprocessedItems") or {}
+            if not request_items:
+                break
+            time.sleep(min(2.0, 0.05 * 2**attempt))
+        else:
+            raise Exception(
+                f"unprocessed items left after {BATCH_WRITE_MAX_RETRIES} BatchWriteItem attempts: {table_name}"
+            )
@@ -0,0 +1,301 @@
+#  Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#  SPDX-License-Identifier: MIT-0
+"""
+shared JSON-RPC provider registry for the wallet Lambdas, shipped with the web3 layer
+
+providers are cached per endpoint configuration for the lifetime of the Lambda container and keep one keep-alive
+HTTP session with a bounded connection pool per endpoint. Multiple endpoints can be configured as comma separated
+list, requests are sent to the endpoint with the best latency/error score and fail over to the next one on transport
+errors. With RPC_HEDGE_AFTER_MS set, a request that has not completed after the given delay is additionally sent to
+the next endpoint and the first successful response wins.
+"""
+
+import hashlib
+import json
+import math
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Any, Dict, List, Tuple
+from urllib.parse import urlparse
+
+import requests
+import web3
+from requests.adapters import HTTPAdapter
+from web3.providers.base import JSONBaseProvider
+from web3.types import RPCEndpoint, RPCResponse
+
+# smoothing factor of the exponentially weighted latency and error rate
+EWMA_ALPHA = 0.2
+# latency penalty per unit of error rate, an endpoint failing every request ranks behind one answering within 1s
+ERROR_PENALTY_MS = 1000.0
+LATENCY_SAMPLES = 256
+
+hedge_executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix="rpc-hedge")
+
+
+def endpoint_label(url: str) -> str:
+    """
+    host of the endpoint url followed by a short digest of the full url if it has a path or query - endpoint urls
+    often carry api keys in the path, the digest tells endpoints on the same host apart without revealing them
+    """
+    parsed = urlparse(url)
+    if not parsed.netloc:
+        return url
+
+    if parsed.path.strip("/") or parsed.query:
+        return f"{parsed.netloc}#{hashlib.sha256(url.encode()).hexdigest()[:8]}"
+
+    return parsed.netloc
+
+
+class RPCEndpointClient:
+    """
+    keep-alive session and health statistics of a single RPC endpoint
+    """
+
+    def __init__(self, url: str, pool_maxsize: int, timeout: float) -> None:
+        self.url = url
+        # used instead of the url in logs and metrics
+        self.label = endpoint_label(url)
+        self.timeout = timeout
+
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_maxsize)
+        self.session = requests.Session()
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+        self.requests = 0
+        self.errors = 0
+        self.ewma_latency_ms = 0.0
+        self.ewma_error_rate = 0.0
+        self.latencies: deque = deque(maxlen=LATENCY_SAMPLES)
+        self._lock = threading.Lock()
+
+    @property
+    def score(self) -> float:
+        # lower is better
+        return self.ewma_latency_ms + self.ewma_error_rate * ERROR_PENALTY_MS
+
+    def record(self, latency_ms: float, error: bool) -> None:
+        with self._lock:
+            if self.requests == 0:
+                self.ewma_latency_ms = latency_ms
+            else:
+                self.ewma_latency_ms += EWMA_ALPHA * (latency_ms - self.ewma_latency_ms)
+            self.ewma_error_rate += EWMA_ALPHA * (float(error) - self.ewma_error_rate)
+            self.requests += 1
+            self.errors += int(error)
+            self.latencies.append(latency_ms)
+
+    def post(self, request_data: bytes) -> bytes:
+        start = time.perf_counter()
+        try:
+            response = self.session.post(
+                self.url,
+                data=request_data,
+                headers={"Content-Type": "application/json"},
+                timeout=self.timeout,
+            )
+            response.raise_for_status()
+        except Exception:
+            self.record((time.perf_counter() - start) * 1000, error=True)
+            raise
+
+        self.record((time.perf_counter() - start) * 1000, error=False)
+
+        return response.content
+
+    def metrics(self) -> dict:
+        with self._lock:
+            ordered = sorted(self.latencies)
+            requests_count = self.requests
+            errors = self.errors
+            ewma_latency_ms = self.ewma_latency_ms
+            ewma_error_rate = self.ewma_error_rate
+
+        def percentile(p: float) -> float:
+            # nearest-rank percentile over the most recent samples
+            if not ordered:
+                return 0.0
+            return round(ordered[max(0, math.ceil(p / 100 * len(ordered)) - 1)], 3)
+
+        return {
+            "requests": requests_count,
+            "errors": errors,
+            "ewma_latency_ms": round(ewma_latency_ms, 3),
+            "ewma_error_rate": round(ewma_error_rate, 4),
+            "p50_ms": percentile(50),
+            "p95_ms": percentile(95),
+            "p99_ms": percentile(99),
+        }
+
+
+class FailoverHTTPProvider(JSONBaseProvider):
+    """
+    web3 provider sending each request to the best scored endpoint, failing over (or hedging) to the others
+
+    JSON-RPC error responses (e.g. reverts) are valid answers and are returned as is, only transport errors and
+    HTTP error status codes count as endpoint failures. If all endpoints fail, the raised exception lists the errors of
+    all endpoints and is chained to the last one
+    """
+
+    def __init__(
+        self, endpoints: List[RPCEndpointClient], hedge_after_ms: float = 0.0
+    ) -> None:
+        if not endpoints:
+            raise Exception("at least one RPC endpoint must be provided")
+
+        super().__init__()
+        self.endpoints = endpoints
+        self.hedge_after_ms = hedge_after_ms
+
+    def __str__(self) -> str:
+        return f"FailoverHTTPProvider({', '.join(e.label for e in self.endpoints)})"
+
+    def ranked_endpoints(self) -> List[RPCEndpointClient]:
+        # stable sort, endpoints keep their configured order until statistics are available
+        return sorted(self.endpoints, key=lambda endpoint: endpoint.score)
+
+    def make_request(self, method: RPCEndpoint, params: Any) -> RPCResponse:
+        request_data = self.encode_rpc_request(method, params)
+
+        return self.decode_rpc_response(self.post(request_data))
+
+    def make_batch_request(
+        self, batch: List[Tuple[RPCEndpoint, Any]]
+    ) -> List[RPCResponse]:
+        """
+        sends (method, params) requests as a single JSON-RPC batch, responses are returned in request order
+        """
+        request_ids = [next(self.request_counter) for _ in batch]
+        request_data = json.dumps(
+            [
+                {"jsonrpc": "2.0", "method": method, "params": params, "id": request_id}
+                for (method, params), request_id in zip(batch, request_ids)
+            ]
+        ).encode()
+
+        responses = json.loads(self.post(request_data))
+        if not isinstance(responses, list):
+            raise Exception(f"JSON-RPC batch not supported by endpoint: {responses}")
+
+        responses_by_id = {response.get("id"): response for response in responses}
+        missing = [
+            request_id
+            for request_id in request_ids
+            if request_id not in responses_by_id
+        ]
+        if missing:
+            raise Exception(f"JSON-RPC batch responses missing for ids: {missing}")
+
+        return [responses_by_id[request_id] for request_id in request_ids]
+
+    def post(self, request_data: bytes) -> bytes:
+        endpoints = self.ranked_endpoints()
+        if self.hedge_after_ms > 0 and len(endpoints) > 1:
+            return self.hedged_post(endpoints, request_data)
+
+        errors = []
+        last_error = None
+        for endpoint in endpoints:
+            try:
+                return endpoint.post(request_data)
+            except Exception as e:
+                errors.append(f"{endpoint.label}: {e}")
+                last_error = e
+
+        raise Exception(
+            f"all RPC endpoints failed: {'; '.join(errors)}"
+        ) from last_error
+
+    def hedged_post(
+        self, endpoints: List[RPCEndpointClient], request_data: bytes
+    ) -> bytes:
+        remaining = list(endpoints)
+        pending = {}
+        errors = []
+        last_error = None
+
+        def launch() -> None:
+            endpoint = remaining.pop(0)
+            pending[hedge_executor.submit(endpoint.post, request_data)] = endpoint.label
+
+        launch()
+        while pending:
+            done, _ = wait(
+                pending,
+                timeout=self.hedge_after_ms / 1000 if remaining else None,
+                return_when=FIRST_COMPLETED,
+            )
+            if not done:
+                # slow request, hedge with the next endpoint
+                launch()
+                continue
+
+            for future in done:
+                label = pending.pop(future)
+                try:
+                    return future.result()
+                except Exception as e:
+                    errors.append(f"{label}: {e}")
+                    last_error = e
+
+            if remaining:
+                launch()
+
+        raise Exception(
+            f"all RPC endpoints failed: {'; '.join(errors)}"
+        ) from last_error
+
+    def metrics(self) -> Dict[str, dict]:
+        return {endpoint.label: endpoint.metrics() for endpoint in self.endpoints}
+
+
+# endpoint url to client and endpoint configuration to web3 instance, kept across warm invocations - clients are
+# shared by all configurations containing the endpoint so that sessions and statistics are per endpoint
+endpoint_clients: Dict[str, RPCEndpointClient] = {}
+web3_instances: Dict[str, web3.Web3] = {}
+registry_lock = threading.Lock()
+
+
+def parse_endpoints(endpoints: str) -> List[str]:
+    return [endpoint.strip() for endpoint in endpoints.split(",") if endpoint.strip()]
+
+
+def get_web3(endpoints: str) -> web3.Web3:
+    """
+    cached web3 instance for a comma separated list of RPC endpoints
+    """
+    with registry_lock:
+        w3 = web3_instances.get(endpoints)
+        if w3 is None:
+            clients = []
+            for url in parse_endpoints(endpoints):
+                if url not in endpoint_clients:
+                    endpoint_clients[url] = RPCEndpointClient(
+                        url,
+                        pool_maxsize=int(os.getenv("RPC_POOL_MAXSIZE", "10")),
+                        timeout=float(os.getenv("RPC_TIMEOUT_SECONDS", "10")),
+                    )
+                clients.append(endpoint_clients[url])
+
+            provider = FailoverHTTPProvider(
+                clients, hedge_after_ms=float(os.getenv("RPC_HEDGE_AFTER_MS", "0"))
+            )
+            w3 = web3.Web3(provider)
+            web3_instances[endpoints] = w3
+
+    return w3
+
+
+def endpoint_metrics() -> Dict[str, dict]:
+    """
+    latency and error statistics per RPC endpoint used in this container, keyed by endpoint label
+    """
+    with registry_lock:
+        clients = list(endpoint_clients.values())
+
+    return {client.label: client.metrics() for client in clients}
@@ -0,0 +1,46 @@
+#  Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#  SPDX-License-Identifier: MIT-0
+"""
+SSM parameter values cached per warm Lambda container, shipped with the web3 layer
+"""
+
+import threading
+import time
+
+
+class ParameterCache:
+    """
+    parameter values by name, refreshed with a single GetParameters call once their ttl has expired
+    """
+
+    def __init__(self, ttl_seconds: float) -> None:
+        self.ttl_seconds = ttl_seconds
+        # name -> (value, monotonic expiry)
+        self.values = {}
+        self._lock = threading.Lock()
+
+    def get_parameters(self, client_ssm, names: list) -> dict:
+        now = time.monotonic()
+        with self._lock:
+            cached = {
+                name: self.values[name][0]
+                for name in names
+                if name in self.values and self.values[name][1] > now
+            }
+        missing = list(dict.fromkeys(name for name in names if name not in cached))
+        if not missing:
+            return cached
+
+        response = client_ssm.get_parameters(Names=missing)
+        if response.get("InvalidParameters"):
+            raise Exception(
+                f"SSM parameters not found: {response['InvalidParameters']}"
+            )
+
+        expires_at = now + self.ttl_seconds
+        with self._lock:
+            for parameter in response["Parameters"]:
+                self.values[parameter["Name"]] = (parameter["Value"], expires_at)
+                cached[parameter["Name"]] = parameter["Value"]
+
+        return cached
@@ -0,0 +1,129 @@
+#  Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#  SPDX-License-Identifier: MIT-0
+from typing import Dict
+
+from constructs import Construct
+
+from aws_cdk import (
+    aws_dynamodb as dynamodb,
+    aws_stepfunctions as sf,
+    aws_stepfunctions_tasks as sf_tasks,
+    aws_ssm as ssm,
+)
+
+# SSM values the counterfactual account address is derived from, stored next to the account in the key item under the
+# same names as returned by the counterfactual_address operation of the aa processing lambda
+ACCOUNT_ADDRESS_INPUTS = ("account_factory", "account_entrypoint", "account_salt")
+
+ACCOUNT_ADDRESS_RESULT_SELECTOR = {
+    "key_id.$": "$.Payload.key_id",
+    "address.$": "$.Payload.address",
+    "backend.$": "$.Payload.backend",
+    "account.$": "$.Payload.account",
+    **{f"{name}.$": f"$.Payload.{name}" for name in ACCOUNT_ADDRESS_INPUTS},
+}
+
+
+def lookup_account_address_inputs(
+    scope: Construct,
+    construct_id: str,
+    parameters: Dict[str, ssm.IStringParameter],
+) -> sf.Parallel:
+    """
+    current SSM values of the account address inputs at $.AccountAddressInputs, read concurrently
+    """
+    lookup = sf.Parallel(
+        scope,
+        construct_id,
+        result_path="$.AccountAddressInputs",
+        result_selector={
+            f"{name}.$": f"$[{index}].value"
+            for index, name in enumerate(ACCOUNT_ADDRESS_INPUTS)
+        },
+    )
+    for name in ACCOUNT_ADDRESS_INPUTS:
+        lookup.branch(
+            sf_tasks.CallAwsService(
+                scope,
+                f"{construct_id}{name.title().replace('_', '')}",
+                service="ssm",
+                action="getParameter",
+                parameters={"Name": parameters[name].parameter_name},
+                iam_resources=[parameters[name].parameter_arn],
+                result_selector={"value.$": "$.Parameter.Value"},
+            )
+        )
+
+    return lookup
+
+
+def account_address_stored() -> sf.Condition:
+    return sf.Condition.and_(
+        sf.Condition.is_present("$.KeyParamsForKeyID.Item.account.S"),
+        *[
+            sf.Condition.is_present(f"$.KeyParamsForKeyID.Item.{name}.S")
+            for name in ACCOUNT_ADDRESS_INPUTS
+        ],
+    )
+
+
+def account_address_inputs_unchanged() -> sf.Condition:
+    """
+    the stored account address is only valid if none of its inputs has been changed since it was calculated
+    """
+    return sf.Condition.and_(
+        *[
+            sf.Condition.string_equals_json_path(
+                f"$.KeyParamsForKeyID.Item.{name}.S",
+                f"$.AccountAddressInputs.{name}",
+            )
+            for name in ACCOUNT_ADDRESS_INPUTS
+        ],
+        sf.Condition.not_(
+            sf.Condition.string_equals("$.KeyParamsForKeyID.Item.account.S", "")
+        ),
+    )
+
+
+def cached_account_address(scope: Construct, construct_id: str) -> sf.Pass:
+    return sf.Pass(
+        scope,
+        construct_id,
+        parameters={
+            "key_id.$": "$.KeyParamsForKeyID.Item.key_id.S",
+            "address.$": "$.KeyParamsForKeyID.Item.address.S",
+            "backend.$": "$.KeyIDForSub.Item.backend.S",
+            "account.$": "$.KeyParamsForKeyID.Item.account.S",
+            **{
+                f"{name}.$": f"$.KeyParamsForKeyID.Item.{name}.S"
+                for name in ACCOUNT_ADDRESS_INPUTS
+            },
+        },
+    )
+
+
+def store_account_address(
+    scope: Construct, construct_id: str, key_table: dynamodb.ITable
+) -> sf_tasks.DynamoUpdateItem:
+    names = ("account",) + ACCOUNT_ADDRESS_INPUTS
+
+    return sf_tasks.DynamoUpdateItem(
+        scope,
+        construct_id,
+        table=key_table,
+        key={
+            "key_id": sf_tasks.DynamoAttributeValue.from_string(
+                sf.JsonPath.string_at("$.JWTKeyOutput.key_id")
+            )
+        },
+        update_expression="SET " + ", ".join(f"#{name} = :{name}" for name in names),
+        expression_attribute_names={f"#{name}": name for name in names},
+        expression_attribute_values={
+            f":{name}": sf_tasks.DynamoAttributeValue.from_string(
+                sf.JsonPath.string_at(f"$.JWTKeyOutput.{name}")
+            )
+            for name in names
+        },
+        result_path=sf.JsonPath.DISCARD,
+        output_path="$.JWTKeyOutput",
+    )
@@ -10,6 +10,16 @@ from aws_cdk import (
     aws_stepfunctions_tasks as sf_tasks,
     aws_logs as logs,
     aws_lambda as lambda_,
+    aws_ssm as ssm,
+)
+
+from lib.stepfunctions.account_address import (
+    ACCOUNT_ADDRESS_RESULT_SELECTOR,
+    account_address_inputs_unchanged,
+    account_address_stored,
+    cached_account_address,
+    lookup_account_address_inputs,
+    store_account_address,
 )
 
 
@@ -22,7 +32,10 @@ class JWTStepFunctionConstruct(Construct):
         key_mapping_table: dynamodb.ITable,
         key_table: dynamodb.ITable,
         aa_processing_lambda: lambda_.IFunction,
-        key_management_lambda: lambda_.IFunction
+        key_management_lambda: lambda_.IFunction,
+        aa_account_factory_address_parameter: ssm.IStringParameter,
+        aa_entrypoint_address_parameter: ssm.IStringParameter,
+        aa_account_salt_parameter: ssm.IStringParameter,
     ) -> None:
         super().__init__(scope, construct_id)
 
@@ -41,6 +54,8 @@ class JWTStepFunctionConstruct(Construct):
                 )
             },
             table=key_mapping_table,
+            # the mapping stored by a concurrent first login has to be visible when retrying after a lost race
+            consistent_read=True,
             result_path="$.KeyIDForSub",
         )
 
@@ -56,6 +71,22 @@ class JWTStepFunctionConstruct(Construct):
             result_path="$.KeyParamsForKeyID",
         )
 
+        # account address persisted with the key item is valid as long as none of the SSM values it is derived from has
+        # been changed
+        pre_token_existing_key_lookup_account_inputs = lookup_account_address_inputs(
+            self,
+            f"{signing_backend}LookupAccountAddressInputs",
+            {
+                "account_factory": aa_account_factory_address_parameter,
+                "account_entrypoint": aa_entrypoint_address_parameter,
+                "account_salt": aa_account_salt_parameter,
+            },
+        )
+
+        pre_token_existing_key_cached_aa_address = cached_account_address(
+            self, f"{signing_backend}ExistingKeyCachedAAAccountAddress"
+        )
+
         pre_token_existing_key_calc_aa_address = sf_tasks.LambdaInvoke(
             self,
             "existingKeyAAAccountAddress",
@@ -69,16 +100,14 @@ class JWTStepFunctionConstruct(Construct):
                 }
             ),
             result_path="$.JWTKeyOutput",
-            output_path="$.JWTKeyOutput",
-            result_selector={
-                "key_id.$": "$.Payload.key_id",
-                "address.$": "$.Payload.address",
-                "backend.$": "$.Payload.backend",
-                "account.$": "$.Payload.account",
-            },
+            result_selector=ACCOUNT_ADDRESS_RESULT_SELECTOR,
             retry_on_service_exceptions=True,
         )
 
+        pre_token_existing_key_store_aa_address = store_account_address(
+            self, f"{signing_backend}ExistingKeyDDBUpdateAAAccountAddress", key_table
+        )
+
         pre_token_existing_key_success = sf.Succeed(
             self, f"{signing_backend}ExistingKeySucceed"
         )
@@ -92,40 +121,106 @@ class JWTStepFunctionConstruct(Construct):
             retry_on_service_exceptions=True,
         )
 
-        pre_token_store_new_key = sf_tasks.DynamoPutItem(
+        # key and mapping item are written in one transaction, a concurrent first login of the same sub that stored its
+        # mapping first cancels the transaction and the key generated by this execution is dropped
+        pre_token_store_new_key_and_mapping = sf_tasks.CallAwsService(
             self,
-            f"{signing_backend}DDBPutNewKey",
-            table=key_table,
-            item={
-                "key_id": sf_tasks.DynamoAttributeValue.from_string(
-                    sf.JsonPath.string_at("$.KeyOutput.Payload.key_id")
-                ),
-                "ciphertext": sf_tasks.DynamoAttributeValue.from_string(
-                    sf.JsonPath.string_at("$.KeyOutput.Payload.ciphertext")
-                ),
-                "address": sf_tasks.DynamoAttributeValue.from_string(
-                    sf.JsonPath.string_at("$.KeyOutput.Payload.address")
-                ),
+            f"{signing_backend}DDBTransactWriteNewKeyAndMapping",
+            service="dynamodb",
+            action="transactWriteItems",
+            parameters={
+                "TransactItems": [
+                    {
+                        "Put": {
+                            "TableName": key_table.table_name,
+                            "Item": {
+                                "key_id": {
+                                    "S": sf.JsonPath.string_at(
+                                        "$.KeyOutput.Payload.key_id"
+                                    )
+                                },
+                                "ciphertext": {
+                                    "S": sf.JsonPath.string_at(
+                                        "$.KeyOutput.Payload.ciphertext"
+                                    )
+                                },
+                                "address": {
+                                    "S": sf.JsonPath.string_at(
+                                        "$.KeyOutput.Payload.address"
+                                    )
+                                },
+                            },
+                            "ConditionExpression": "attribute_not_exists(key_id)",
+                        }
+                    },
+                    {
+                        "Put": {
+                            "TableName": key_mapping_table.table_name,
+                            "Item": {
+                                "sub": {"S": sf.JsonPath.string_at("$.sub")},
+                                "key_id": {
+                                    "S": sf.JsonPath.string_at(
+                                        "$.KeyOutput.Payload.key_id"
+                                    )
+                                },
+                                "backend": {
+                                    "S": sf.JsonPath.string_at(
+                                        "$.KeyOutput.Payload.backend"
+                                    )
+                                },
+                            },
+                            "ConditionExpression": "attribute_not_exists(#sub)",
+                            "ExpressionAttributeNames": {"#sub": "sub"},
+                        }
+                    },
+                ]
             },
-            result_path="$.PutKeyOutput",
+            # TransactWriteItems is authorized by the item level actions of each table
+            iam_action="dynamodb:PutItem",
+            iam_resources=[key_table.table_arn, key_mapping_table.table_arn],
+            result_path=sf.JsonPath.DISCARD,
+        )
+        pre_token_store_new_key_and_mapping.add_retry(
+            errors=[
+                "DynamoDb.TransactionConflictException",
+                "DynamoDb.ProvisionedThroughputExceededException",
+                "DynamoDb.ThrottlingException",
+                "DynamoDb.RequestLimitExceeded",
+                "DynamoDb.InternalServerErrorException",
+            ],
+            interval=Duration.seconds(1),
+            max_attempts=2,
+            backoff_rate=2,
         )
 
-        pre_token_store_new_mapping = sf_tasks.DynamoPutItem(
-            self,
-            f"{signing_backend}DDBPutNewSubToKeyIDMapping",
-            table=key_mapping_table,
-            item={
-                "sub": sf_tasks.DynamoAttributeValue.from_string(
-                    sf.JsonPath.string_at("$.sub")
-                ),
-                "key_id": sf_tasks.DynamoAttributeValue.from_string(
-                    sf.JsonPath.string_at("$.KeyOutput.Payload.key_id")
+        # a cancelled transaction reports the reason per item in the error cause - only a failed condition means that a
+        # concurrent first login stored its mapping first, conflicts and throttling are retried by the parallel state
+        pre_token_new_key_transaction_canceled = (
+            sf.Choice(self, f"{signing_backend}ChoiceTransactionCanceledReason")
+            .when(
+                sf.Condition.string_matches(
+                    "$.NewKeyError.Cause", "*ConditionalCheckFailed*"
                 ),
-                "backend": sf_tasks.DynamoAttributeValue.from_string(
-                    sf.JsonPath.string_at("$.KeyOutput.Payload.backend")
+                sf.Fail(
+                    self,
+                    f"{signing_backend}NewKeyMappingExists",
+                    error="NewKeyMappingExists",
+                    cause="mapping for sub stored by a concurrent execution",
                 ),
-            },
-            result_path="$.PutMappingOutput",
+            )
+            .otherwise(
+                sf.Fail(
+                    self,
+                    f"{signing_backend}NewKeyTransactionConflict",
+                    error="NewKeyTransactionConflict",
+                    cause="key and mapping transaction cancelled by a conflict or throttling",
+                )
+            )
+        )
+        pre_token_store_new_key_and_mapping.add_catch(
+            pre_token_new_key_transaction_canceled,
+            errors=["DynamoDb.TransactionCanceledException"],
+            result_path="$.NewKeyError",
         )
 
         pre_token_new_key_calc_aa_address = sf_tasks.LambdaInvoke(
@@ -141,29 +236,81 @@ class JWTStepFunctionConstruct(Construct):
                 }
             ),
             result_path="$.JWTKeyOutput",
-            output_path="$.JWTKeyOutput",
-            result_selector={
-                "key_id.$": "$.Payload.key_id",
-                "address.$": "$.Payload.address",
-                "backend.$": "$.Payload.backend",
-                "account.$": "$.Payload.account",
-            },
+            result_selector=ACCOUNT_ADDRESS_RESULT_SELECTOR,
             retry_on_service_exceptions=True,
         )
 
+        pre_token_new_key_store_aa_address = store_account_address(
+            self, f"{signing_backend}NewKeyDDBUpdateAAAccountAddress", key_table
+        )
+
         pre_token_new_key_success = sf.Succeed(self, f"{signing_backend}NewKeySucceed")
 
+        # only the account address calculation runs alongside the write: the key item and the mapping are stored together
+        # in the transaction, so a mapping never points to a key item that has not been written. The transaction
+        # discards its result and the account address branch carries the state forward
+        pre_token_new_key_parallel = (
+            sf.Parallel(
+                self,
+                f"{signing_backend}NewKeyParallel",
+                output_path="$[1]",
+            )
+            .branch(pre_token_store_new_key_and_mapping)
+            .branch(pre_token_new_key_calc_aa_address)
+        )
+
+        pre_token_new_key_parallel.add_retry(
+            errors=["NewKeyTransactionConflict"],
+            interval=Duration.seconds(1),
+            max_attempts=2,
+            backoff_rate=2,
+        )
+        # lost the first login race, resolve the key stored by the concurrent execution
+        pre_token_new_key_parallel.add_catch(
+            pre_token_gen_lookup_key_mapping,
+            errors=["NewKeyMappingExists"],
+            result_path="$.NewKeyError",
+        )
+
         # key generation part
         pre_token_new_key_flow_definition = (
-            pre_token_gen_new_key.next(pre_token_store_new_key)
-            .next(pre_token_store_new_mapping)
-            .next(pre_token_new_key_calc_aa_address)
+            pre_token_gen_new_key.next(pre_token_new_key_parallel)
+            .next(pre_token_new_key_store_aa_address)
             .next(pre_token_new_key_success)
         )
 
+        # existing key part, the aa processing lambda is only invoked if no valid account address is stored
+        existing_key_calc_aa_address_definition = (
+            pre_token_existing_key_calc_aa_address.next(
+                pre_token_existing_key_store_aa_address
+            ).next(pre_token_existing_key_success)
+        )
+
+        existing_key_account_inputs_choice = (
+            sf.Choice(self, f"{signing_backend}ChoiceAccountAddressInputsUnchanged")
+            .when(
+                account_address_inputs_unchanged(),
+                pre_token_existing_key_cached_aa_address.next(
+                    pre_token_existing_key_success
+                ),
+            )
+            .otherwise(existing_key_calc_aa_address_definition)
+        )
+
+        existing_key_account_address_choice = (
+            sf.Choice(self, f"{signing_backend}ChoiceAccountAddressStored")
+            .when(
+                account_address_stored(),
+                pre_token_existing_key_lookup_account_inputs.next(
+                    existing_key_account_inputs_choice
+                ),
+            )
+            .otherwise(existing_key_calc_aa_address_definition)
+        )
+
         existing_key_flow_definition = pre_token_gen_lookup_key_params.next(
-            pre_token_existing_key_calc_aa_address
-        ).next(pre_token_existing_key_success)
+            existing_key_account_address_choice
+        )
 
         pre_token_gen_choice = (
             sf.Choice(
@@ -9,6 +9,16 @@ from aws_cdk import (
     aws_stepfunctions_tasks as sf_tasks,
     aws_logs as logs,
     aws_lambda as lambda_,
+    aws_ssm as ssm,
+)
+
+from lib.stepfunctions.account_address import (
+    ACCOUNT_ADDRESS_RESULT_SELECTOR,
+    account_address_inputs_unchanged,
+    account_address_stored,
+    cached_account_address,
+    lookup_account_address_inputs,
+    store_account_address,
 )
 
 
@@ -22,6 +32,9 @@ class NitroJWTStepFunctionConstruct(Construct):
         key_table: dynamodb.ITable,
         aa_processing_lambda: lambda_.IFunction,
         nitro_invoke_lambda: lambda_.IFunction,
+        aa_account_factory_address_parameter: ssm.IStringParameter,
+        aa_entrypoint_address_parameter: ssm.IStringParameter,
+        aa_account_salt_parameter: ssm.IStringParameter,
     ):
         super().__init__(scope, construct_id)
 
@@ -40,6 +53,8 @@ class NitroJWTStepFunctionConstruct(Construct):
                 )
             },
             table=key_mapping_table,
+            # the mapping stored by a concurrent first login has to be visible when retrying after a lost race
+            consistent_read=True,
             result_path="$.KeyIDForSub",
         )
 
@@ -55,6 +70,22 @@ class NitroJWTStepFunctionConstruct(Construct):
             result_path="$.KeyParamsForKeyID",
         )
 
+        # account address persisted with the key item is valid as long as none of the SSM values it is derived from has
+        # been changed
+        pre_token_existing_key_lookup_account_inputs = lookup_account_address_inputs(
+            self,
+            f"{signing_backend}LookupAccountAddressInputs",
+            {
+                "account_factory": aa_account_factory_address_parameter,
+                "account_entrypoint": aa_entrypoint_address_parameter,
+                "account_salt": aa_account_salt_parameter,
+            },
+        )
+
+        pre_token_existing_key_cached_aa_address = cached_account_address(
+            self, f"{signing_backend}ExistingKeyCachedAAAccountAddress"
+        )
+
         pre_token_existing_key_calc_aa_address = sf_tasks.LambdaInvoke(
             self,
             "existingKeyAAAccountAddress",
@@ -68,16 +99,14 @@ class NitroJWTStepFunctionConstruct(Construct):
                 }
             ),
             result_path="$.JWTKeyOutput",
-            output_path="$.JWTKeyOutput",
-            result_selector={
-                "key_id.$": "$.Payload.key_id",
-                "address.$": "$.Payload.address",
-                "backend.$": "$.Payload.backend",
-                "account.$": "$.Payload.account",
-            },
+            result_selector=ACCOUNT_ADDRESS_RESULT_SELECTOR,
             retry_on_service_exceptions=True,
         )
 
+        pre_token_existing_key_store_aa_address = store_account_address(
+            self, f"{signing_backend}ExistingKeyDDBUpdateAAAccountAddress", key_table
+        )
+
         pre_token_existing_key_success = sf.Succeed(
             self, f"{signing_backend}ExistingKeySucceed"
         )
@@ -113,7 +142,21 @@ class NitroJWTStepFunctionConstruct(Construct):
                 ),
                 "backend": sf_tasks.DynamoAttributeValue.from_string("nitro"),
             },
-            result_path="$.PutMappingOutput",
+            # a concurrent first login of the same sub that stored its mapping first fails the put
+            condition_expression="attribute_not_exists(#sub)",
+            expression_attribute_names={"#sub": "sub"},
+            result_path=sf.JsonPath.DISCARD,
+        )
+        pre_token_store_new_mapping.add_retry(
+            errors=[
+                "DynamoDb.ProvisionedThroughputExceededException",
+                "DynamoDb.ThrottlingException",
+                "DynamoDb.RequestLimitExceeded",
+                "DynamoDb.InternalServerErrorException",
+            ],
+            interval=Duration.seconds(1),
+            max_attempts=2,
+            backoff_rate=2,
         )
 
         pre_token_new_key_calc_aa_address = sf_tasks.LambdaInvoke(
@@ -129,28 +172,74 @@ class NitroJWTStepFunctionConstruct(Construct):
                 }
             ),
             result_path="$.JWTKeyOutput",
-            output_path="$.JWTKeyOutput",
-            result_selector={
-                "key_id.$": "$.Payload.key_id",
-                "address.$": "$.Payload.address",
-                "backend.$": "$.Payload.backend",
-                "account.$": "$.Payload.account",
-            },
+            result_selector=ACCOUNT_ADDRESS_RESULT_SELECTOR,
             retry_on_service_exceptions=True,
         )
 
+        pre_token_new_key_store_aa_address = store_account_address(
+            self, f"{signing_backend}NewKeyDDBUpdateAAAccountAddress", key_table
+        )
+
         pre_token_new_key_success = sf.Succeed(self, f"{signing_backend}NewKeySucceed")
 
+        # only the account address calculation runs alongside the mapping put, the enclave has stored the key during
+        # key generation. The put discards its result and the account address branch carries the state forward
+        pre_token_new_key_parallel = (
+            sf.Parallel(
+                self,
+                f"{signing_backend}NewKeyParallel",
+                output_path="$[1]",
+            )
+            .branch(pre_token_store_new_mapping)
+            .branch(pre_token_new_key_calc_aa_address)
+        )
+
+        # lost the first login race, resolve the key stored by the concurrent execution
+        pre_token_new_key_parallel.add_catch(
+            pre_token_gen_lookup_key_mapping,
+            errors=["DynamoDb.ConditionalCheckFailedException"],
+            result_path="$.NewKeyError",
+        )
+
         # key generation part
         pre_token_new_key_flow_definition = (
-            pre_token_gen_new_key.next(pre_token_store_new_mapping)
-            .next(pre_token_new_key_calc_aa_address)
+            pre_token_gen_new_key.next(pre_token_new_key_parallel)
+            .next(pre_token_new_key_store_aa_address)
             .next(pre_token_new_key_success)
         )
 
+        # existing key part, the aa processing lambda is only invoked if no valid account address is stored
+        existing_key_calc_aa_address_definition = (
+            pre_token_existing_key_calc_aa_address.next(
+                pre_token_existing_key_store_aa_address
+            ).next(pre_token_existing_key_success)
+        )
+
+        existing_key_account_inputs_choice = (
+            sf.Choice(self, f"{signing_backend}ChoiceAccountAddressInputsUnchanged")
+            .when(
+                account_address_inputs_unchanged(),
+                pre_token_existing_key_cached_aa_address.next(
+                    pre_token_existing_key_success
+                ),
+            )
+            .otherwise(existing_key_calc_aa_address_definition)
+        )
+
+        existing_key_account_address_choice = (
+            sf.Choice(self, f"{signing_backend}ChoiceAccountAddressStored")
+            .when(
+                account_address_stored(),
+                pre_token_existing_key_lookup_account_inputs.next(
+                    existing_key_account_inputs_choice
+                ),
+            )
+            .otherwise(existing_key_calc_aa_address_definition)
+        )
+
         existing_key_flow_definition = pre_token_gen_lookup_key_params.next(
-            pre_token_existing_key_calc_aa_address
-        ).next(pre_token_existing_key_success)
+            existing_key_account_address_choice
+        )
 
         pre_token_gen_choice = (
             sf.Choice(
@@ -0,0 +1,149 @@
+#  Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#  SPDX-License-Identifier: MIT-0
+"""
+compiles the contract ABIs in lib/lambda/aa_processing/aa_abi.py into lib/lambda/aa_processing/aa_abi_compiled.py
+
+the generated module holds function selectors, error selectors, event topics, input and function output type tuples so that the AA
+processing Lambda can encode calldata and decode revert data with eth_abi directly instead of building web3 contract
+objects from the full ABI on every call
+
+usage: python scripts/compile_abi.py [--check]
+"""
+
+import argparse
+import os
+import sys
+
+from eth_utils import keccak
+
+AA_PROCESSING_DIR = os.path.join(
+    os.path.dirname(__file__), "..", "lib", "lambda", "aa_processing"
+)
+COMPILED_ABI_PATH = os.path.join(AA_PROCESSING_DIR, "aa_abi_compiled.py")
+
+sys.path.insert(0, AA_PROCESSING_DIR)
+
+from aa_abi import ACCOUNT_FACTORY_ABI, ENTRYPOINT_ABI, MULTICALL3_ABI  # noqa: E402
+
+CONTRACTS = {
+    "ENTRYPOINT": ENTRYPOINT_ABI,
+    "ACCOUNT_FACTORY": ACCOUNT_FACTORY_ABI,
+    "MULTICALL3": MULTICALL3_ABI,
+}
+
+
+def canonical_type(abi_input: dict) -> str:
+    abi_type = abi_input["type"]
+    if not abi_type.startswith("tuple"):
+        return abi_type
+
+    components = ",".join(
+        canonical_type(component) for component in abi_input["components"]
+    )
+    return f"({components}){abi_type[len('tuple'):]}"
+
+
+def render_types(input_types: tuple) -> str:
+    # tuple literal with double quotes, matching the formatting of the handwritten modules
+    rendered = ", ".join(f'"{input_type}"' for input_type in input_types)
+    return f"({rendered},)" if len(input_types) == 1 else f"({rendered})"
+
+
+def compile_contract(prefix: str, abi: list) -> list:
+    tables = {"FUNCTIONS": {}, "ERRORS": {}, "EVENTS": {}}
+    function_outputs = {}
+    for entry in abi:
+        if entry["type"] not in ("function", "error", "event"):
+            continue
+
+        input_types = tuple(canonical_type(abi_input) for abi_input in entry["inputs"])
+        signature = f"{entry['name']}({','.join(input_types)})"
+        signature_hash = keccak(text=signature)
+
+        if entry["type"] == "event":
+            tables["EVENTS"][entry["name"]] = (signature_hash.hex(), input_types)
+        else:
+            table = "FUNCTIONS" if entry["type"] == "function" else "ERRORS"
+            tables[table][entry["name"]] = (signature_hash[:4].hex(), input_types)
+
+        if entry["type"] == "function":
+            function_outputs[entry["name"]] = tuple(
+                canonical_type(abi_output) for abi_output in entry["outputs"]
+            )
+
+    lines = []
+    for table, kind in (
+        ("FUNCTIONS", "selector"),
+        ("ERRORS", "selector"),
+        ("EVENTS", "topic"),
+    ):
+        lines.append(f"# name: ({kind}, input types)")
+        if not tables[table]:
+            lines.append(f"{prefix}_{table} = {{}}")
+            lines.append("")
+            continue
+
+        lines.append(f"{prefix}_{table} = {{")
+        for name, (signature_hash, input_types) in sorted(tables[table].items()):
+            lines.append(f'    "{name}": (')
+            lines.append(f'        bytes.fromhex("{signature_hash}"),')
+            lines.append(f"        {render_types(input_types)},")
+            lines.append("    ),")
+        lines.append("}")
+        lines.append("")
+
+    lines.append("# name: output types")
+    lines.append(f"{prefix}_FUNCTION_OUTPUTS = {{")
+    for name, output_types in sorted(function_outputs.items()):
+        lines.append(f'    "{name}": {render_types(output_types)},')
+    lines.append("}")
+    lines.append("")
+
+    return lines
+
+
+def render() -> str:
+    lines = [
+        "#  Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.",
+        "#  SPDX-License-Identifier: MIT-0",
+        "# generated by scripts/compile_abi.py from aa_abi.py - do not edit",
+        "",
+    ]
+    for prefix, abi in CONTRACTS.items():
+        lines.extend(compile_contract(prefix, abi))
+
+    lines.append("# error selector to (name, input types) for decoding revert data")
+    lines.append("ERRORS_BY_SELECTOR = {")
+    lines.append("    selector: (name, input_types)")
+    lines.append(
+        "    for errors in (ENTRYPOINT_ERRORS, ACCOUNT_FACTORY_ERRORS, MULTICALL3_ERRORS)"
+    )
+    lines.append("    for name, (selector, input_types) in errors.items()")
+    lines.append("}")
+
+    return "\n".join(lines) + "\n"
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--check",
+        action="store_true",
+        help="fail if the compiled module is not up to date with aa_abi.py",
+    )
+    args = parser.parse_args()
+
+    compiled = render()
+
+    if args.check:
+        with open(COMPILED_ABI_PATH) as f:
+            if f.read() != compiled:
+                sys.exit(f"{COMPILED_ABI_PATH} is outdated, run scripts/compile_abi.py")
+        return
+
+    with open(COMPILED_ABI_PATH, "w") as f:
+        f.write(compiled)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,140 @@
+#  Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#  SPDX-License-Identifier: MIT-0
+import base64
+import importlib.util
+import os
+import sys
+
+import pytest
+
+from tests.unit.dev_chain import DevChain
+
+LAMBDA_DIR = os.path.join(os.path.dirname(__file__), "..", "..", "lib", "lambda")
+
+# lambda code is bundled flat, shared modules are provided by the web3 layer
+sys.path.insert(0, os.path.join(LAMBDA_DIR, "web3_layer"))
+sys.path.insert(0, os.path.join(LAMBDA_DIR, "aa_processing"))
+# appended so that lambda_function keeps resolving to aa_processing, the signing Lambda is loaded by path below
+sys.path.append(os.path.join(LAMBDA_DIR, "userop_tx_signing"))
+sys.path.append(os.path.join(LAMBDA_DIR, "kms_key_management"))
+os.environ.setdefault("AWS_DEFAULT_REGION", "us-east-1")
+
+ENTRYPOINT_ADDRESS = "0x5FF137D4b0FDCD49DcA30c7CF57E578a026d2789"
+
+# EIP-155 example key, https://eips.ethereum.org/EIPS/eip-155#example
+SIGNING_PRIVATE_KEY = bytes.fromhex("46" * 32)
+SIGNING_KEY_ID = "acb2ff44-db6a-4bf0-ad00-c499c64d676c"
+SIGNING_SUB = "68090fe5-1c30-4292-b92a-90e29afb35c4"
+
+# PKCS#8 PrivateKeyInfo wrapping a SEC1 ECPrivateKey with public key, layout of KMS ECC_SECG_P256K1 data key pairs
+PKCS8_PREFIX = bytes.fromhex(
+    "308184020100301006072a8648ce3d020106052b8104000a046d306b0201010420"
+)
+PKCS8_PUBLIC_KEY_PREFIX = bytes.fromhex("a144034200")
+
+
+def pkcs8_private_key(private_key: bytes) -> bytes:
+    from eth_keys import keys
+
+    public_key = keys.PrivateKey(private_key).public_key.to_bytes()
+
+    return PKCS8_PREFIX + private_key + PKCS8_PUBLIC_KEY_PREFIX + b"\x04" + public_key
+
+
+def load_signing_lambda():
+    spec = importlib.util.spec_from_file_location(
+        "signing_lambda_function",
+        os.path.join(LAMBDA_DIR, "userop_tx_signing", "lambda_function.py"),
+    )
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+
+    return module
+
+
+class StubSSMClient:
+    def __init__(self, parameters: dict) -> None:
+        self.parameters = parameters
+        self.calls = []
+
+    def get_parameter(self, Name):
+        self.calls.append(Name)
+        return {"Parameter": {"Value": self.parameters[Name]}}
+
+    def get_parameters(self, Names):
+        self.calls.extend(Names)
+        return {
+            "Parameters": [
+                {"Name": name, "Value": self.parameters[name]}
+                for name in Names
+                if name in self.parameters
+            ],
+            "InvalidParameters": [
+                name for name in Names if name not in self.parameters
+            ],
+        }
+
+
+class StubKeyStore:
+    """
+    DynamoDB key table and KMS decrypt stand-in for the signing Lambda
+    """
+
+    def __init__(self, private_key: bytes) -> None:
+        self.key_der = pkcs8_private_key(private_key)
+        self.get_item_calls = 0
+        self.decrypt_calls = 0
+
+    def get_item(self, TableName, Key):
+        self.get_item_calls += 1
+        return {
+            "Item": {
+                "key_id": Key["key_id"],
+                "ciphertext": {"S": base64.standard_b64encode(b"ciphertext").decode()},
+                "address": {"S": ""},
+            }
+        }
+
+    def decrypt(self, KeyId, CiphertextBlob, EncryptionContext):
+        self.decrypt_calls += 1
+        return {"Plaintext": self.key_der}
+
+
+@pytest.fixture
+def dev_chain():
+    chain = DevChain(ENTRYPOINT_ADDRESS)
+    chain.start()
+    yield chain
+    chain.stop()
+
+
+@pytest.fixture
+def signing_lambda(monkeypatch):
+    """
+    signing Lambda module with SSM, DynamoDB and KMS stubbed, keys decrypt to SIGNING_PRIVATE_KEY
+    """
+    module = load_signing_lambda()
+    key_store = StubKeyStore(SIGNING_PRIVATE_KEY)
+    ssm = StubSSMClient(
+        {
+            "/app/log_level": "WARNING",
+            "/web3/rpc_endpoint": "my.rpc.endpoint",
+            "/web3/aa/entrypoint_address": ENTRYPOINT_ADDRESS,
+        }
+    )
+    monkeypatch.setattr(module, "client_ddb", key_store)
+    monkeypatch.setattr(module, "client_kms", key_store)
+    monkeypatch.setattr(module, "client_ssm", ssm)
+    for env, value in {
+        "KMS_KEY_TABLE": "keys",
+        "KMS_KEY_ID": "alias/signing",
+        "LOG_LEVEL_SSM_PARAM": "/app/log_level",
+        "RPC_ENDPOINT_SSM_PARAM": "/web3/rpc_endpoint",
+        "AA_ENTRYPOINT_ADDRESS_SSM_PARAM": "/web3/aa/entrypoint_address",
+    }.items():
+        monkeypatch.setenv(env, value)
+
+    module.key_store = key_store
+    module.ssm = ssm
+
+    return module
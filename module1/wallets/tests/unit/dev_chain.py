@@ -0,0 +1,206 @@
+#  Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#  SPDX-License-Identifier: MIT-0
+import json
+import socket
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from eth_abi import decode, encode
+from eth_utils import keccak
+
+MULTICALL3_ADDRESS = "0xcA11bde05977b3631167028862bE2a173976CA11"
+
+CHAIN_ID = 31337
+
+GET_NONCE = keccak(text="getNonce(address,uint192)")[:4]
+BALANCE_OF = keccak(text="balanceOf(address)")[:4]
+AGGREGATE3 = keccak(text="aggregate3((address,bool,bytes)[])")[:4]
+GET_ETH_BALANCE = keccak(text="getEthBalance(address)")[:4]
+GET_SENDER_ADDRESS = keccak(text="getSenderAddress(bytes)")[:4]
+SENDER_ADDRESS_RESULT = keccak(text="SenderAddressResult(address)")[:4]
+CREATE_ACCOUNT = keccak(text="createAccount(address,uint256)")[:4]
+INITIALIZE = keccak(text="initialize(address)")[:4]
+
+
+def sender_address(init_code: bytes) -> str:
+    """
+    deterministic stand-in for the counterfactual address the dev chain EntryPoint returns for an init code
+    """
+    return f"0x{keccak(init_code)[12:].hex()}"
+
+
+def word(value: bytes) -> bytes:
+    return value.rjust(32, b"\x00")
+
+
+def simple_account_address(
+    factory: str,
+    implementation: str,
+    proxy_creation_code: bytes,
+    owner: str,
+    salt: int,
+) -> str:
+    """
+    SimpleAccountFactory.getAddress spelled out byte by byte: Create2.computeAddress(salt, keccak256(
+    ERC1967Proxy.creationCode ++ abi.encode(implementation, abi.encodeCall(SimpleAccount.initialize, (owner)))))
+    """
+    initialize_call = INITIALIZE + word(bytes.fromhex(owner[2:]))
+    constructor_args = (
+        word(bytes.fromhex(implementation[2:]))
+        # offset and length of the dynamic bytes argument, 36 bytes padded to 64
+        + word((64).to_bytes(1, "big"))
+        + word(len(initialize_call).to_bytes(1, "big"))
+        + initialize_call.ljust(64, b"\x00")
+    )
+    init_code_hash = keccak(proxy_creation_code + constructor_args)
+
+    address = keccak(
+        b"\xff" + bytes.fromhex(factory[2:]) + salt.to_bytes(32, "big") + init_code_hash
+    )[12:]
+
+    return f"0x{address.hex()}"
+
+
+class DevChain:
+    """
+    minimal JSON-RPC dev chain stand-in with an EntryPoint (getNonce, balanceOf, getSenderAddress) and an optional Multicall3
+    (aggregate3, getEthBalance) deployment, supports JSON-RPC batches and records every HTTP request
+    """
+
+    def __init__(self, entrypoint: str, multicall_deployed: bool = True) -> None:
+        self.entrypoint = entrypoint.lower()
+        self.multicall_deployed = multicall_deployed
+        self.code = {}
+        self.balances = {}
+        self.deposits = {}
+        self.nonces = {}
+        self.reverting_accounts = set()
+        # factory address to (implementation, proxy creation code) of deployed SimpleAccountFactory contracts
+        self.account_factories = {}
+        self.http_requests = []
+        self._server = None
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self._server.server_address[1]}"
+
+    def deploy(self, address: str, code: str = "0x6080") -> None:
+        self.code[address.lower()] = code
+
+    def call(self, to: str, data: bytes) -> tuple:
+        selector, args = data[:4], data[4:]
+
+        if to == self.entrypoint and selector == GET_NONCE:
+            account, key = decode(["address", "uint192"], args)
+            account = account.lower()
+            if account in self.reverting_accounts:
+                return False, b""
+            return True, encode(["uint256"], [self.nonces.get((account, key), 0)])
+
+        if to == self.entrypoint and selector == BALANCE_OF:
+            (account,) = decode(["address"], args)
+            account = account.lower()
+            if account in self.reverting_accounts:
+                return False, b""
+            return True, encode(["uint256"], [self.deposits.get(account, 0)])
+
+        if to == self.entrypoint and selector == GET_SENDER_ADDRESS:
+            (init_code,) = decode(["bytes"], args)
+            factory = f"0x{init_code[:20].hex()}"
+            if factory in self.account_factories and init_code[20:24] == CREATE_ACCOUNT:
+                owner, salt = decode(["address", "uint256"], init_code[24:])
+                sender = simple_account_address(
+                    factory, *self.account_factories[factory], owner, salt
+                )
+            else:
+                sender = sender_address(init_code)
+            # always reverts, the sender is returned as custom error data
+            return False, SENDER_ADDRESS_RESULT + encode(["address"], [sender])
+
+        if to == MULTICALL3_ADDRESS.lower() and self.multicall_deployed:
+            if selector == GET_ETH_BALANCE:
+                (account,) = decode(["address"], args)
+                return True, encode(
+                    ["uint256"], [self.balances.get(account.lower(), 0)]
+                )
+
+            if selector == AGGREGATE3:
+                (calls,) = decode(["(address,bool,bytes)[]"], args)
+                results = []
+                for target, allow_failure, call_data in calls:
+                    success, return_data = self.call(target.lower(), call_data)
+                    if not success and not allow_failure:
+                        return False, b""
+                    results.append((success, return_data))
+                return True, encode(["(bool,bytes)[]"], [results])
+
+        if to not in self.code and to != self.entrypoint:
+            # calls to accounts without code succeed with empty return data
+            return True, b""
+
+        return False, b""
+
+    def handle(self, request: dict) -> dict:
+        method, params = request["method"], request.get("params", [])
+        response = {"jsonrpc": "2.0", "id": request["id"]}
+
+        if method == "eth_chainId":
+            response["result"] = hex(CHAIN_ID)
+        elif method == "eth_getCode":
+            response["result"] = self.code.get(params[0].lower(), "0x")
+        elif method == "eth_getBalance":
+            response["result"] = hex(self.balances.get(params[0].lower(), 0))
+        elif method == "eth_call":
+            success, return_data = self.call(
+                params[0]["to"].lower(), bytes.fromhex(params[0]["data"][2:])
+            )
+            if success:
+                response["result"] = f"0x{return_data.hex()}"
+            else:
+                response["error"] = {"code": 3, "message": "execution reverted"}
+                if return_data:
+                    response["error"]["data"] = f"0x{return_data.hex()}"
+        else:
+            response["error"] = {
+                "code": -32601,
+                "message": f"method not found: {method}",
+            }
+
+        return response
+
+    def start(self) -> None:
+        chain = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def setup(self) -> None:
+                super().setup()
+                self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+            def do_POST(self) -> None:
+                request = json.loads(
+                    self.rfile.read(int(self.headers["Content-Length"]))
+                )
+                chain.http_requests.append(request)
+                if isinstance(request, list):
+                    response = [chain.handle(item) for item in request]
+                else:
+                    response = chain.handle(request)
+
+                body = json.dumps(response).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args) -> None:
+                pass
+
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
@@ -0,0 +1,194 @@
+#  Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#  SPDX-License-Identifier: MIT-0
+from collections import OrderedDict
+
+import pytest
+from eth_utils import keccak, to_checksum_address
+
+from counterfactual import compute_create2_address
+from ssm_parameters import ParameterCache
+
+from tests.unit.conftest import ENTRYPOINT_ADDRESS, StubSSMClient
+from tests.unit.dev_chain import sender_address, simple_account_address
+
+FACTORY = "0x9406Cc6185a346906296840746125a0E44976454"
+IMPLEMENTATION = "0x8ABB13360b87Be5EEb1B98647A016adD927a136c"
+OWNERS = [
+    "0x0000000000000000000000000000000000000001",
+    "0x0000000000000000000000000000000000000002",
+    "0x0000000000000000000000000000000000000003",
+]
+
+
+@pytest.fixture
+def aa_lambda(monkeypatch):
+    import lambda_function
+
+    ssm = StubSSMClient(
+        {
+            "/app/log_level": "WARNING",
+            "/web3/rpc_endpoint_counterfactual": "my.rpc.endpoint",
+            "/web3/aa/account_factory_address": FACTORY,
+            "/web3/aa/entrypoint_address": ENTRYPOINT_ADDRESS,
+            "/web3/aa/address_mode": "offline",
+            "/web3/aa/account_salt": "0",
+            "/web3/aa/account_implementation_address": IMPLEMENTATION,
+            "/web3/aa/account_proxy_creation_code": "0x6080",
+        }
+    )
+    monkeypatch.setattr(lambda_function, "client_ssm", ssm)
+    monkeypatch.setattr(
+        lambda_function, "parameter_cache", ParameterCache(ttl_seconds=60)
+    )
+    monkeypatch.setattr(lambda_function, "account_addresses", OrderedDict())
+    for env, name in {
+        "LOG_LEVEL_SSM_PARAM": "/app/log_level",
+        "RPC_ENDPOINT_SSM_PARAM": "/web3/rpc_endpoint_counterfactual",
+        "AA_ACCOUNT_FACTORY_ADDRESS_SSM_PARAM": "/web3/aa/account_factory_address",
+        "AA_ENTRYPOINT_ADDRESS_SSM_PARAM": "/web3/aa/entrypoint_address",
+        "AA_ADDRESS_MODE_SSM_PARAM": "/web3/aa/address_mode",
+        "AA_ACCOUNT_SALT_SSM_PARAM": "/web3/aa/account_salt",
+        "AA_ACCOUNT_IMPLEMENTATION_ADDRESS_SSM_PARAM": "/web3/aa/account_implementation_address",
+        "AA_ACCOUNT_PROXY_CREATION_CODE_SSM_PARAM": "/web3/aa/account_proxy_creation_code",
+    }.items():
+        monkeypatch.setenv(env, name)
+
+    lambda_function.ssm = ssm
+
+    return lambda_function
+
+
+# https://eips.ethereum.org/EIPS/eip-1014#examples
+CREATE2_VECTORS = [
+    (
+        "0x0000000000000000000000000000000000000000",
+        0,
+        "00",
+        "0x4D1A2e2bB4F88F0250f26Ffff098B0b30B26BF38",
+    ),
+    (
+        "0xdeadbeef00000000000000000000000000000000",
+        0x000000000000000000000000FEED000000000000000000000000000000000000,
+        "00",
+        "0xD04116cDd17beBE565EB2422F2497E06cC1C9833",
+    ),
+    (
+        "0x00000000000000000000000000000000deadbeef",
+        0xCAFEBABE,
+        "deadbeef" * 11,
+        "0x1d8bfDC5D46DC4f61D6b6115972536eBE6A8854C",
+    ),
+    (
+        "0x0000000000000000000000000000000000000000",
+        0,
+        "",
+        "0xE33C0C7F7df4809055C3ebA6c09CFe4BaF1BD9e0",
+    ),
+]
+
+
+def expected_address(owner: str, salt: int = 0) -> str:
+    return to_checksum_address(
+        simple_account_address(
+            FACTORY, IMPLEMENTATION, bytes.fromhex("6080"), owner, salt
+        )
+    )
+
+
+@pytest.mark.parametrize("deployer, salt, init_code, address", CREATE2_VECTORS)
+def test_create2_vectors(deployer, salt, init_code, address):
+    assert (
+        compute_create2_address(deployer, salt, keccak(bytes.fromhex(init_code)))
+        == address
+    )
+
+
+def test_offline_address_matches_factory(aa_lambda, dev_chain, monkeypatch):
+    dev_chain.account_factories[FACTORY.lower()] = (
+        IMPLEMENTATION,
+        bytes.fromhex("6080"),
+    )
+    aa_lambda.ssm.parameters["/web3/rpc_endpoint_counterfactual"] = dev_chain.url
+    aa_lambda.ssm.parameters["/web3/aa/account_salt"] = "7"
+    aa_lambda.ssm.parameters["/web3/aa/address_mode"] = "verify"
+    errors = []
+    monkeypatch.setattr(aa_lambda.logger, "error", errors.append)
+
+    # verify mode compares the offline calculation with EntryPoint.getSenderAddress of the dev chain factory
+    for owner in OWNERS:
+        assert aa_lambda.get_account_address(owner, FACTORY) == expected_address(
+            owner, salt=7
+        )
+    assert errors == []
+
+
+def test_parameters_cached_across_invocations(aa_lambda):
+    assert aa_lambda.get_account_address(OWNERS[0], FACTORY) == expected_address(
+        OWNERS[0]
+    )
+    calls = len(aa_lambda.ssm.calls)
+
+    # memo hit and new owner are both served without SSM round trips
+    assert aa_lambda.get_account_address(OWNERS[0], FACTORY) == expected_address(
+        OWNERS[0]
+    )
+    assert aa_lambda.get_account_address(OWNERS[1], FACTORY) == expected_address(
+        OWNERS[1]
+    )
+    assert len(aa_lambda.ssm.calls) == calls
+
+    # values are refreshed after the ttl
+    aa_lambda.ssm.parameters["/web3/aa/account_salt"] = "1"
+    for name, (value, _) in list(aa_lambda.parameter_cache.values.items()):
+        aa_lambda.parameter_cache.values[name] = (value, 0.0)
+    assert aa_lambda.get_account_address(OWNERS[0], FACTORY) != expected_address(
+        OWNERS[0]
+    )
+
+
+def test_account_address_memo_evicts_least_recently_used(aa_lambda, monkeypatch):
+    monkeypatch.setattr(aa_lambda, "ACCOUNT_ADDRESS_CACHE_MAX_ENTRIES", 2)
+
+    aa_lambda.get_account_address(OWNERS[0], FACTORY)
+    aa_lambda.get_account_address(OWNERS[1], FACTORY)
+    aa_lambda.get_account_address(OWNERS[0], FACTORY)
+    aa_lambda.get_account_address(OWNERS[2], FACTORY)
+
+    assert [key[2] for key in aa_lambda.account_addresses] == [
+        OWNERS[0].lower(),
+        OWNERS[2].lower(),
+    ]
+
+
+def test_account_status_resolves_addresses_in_one_batch(
+    aa_lambda, dev_chain, monkeypatch
+):
+    aa_lambda.ssm.parameters["/web3/aa/address_mode"] = "rpc"
+    aa_lambda.ssm.parameters["/web3/rpc_endpoint_counterfactual"] = dev_chain.url
+    get_parameters_calls = []
+    get_parameters = aa_lambda.ssm.get_parameters
+    monkeypatch.setattr(
+        aa_lambda.ssm,
+        "get_parameters",
+        lambda Names: get_parameters_calls.append(Names) or get_parameters(Names),
+    )
+
+    records = aa_lambda.get_account_status(OWNERS)
+
+    assert [record["account"].lower() for record in records] == [
+        sender_address(aa_lambda.get_account_init_code(owner)) for owner in OWNERS
+    ]
+    # one GetParameters call for the request, one JSON-RPC batch for all getSenderAddress calls
+    assert len(get_parameters_calls) == 1
+    assert sorted(aa_lambda.ssm.calls) == sorted(
+        set(aa_lambda.ssm.parameters) - {"/app/log_level"}
+    )
+    assert [request["method"] for request in dev_chain.http_requests[0]] == [
+        "eth_call"
+    ] * len(OWNERS)
+
+    # memoized addresses are reused, only the status is fetched
+    dev_chain.http_requests.clear()
+    aa_lambda.get_account_status(OWNERS)
+    assert len(get_parameters_calls) == 1
+    assert len(dev_chain.http_requests) == 1
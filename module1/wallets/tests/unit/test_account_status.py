@@ -0,0 +1,182 @@
+#  Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#  SPDX-License-Identifier: MIT-0
+import pytest
+
+from account_status import fetch_account_status
+from counterfactual import compute_account_address
+from rpc_providers import get_web3
+
+from tests.unit.conftest import ENTRYPOINT_ADDRESS
+
+OWNERS = [
+    "0x8ABB13360b87Be5EEb1B98647A016adD927a136c",
+    "0x0000000000000000000000000000000000000001",
+    "0x00000000000000000000000000000000000000aA",
+]
+ACCOUNTS = [
+    "0x7BC12c4D795e513E7C86a720FC577d22b587Be05",
+    "0x1111111111111111111111111111111111111111",
+    "0x2222222222222222222222222222222222222222",
+]
+
+
+@pytest.fixture
+def funded_chain(dev_chain):
+    deployed = ACCOUNTS[0].lower()
+    dev_chain.deploy(deployed)
+    dev_chain.nonces[(deployed, 0)] = 7
+    dev_chain.deposits[deployed] = 10**17
+    dev_chain.balances[deployed] = 2 * 10**18
+    dev_chain.balances[ACCOUNTS[1].lower()] = 5
+    return dev_chain
+
+
+def assert_records(records):
+    assert records == [
+        {
+            "owner": OWNERS[0],
+            "account": ACCOUNTS[0],
+            "deployed": True,
+            "nonce": 7,
+            "deposit": str(10**17),
+            "balance": str(2 * 10**18),
+        },
+        {
+            "owner": OWNERS[1],
+            "account": ACCOUNTS[1],
+            "deployed": False,
+            "nonce": 0,
+            "deposit": "0",
+            "balance": "5",
+        },
+        {
+            "owner": OWNERS[2],
+            "account": ACCOUNTS[2],
+            "deployed": False,
+            "nonce": 0,
+            "deposit": "0",
+            "balance": "0",
+        },
+    ]
+
+
+def test_account_status_single_multicall_batch(funded_chain):
+    provider = get_web3(funded_chain.url).provider
+
+    records = fetch_account_status(provider, OWNERS, ACCOUNTS, ENTRYPOINT_ADDRESS)
+
+    assert_records(records)
+    # one http request: aggregate3 eth_call plus eth_getCode per account
+    assert len(funded_chain.http_requests) == 1
+    assert [request["method"] for request in funded_chain.http_requests[0]] == [
+        "eth_call"
+    ] + ["eth_getCode"] * len(ACCOUNTS)
+
+
+def test_account_status_falls_back_to_json_rpc_batch(funded_chain):
+    funded_chain.multicall_deployed = False
+    provider = get_web3(funded_chain.url).provider
+
+    records = fetch_account_status(provider, OWNERS, ACCOUNTS, ENTRYPOINT_ADDRESS)
+
+    assert_records(records)
+    assert len(funded_chain.http_requests) == 2
+    assert len(funded_chain.http_requests[1]) == 4 * len(ACCOUNTS)
+
+
+def test_account_status_without_multicall(funded_chain):
+    provider = get_web3(funded_chain.url).provider
+
+    records = fetch_account_status(
+        provider, OWNERS, ACCOUNTS, ENTRYPOINT_ADDRESS, multicall=None
+    )
+
+    assert_records(records)
+    assert len(funded_chain.http_requests) == 1
+
+
+@pytest.mark.parametrize("multicall_deployed", [True, False])
+def test_account_status_failed_calls(funded_chain, multicall_deployed):
+    funded_chain.multicall_deployed = multicall_deployed
+    funded_chain.reverting_accounts.add(ACCOUNTS[1].lower())
+    provider = get_web3(funded_chain.url).provider
+
+    records = fetch_account_status(provider, OWNERS, ACCOUNTS, ENTRYPOINT_ADDRESS)
+
+    assert records[1]["nonce"] is None
+    assert records[1]["deposit"] is None
+    assert records[1]["balance"] == "5"
+    assert records[0]["nonce"] == 7
+
+
+def test_account_status_operation(funded_chain, monkeypatch):
+    import lambda_function
+
+    parameters = {
+        "/app/log_level": "WARNING",
+        "/web3/rpc_endpoint_counterfactual": funded_chain.url,
+        "/web3/aa/account_factory_address": "0x9406Cc6185a346906296840746125a0E44976454",
+        "/web3/aa/entrypoint_address": ENTRYPOINT_ADDRESS,
+        "/web3/aa/address_mode": "offline",
+        "/web3/aa/account_salt": "0",
+        "/web3/aa/account_implementation_address": "0x8ABB13360b87Be5EEb1B98647A016adD927a136c",
+        "/web3/aa/account_proxy_creation_code": "0x6080",
+    }
+
+    class StubSSMClient:
+        def get_parameter(self, Name):
+            return {"Parameter": {"Value": parameters[Name]}}
+
+        def get_parameters(self, Names):
+            return {"Parameters": [{"Name": n, "Value": parameters[n]} for n in Names]}
+
+    monkeypatch.setattr(lambda_function, "client_ssm", StubSSMClient())
+    for env, name in {
+        "LOG_LEVEL_SSM_PARAM": "/app/log_level",
+        "RPC_ENDPOINT_SSM_PARAM": "/web3/rpc_endpoint_counterfactual",
+        "AA_ACCOUNT_FACTORY_ADDRESS_SSM_PARAM": "/web3/aa/account_factory_address",
+        "AA_ENTRYPOINT_ADDRESS_SSM_PARAM": "/web3/aa/entrypoint_address",
+        "AA_ADDRESS_MODE_SSM_PARAM": "/web3/aa/address_mode",
+        "AA_ACCOUNT_SALT_SSM_PARAM": "/web3/aa/account_salt",
+        "AA_ACCOUNT_IMPLEMENTATION_ADDRESS_SSM_PARAM": "/web3/aa/account_implementation_address",
+        "AA_ACCOUNT_PROXY_CREATION_CODE_SSM_PARAM": "/web3/aa/account_proxy_creation_code",
+    }.items():
+        monkeypatch.setenv(env, name)
+
+    expected_account = compute_account_address(
+        factory=parameters["/web3/aa/account_factory_address"],
+        account_implementation=parameters["/web3/aa/account_implementation_address"],
+        proxy_creation_code=bytes.fromhex("6080"),
+        owner=OWNERS[0],
+        salt=0,
+    )
+    funded_chain.deploy(expected_account)
+    funded_chain.balances[expected_account.lower()] = 42
+
+    response = lambda_function.lambda_handler(
+        {"operation": "account_status", "owners": OWNERS[:1]}, None
+    )
+
+    assert response == {
+        "accounts": [
+            {
+                "owner": OWNERS[0],
+                "account": expected_account,
+                "deployed": True,
+                "nonce": 0,
+                "deposit": "0",
+                "balance": "42",
+            }
+        ]
+    }
+
+    with pytest.raises(Exception, match="non-empty list"):
+        lambda_function.lambda_handler(
+            {"operation": "account_status", "owners": []}, None
+        )
+
+    monkeypatch.setattr(lambda_function, "MAX_ACCOUNT_STATUS_OWNERS", 2)
+    with pytest.raises(Exception, match="exceeds maximum"):
+        lambda_function.lambda_handler(
+            {"operation": "account_status", "owners": OWNERS}, None
+        )
@@ -0,0 +1,243 @@
+#  Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#  SPDX-License-Identifier: MIT-0
+import json
+import threading
+
+import pytest
+from eth_utils import to_checksum_address
+
+from backfill import run_backfill
+from counterfactual import compute_account_address
+
+from tests.unit.conftest import ENTRYPOINT_ADDRESS
+
+FACTORY = "0x9406Cc6185a346906296840746125a0E44976454"
+IMPLEMENTATION = "0x8ABB13360b87Be5EEb1B98647A016adD927a136c"
+PROXY_CREATION_CODE = bytes.fromhex("6080604052")
+SEGMENTS = 4
+PAGE_SIZE = 2
+
+
+class StubKeyTable:
+    """
+    key table supporting segmented Scan in key_id order and BatchWriteItem, the segment of an item is its index
+    modulo the number of segments
+
+    scan calls matching fail_scan raise, with scan_barrier set the first page of every segment is only returned once
+    all segments requested it
+    """
+
+    def __init__(self, items: list) -> None:
+        self.items = {item["key_id"]["S"]: item for item in items}
+        self.scan_calls = []
+        self.written = []
+        self.fail_scan = None
+        self.scan_barrier = None
+        self._lock = threading.Lock()
+
+    def scan(
+        self, TableName, Segment, TotalSegments, Limit, ExclusiveStartKey=None
+    ) -> dict:
+        with self._lock:
+            self.scan_calls.append((Segment, ExclusiveStartKey))
+        if self.fail_scan is not None and self.fail_scan(Segment, ExclusiveStartKey):
+            raise Exception("connection reset")
+        if self.scan_barrier is not None and ExclusiveStartKey is None:
+            self.scan_barrier.wait()
+
+        with self._lock:
+            key_ids = sorted(
+                key_id
+                for key_id in self.items
+                if int(key_id.split("-")[1]) % TotalSegments == Segment
+            )
+            if ExclusiveStartKey is not None:
+                key_ids = [
+                    key_id
+                    for key_id in key_ids
+                    if key_id > ExclusiveStartKey["key_id"]["S"]
+                ]
+            page = key_ids[:Limit]
+            response = {"Items": [dict(self.items[key_id]) for key_id in page]}
+            if len(key_ids) > Limit:
+                response["LastEvaluatedKey"] = {"key_id": {"S": page[-1]}}
+
+        return response
+
+    def batch_write_item(self, RequestItems: dict) -> dict:
+        with self._lock:
+            for request in RequestItems["keys"]:
+                item = request["PutRequest"]["Item"]
+                self.items[item["key_id"]["S"]] = item
+                self.written.append(item["key_id"]["S"])
+
+        return {"UnprocessedItems": {}}
+
+
+def owner(index: int) -> str:
+    return to_checksum_address(f"0x{index + 1:040x}")
+
+
+def key_items(count: int) -> list:
+    return [
+        {"key_id": {"S": f"key-{index:03d}"}, "address": {"S": owner(index)}}
+        for index in range(count)
+    ]
+
+
+def account_parameters(salt: int = 0, entrypoint: str = ENTRYPOINT_ADDRESS) -> dict:
+    return {
+        "factory": FACTORY,
+        "implementation": IMPLEMENTATION,
+        "proxy_creation_code": PROXY_CREATION_CODE,
+        "salt": salt,
+        "address_inputs": {
+            "account_factory": FACTORY,
+            "account_entrypoint": entrypoint,
+            "account_salt": str(salt),
+        },
+    }
+
+
+def expected_account(index: int, salt: int = 0) -> str:
+    return compute_account_address(
+        FACTORY, IMPLEMENTATION, PROXY_CREATION_CODE, owner(index), salt
+    )
+
+
+def assert_backfilled(table: StubKeyTable, count: int) -> None:
+    for index in range(count):
+        item = table.items[f"key-{index:03d}"]
+        assert item["account"]["S"] == expected_account(index)
+        assert item["account_factory"]["S"] == FACTORY
+        assert item["account_entrypoint"]["S"] == ENTRYPOINT_ADDRESS
+        assert item["account_salt"]["S"] == "0"
+
+
+def test_segments_scanned_in_parallel():
+    table = StubKeyTable(
+        key_items(10) + [{"key_id": {"S": "key-010"}, "backend": {"S": "kms"}}]
+    )
+    # a sequential scan of the segments would never get past the first page
+    table.scan_barrier = threading.Barrier(SEGMENTS, timeout=10)
+
+    result = run_backfill(
+        table,
+        "keys",
+        account_parameters(),
+        total_segments=SEGMENTS,
+        workers=2,
+        page_size=PAGE_SIZE,
+    )
+
+    assert {segment for segment, _ in table.scan_calls} == set(range(SEGMENTS))
+    assert (result["scanned"], result["updated"], result["resumed"]) == (11, 10, 0)
+    assert_backfilled(table, 10)
+    # items without an owner address are left alone
+    assert "account" not in table.items["key-010"]
+
+    # accounts and address inputs already up to date are not written again
+    table.written.clear()
+    result = run_backfill(
+        table,
+        "keys",
+        account_parameters(),
+        total_segments=SEGMENTS,
+        workers=2,
+        page_size=PAGE_SIZE,
+    )
+    assert (result["scanned"], result["updated"]) == (11, 0)
+    assert table.written == []
+
+
+def test_interrupted_run_resumes_from_checkpoint(tmp_path):
+    checkpoint_path = str(tmp_path / "backfill_checkpoint.json")
+    table = StubKeyTable(key_items(12))
+    # segment 1 holds key-001, key-005 and key-009 and fails after its first page
+    table.fail_scan = lambda segment, start_key: segment == 1 and start_key is not None
+
+    with pytest.raises(Exception, match="connection reset"):
+        run_backfill(
+            table,
+            "keys",
+            account_parameters(),
+            total_segments=SEGMENTS,
+            workers=1,
+            checkpoint_path=checkpoint_path,
+            page_size=PAGE_SIZE,
+        )
+
+    with open(checkpoint_path) as f:
+        segments = json.load(f)["segments"]
+    assert segments["1"] == {
+        "last_evaluated_key": {"key_id": {"S": "key-005"}},
+        "done": False,
+        "scanned": 2,
+        "updated": 2,
+    }
+    assert all(segments[str(segment)]["done"] for segment in (0, 2, 3))
+
+    table.fail_scan = None
+    table.scan_calls.clear()
+    table.written.clear()
+    result = run_backfill(
+        table,
+        "keys",
+        account_parameters(),
+        total_segments=SEGMENTS,
+        workers=1,
+        checkpoint_path=checkpoint_path,
+        page_size=PAGE_SIZE,
+    )
+
+    # only the remaining page of the interrupted segment is scanned
+    assert table.scan_calls == [(1, {"key_id": {"S": "key-005"}})]
+    assert table.written == ["key-009"]
+    assert (result["scanned"], result["updated"], result["resumed"]) == (12, 12, 11)
+    assert_backfilled(table, 12)
+
+
+@pytest.mark.parametrize(
+    "changed_parameters",
+    [
+        account_parameters(salt=1),
+        account_parameters(entrypoint="0x0576a174D229E3cFA37253523E645A78A0C91B57"),
+    ],
+    ids=["salt", "entrypoint"],
+)
+def test_checkpoint_of_other_account_parameters_rejected(tmp_path, changed_parameters):
+    checkpoint_path = str(tmp_path / "backfill_checkpoint.json")
+    table = StubKeyTable(key_items(4))
+    run_backfill(
+        table,
+        "keys",
+        account_parameters(),
+        total_segments=SEGMENTS,
+        workers=1,
+        checkpoint_path=checkpoint_path,
+        page_size=PAGE_SIZE,
+    )
+    table.scan_calls.clear()
+
+    with pytest.raises(Exception, match="remove it to start over"):
+        run_backfill(
+            table,
+            "keys",
+            changed_parameters,
+            total_segments=SEGMENTS,
+            workers=1,
+            checkpoint_path=checkpoint_path,
+            page_size=PAGE_SIZE,
+        )
+    with pytest.raises(Exception, match="cannot resume with 2"):
+        run_backfill(
+            table,
+            "keys",
+            account_parameters(),
+            total_segments=2,
+            workers=1,
+            checkpoint_path=checkpoint_path,
+            page_size=PAGE_SIZE,
+        )
+
+    assert table.scan_calls == []
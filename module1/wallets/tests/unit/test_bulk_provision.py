@@ -0,0 +1,296 @@
+#  Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#  SPDX-License-Identifier: MIT-0
+import io
+import threading
+
+from botocore.exceptions import ClientError
+
+from bulk_provision import (
+    AdaptiveConcurrencyLimiter,
+    S3Checkpoint,
+    load_manifest,
+    provision_keys,
+)
+
+KEY_TABLE = "keys"
+MAPPING_TABLE = "mappings"
+
+
+class StubDynamoDB:
+    """
+    key and mapping tables supporting BatchGetItem and BatchWriteItem, records the written tables in order
+
+    the first BatchGetItem leaves its last unprocessed_keys keys unprocessed
+    """
+
+    def __init__(self, mappings: dict = None, unprocessed_keys: int = 0) -> None:
+        self.tables = {KEY_TABLE: {}, MAPPING_TABLE: dict(mappings or {})}
+        self.unprocessed_keys = unprocessed_keys
+        self.batch_get_calls = 0
+        self.writes = []
+        self._lock = threading.Lock()
+
+    def batch_get_item(self, RequestItems: dict) -> dict:
+        request = RequestItems[MAPPING_TABLE]
+        assert request["ProjectionExpression"] == "#sub"
+        keys = request["Keys"]
+        assert len(keys) <= 100
+
+        self.batch_get_calls += 1
+        unprocessed = []
+        if self.unprocessed_keys:
+            keys, unprocessed = (
+                keys[: -self.unprocessed_keys],
+                keys[-self.unprocessed_keys :],
+            )
+            self.unprocessed_keys = 0
+
+        response = {
+            "Responses": {
+                MAPPING_TABLE: [
+                    {"sub": key["sub"]}
+                    for key in keys
+                    if key["sub"]["S"] in self.tables[MAPPING_TABLE]
+                ]
+            }
+        }
+        if unprocessed:
+            response["UnprocessedKeys"] = {
+                MAPPING_TABLE: {**request, "Keys": unprocessed}
+            }
+
+        return response
+
+    def batch_write_item(self, RequestItems: dict) -> dict:
+        ((table_name, requests),) = RequestItems.items()
+        assert len(requests) <= 25
+        with self._lock:
+            for request in requests:
+                item = request["PutRequest"]["Item"]
+                if table_name == MAPPING_TABLE:
+                    # a mapping must never point to a key that has not been written yet
+                    assert item["key_id"]["S"] in self.tables[KEY_TABLE]
+                    self.tables[MAPPING_TABLE][item["sub"]["S"]] = item
+                else:
+                    self.tables[KEY_TABLE][item["key_id"]["S"]] = item
+            self.writes.append(table_name)
+
+        return {"UnprocessedItems": {}}
+
+
+class StubKeyGenerator:
+    """
+    generate_key stand-in, throttles the first throttles[sub] calls for a sub
+    """
+
+    def __init__(self, throttles: dict = None) -> None:
+        self.throttles = dict(throttles or {})
+        self.calls = []
+        self._lock = threading.Lock()
+
+    def __call__(self, sub: str) -> dict:
+        with self._lock:
+            self.calls.append(sub)
+            if self.throttles.get(sub):
+                self.throttles[sub] -= 1
+                raise ClientError(
+                    {"Error": {"Code": "ThrottlingException"}},
+                    "GenerateDataKeyPairWithoutPlaintext",
+                )
+
+        return {
+            "ciphertext": f"ciphertext-{sub}",
+            "address": f"address-{sub}",
+            "key_id": f"key-{sub}",
+            "backend": "kms",
+        }
+
+
+class StubS3Client:
+    class exceptions:
+        class NoSuchKey(Exception):
+            pass
+
+    def __init__(self, objects: dict) -> None:
+        self.objects = dict(objects)
+
+    def get_object(self, Bucket, Key):
+        if (Bucket, Key) not in self.objects:
+            raise self.exceptions.NoSuchKey(Key)
+        return {"Body": io.BytesIO(self.objects[(Bucket, Key)])}
+
+    def put_object(self, Bucket, Key, Body):
+        self.objects[(Bucket, Key)] = Body
+
+
+def subs(count: int) -> list:
+    return [f"sub-{index:03d}" for index in range(count)]
+
+
+def test_limiter_increases_additively_and_halves_on_throttling():
+    limiter = AdaptiveConcurrencyLimiter(max_limit=6)
+    assert limiter.limit == 3
+
+    def complete(throttled: bool) -> None:
+        limiter.acquire()
+        limiter.release(throttled)
+
+    # +1 only after a full window of successes
+    for _ in range(2):
+        complete(False)
+    assert limiter.limit == 3
+    complete(False)
+    assert limiter.limit == 4
+    for _ in range(4 + 5):
+        complete(False)
+    assert limiter.limit == 6
+
+    # capped at max_limit
+    for _ in range(12):
+        complete(False)
+    assert limiter.limit == 6
+
+    complete(True)
+    assert limiter.limit == 3
+    # throttling resets the window
+    complete(False)
+    complete(False)
+    complete(True)
+    assert limiter.limit == 1
+    complete(True)
+    assert (limiter.limit, limiter.throttles, limiter.in_flight) == (1, 3, 0)
+
+
+def test_limiter_blocks_above_limit():
+    limiter = AdaptiveConcurrencyLimiter(max_limit=2, initial_limit=1)
+    limiter.acquire()
+
+    acquired = threading.Event()
+    waiter = threading.Thread(target=lambda: (limiter.acquire(), acquired.set()))
+    waiter.start()
+    assert not acquired.wait(0.1)
+
+    limiter.release(False)
+    assert acquired.wait(5)
+    waiter.join()
+    assert limiter.in_flight == 1
+
+
+def test_existing_subs_skipped():
+    existing = {
+        sub: {"sub": {"S": sub}, "key_id": {"S": f"old-{sub}"}}
+        for sub in ("sub-003", "sub-101", "sub-119")
+    }
+    ddb = StubDynamoDB(existing, unprocessed_keys=10)
+    generate_key = StubKeyGenerator()
+
+    # duplicate manifest entries are provisioned once
+    result = provision_keys(
+        ddb, KEY_TABLE, MAPPING_TABLE, generate_key, subs(120) + ["sub-007"], workers=4
+    )
+
+    assert (result["provisioned"], result["skipped"], result["complete"]) == (
+        117,
+        3,
+        True,
+    )
+    # two requests of up to 100 keys, the unprocessed keys of the first one are retried
+    assert ddb.batch_get_calls == 3
+    assert sorted(generate_key.calls) == [
+        sub for sub in subs(120) if sub not in existing
+    ]
+    for sub in existing:
+        assert ddb.tables[MAPPING_TABLE][sub]["key_id"]["S"] == f"old-{sub}"
+    assert ddb.tables[MAPPING_TABLE]["sub-000"]["key_id"]["S"] == "key-sub-000"
+
+
+def test_keys_written_before_mappings():
+    ddb = StubDynamoDB()
+
+    result = provision_keys(
+        ddb,
+        KEY_TABLE,
+        MAPPING_TABLE,
+        StubKeyGenerator(),
+        subs(60),
+        workers=4,
+        chunk_size=30,
+    )
+
+    assert result["provisioned"] == 60
+    # per chunk: two key batches, then two mapping batches
+    assert (
+        ddb.writes
+        == [KEY_TABLE] * 2 + [MAPPING_TABLE] * 2 + [KEY_TABLE] * 2 + [MAPPING_TABLE] * 2
+    )
+    assert ddb.tables[KEY_TABLE]["key-sub-059"] == {
+        "key_id": {"S": "key-sub-059"},
+        "ciphertext": {"S": "ciphertext-sub-059"},
+        "address": {"S": "address-sub-059"},
+    }
+
+
+def test_throttled_key_generation_retried():
+    generate_key = StubKeyGenerator({"sub-001": 2})
+
+    result = provision_keys(
+        StubDynamoDB(), KEY_TABLE, MAPPING_TABLE, generate_key, subs(3), workers=4
+    )
+
+    assert result["provisioned"] == 3
+    assert result["throttled_requests"] == 2
+    assert generate_key.calls.count("sub-001") == 3
+
+
+def test_manifest_run_resumes_from_s3_checkpoint():
+    manifest = "\n".join(subs(10)).encode() + b"\n\n"
+    s3 = StubS3Client({("migration", "subs.txt"): manifest})
+    ddb = StubDynamoDB()
+    generate_key = StubKeyGenerator()
+
+    manifest_subs = load_manifest(s3, "migration", "subs.txt")
+    assert manifest_subs == subs(10)
+    checkpoint = S3Checkpoint(s3, "migration", "subs.txt")
+    assert checkpoint.load() == 0
+
+    # stops after the first chunk, e.g. close to the Lambda timeout
+    chunks = iter([False, True])
+    result = provision_keys(
+        ddb,
+        KEY_TABLE,
+        MAPPING_TABLE,
+        generate_key,
+        manifest_subs,
+        start_index=checkpoint.load(),
+        chunk_size=4,
+        checkpoint=checkpoint.save,
+        should_stop=lambda: next(chunks),
+    )
+    assert (result["next_index"], result["complete"]) == (4, False)
+    assert s3.objects[("migration", "subs.txt.checkpoint.json")] == b'{"next_index": 4}'
+
+    # the next invocation continues with the first unprocessed sub
+    result = provision_keys(
+        ddb,
+        KEY_TABLE,
+        MAPPING_TABLE,
+        generate_key,
+        load_manifest(s3, "migration", "subs.txt"),
+        start_index=S3Checkpoint(s3, "migration", "subs.txt").load(),
+        chunk_size=4,
+        checkpoint=checkpoint.save,
+    )
+    assert result["start_index"] == 4
+    assert (result["next_index"], result["complete"], result["provisioned"]) == (
+        10,
+        True,
+        6,
+    )
+    assert sorted(generate_key.calls) == subs(10)
+    assert checkpoint.load() == 10
+
+
+def test_json_manifest():
+    s3 = StubS3Client({("migration", "subs.json"): b'["sub-000", "sub-001"]'})
+
+    assert load_manifest(s3, "migration", "subs.json") == ["sub-000", "sub-001"]
@@ -0,0 +1,226 @@
+#  Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#  SPDX-License-Identifier: MIT-0
+import base64
+import random
+import time
+
+import pytest
+from botocore.exceptions import ClientError
+
+from key_pool import (
+    POOL_STATE_AVAILABLE,
+    RESERVATION_TIMEOUT_SECONDS,
+    claim_pooled_key,
+    refill_pool,
+)
+
+POOL_SIZE = 100
+
+
+class StubPoolTable:
+    """
+    key pool table with the available slots index and KMS stand-in, records the DynamoDB operations
+    """
+
+    def __init__(self, items: dict) -> None:
+        self.items = items
+        self.operations = []
+        self.queries = []
+        self.re_encrypt_error = None
+
+    @staticmethod
+    def condition_failed(operation: str) -> ClientError:
+        return ClientError(
+            {"Error": {"Code": "ConditionalCheckFailedException"}}, operation
+        )
+
+    def query(
+        self,
+        TableName,
+        IndexName,
+        KeyConditionExpression,
+        ExpressionAttributeValues,
+        Limit,
+    ):
+        self.operations.append("Query")
+        self.queries.append(KeyConditionExpression)
+        state = ExpressionAttributeValues[":available"]["S"]
+        start = int(ExpressionAttributeValues[":start"]["N"])
+        if KeyConditionExpression.endswith("slot >= :start"):
+            in_range = lambda slot: slot >= start  # noqa: E731
+        else:
+            assert KeyConditionExpression.endswith("slot < :start")
+            in_range = lambda slot: slot < start  # noqa: E731
+        slots = sorted(
+            slot
+            for slot, item in self.items.items()
+            if item.get("pool_state", {}).get("S") == state and in_range(slot)
+        )
+        return {"Items": [{"slot": {"N": str(slot)}} for slot in slots[:Limit]]}
+
+    def update_item(
+        self,
+        TableName,
+        Key,
+        UpdateExpression,
+        ConditionExpression,
+        ExpressionAttributeValues,
+        ReturnValues=None,
+    ):
+        self.operations.append("UpdateItem")
+        item = self.items.get(int(Key["slot"]["N"]))
+        values = ExpressionAttributeValues
+        if UpdateExpression.startswith("REMOVE pool_state"):
+            # reservation
+            if item is None or item.get("pool_state") != values[":available"]:
+                raise self.condition_failed("UpdateItem")
+            del item["pool_state"]
+            item["claim_id"] = values[":claim_id"]
+            item["claimed_at"] = values[":now"]
+            return {"Attributes": dict(item)}
+
+        if "REMOVE claim_id" in UpdateExpression:
+            # release
+            if item is None or item.get("claim_id") != values[":claim_id"]:
+                raise self.condition_failed("UpdateItem")
+            del item["claim_id"], item["claimed_at"]
+            item["pool_state"] = values[":available"]
+            return {}
+
+        # indexing of legacy slots
+        if item is None or "claim_id" in item:
+            raise self.condition_failed("UpdateItem")
+        item["pool_state"] = values[":available"]
+        return {}
+
+    def delete_item(
+        self, TableName, Key, ConditionExpression, ExpressionAttributeValues
+    ):
+        self.operations.append("DeleteItem")
+        slot = int(Key["slot"]["N"])
+        item = self.items.get(slot)
+        if (
+            item is None
+            or item.get("claim_id") != ExpressionAttributeValues[":claim_id"]
+        ):
+            raise self.condition_failed("DeleteItem")
+        del self.items[slot]
+
+    def scan(self, TableName, ProjectionExpression):
+        return {"Items": list(self.items.values())}
+
+    def put_item(self, TableName, Item, ConditionExpression):
+        self.items[int(Item["slot"]["N"])] = Item
+
+    def re_encrypt(self, CiphertextBlob, **kwargs):
+        if self.re_encrypt_error:
+            raise self.re_encrypt_error
+        return {"CiphertextBlob": CiphertextBlob}
+
+    def generate_data_key_pair_without_plaintext(
+        self, EncryptionContext, KeyId, KeyPairSpec
+    ):
+        return {"PrivateKeyCiphertextBlob": b"ciphertext", "PublicKey": b"public key"}
+
+
+def pooled_item(slot: int, indexed: bool = True) -> dict:
+    item = {
+        "slot": {"N": str(slot)},
+        "key_id": {"S": f"key-{slot}"},
+        "ciphertext": {"S": base64.standard_b64encode(b"ciphertext").decode("utf-8")},
+        "address": {"S": f"address-{slot}"},
+    }
+    if indexed:
+        item["pool_state"] = {"S": POOL_STATE_AVAILABLE}
+    return item
+
+
+def claim(table: StubPoolTable):
+    return claim_pooled_key(table, table, "pool", "alias/kms", POOL_SIZE, "sub")
+
+
+def test_claim_from_drained_pool(monkeypatch):
+    table = StubPoolTable({97: pooled_item(97)})
+    monkeypatch.setattr(random, "randrange", lambda stop: 50)
+
+    assert claim(table)["key_id"] == "key-97"
+    # the last key of the pool is found without probing empty slots, deleted after the re-encryption
+    assert table.operations == ["Query", "Query", "UpdateItem", "DeleteItem"]
+    assert table.items == {}
+
+    table.operations.clear()
+    assert claim(table) is None
+    assert table.operations == ["Query", "Query"]
+
+
+@pytest.mark.parametrize("start, candidates", [(50, [50, 51, 52]), (98, [98, 99, 0])])
+def test_claim_candidates_start_at_random_slot(monkeypatch, start, candidates):
+    table = StubPoolTable({slot: pooled_item(slot) for slot in range(POOL_SIZE)})
+    monkeypatch.setattr(random, "randrange", lambda stop: start)
+    shuffled = []
+    monkeypatch.setattr(random, "shuffle", lambda slots: shuffled.extend(slots))
+
+    claimed = claim(table)
+
+    # concurrent claims start at different slots instead of all competing for the lowest ones, wrapping around
+    assert shuffled == candidates
+    assert claimed["key_id"] == f"key-{candidates[0]}"
+    assert len(table.items) == POOL_SIZE - 1
+
+
+def test_failed_re_encryption_puts_slot_back(monkeypatch):
+    table = StubPoolTable({7: pooled_item(7)})
+    table.re_encrypt_error = ClientError(
+        {"Error": {"Code": "KMSInternalException"}}, "ReEncrypt"
+    )
+
+    with pytest.raises(ClientError):
+        claim(table)
+
+    # the key pair has not been bound to the user, it is claimable again
+    assert table.items == {7: pooled_item(7)}
+    table.re_encrypt_error = None
+    assert claim(table)["key_id"] == "key-7"
+
+
+def test_refill_deletes_abandoned_reservations():
+    now = int(time.time())
+    abandoned = {
+        **pooled_item(1, indexed=False),
+        "claim_id": {"S": "abandoned"},
+        "claimed_at": {"N": str(now - RESERVATION_TIMEOUT_SECONDS - 1)},
+    }
+    in_progress = {
+        **pooled_item(2, indexed=False),
+        "claim_id": {"S": "in-progress"},
+        "claimed_at": {"N": str(now)},
+    }
+    table = StubPoolTable({1: abandoned, 2: in_progress})
+
+    result = refill_pool(
+        table, table, "pool", "alias/kms", POOL_SIZE, lambda public_key: "address"
+    )
+
+    # the key pair of an abandoned reservation may have been handed out, its slot gets a new key pair
+    assert result["abandoned_reservations"] == 1
+    assert result["added"] == POOL_SIZE - 1
+    assert table.items[1]["key_id"] != abandoned["key_id"]
+    # a reservation in progress is neither deleted nor made available
+    assert table.items[2] == in_progress
+
+
+def test_refill_indexes_legacy_slots():
+    table = StubPoolTable({3: pooled_item(3, indexed=False)})
+
+    result = refill_pool(
+        table, table, "pool", "alias/kms", POOL_SIZE, lambda public_key: "address"
+    )
+
+    assert (result["empty_slots"], result["added"], result["indexed"]) == (
+        POOL_SIZE - 1,
+        POOL_SIZE - 1,
+        1,
+    )
+    assert all(
+        item["pool_state"]["S"] == POOL_STATE_AVAILABLE for item in table.items.values()
+    )
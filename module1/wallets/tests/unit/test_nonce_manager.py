@@ -0,0 +1,146 @@
+#  Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#  SPDX-License-Identifier: MIT-0
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from botocore.exceptions import ClientError
+
+from nonce_manager import NonceManager, compose_nonce
+
+ACCOUNT = "0x7BC12c4D795e513E7C86a720FC577d22b587Be05"
+NONCE_KEY = 5
+
+
+class StubNonceTable:
+    """
+    nonce cursor table evaluating the condition expressions used by NonceManager atomically
+    """
+
+    def __init__(self) -> None:
+        self.cursors = {}
+        self.put_calls = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def condition_failed(operation: str) -> ClientError:
+        return ClientError(
+            {"Error": {"Code": "ConditionalCheckFailedException"}}, operation
+        )
+
+    @staticmethod
+    def cursor_key(Key: dict) -> tuple:
+        return Key["account"]["S"], int(Key["nonce_key"]["S"])
+
+    def update_item(
+        self,
+        TableName,
+        Key,
+        UpdateExpression,
+        ExpressionAttributeValues,
+        ReturnValues,
+        ConditionExpression=None,
+    ):
+        cursor_key = self.cursor_key(Key)
+        with self._lock:
+            previous = self.cursors.get(cursor_key)
+            if UpdateExpression.startswith("ADD next_sequence"):
+                assert ConditionExpression == "attribute_exists(next_sequence)"
+                if previous is None:
+                    raise self.condition_failed("UpdateItem")
+                self.cursors[cursor_key] = previous + int(
+                    ExpressionAttributeValues[":count"]["N"]
+                )
+            else:
+                if ConditionExpression is not None:
+                    assert ConditionExpression == (
+                        "attribute_not_exists(next_sequence) OR next_sequence > :failed"
+                    )
+                    failed = int(ExpressionAttributeValues[":failed"]["N"])
+                    if previous is not None and not previous > failed:
+                        raise self.condition_failed("UpdateItem")
+                self.cursors[cursor_key] = int(
+                    ExpressionAttributeValues[":sequence"]["N"]
+                )
+
+        if previous is None:
+            return {}
+        return {"Attributes": {"next_sequence": {"N": str(previous)}}}
+
+    def put_item(self, TableName, Item, ConditionExpression):
+        assert ConditionExpression == "attribute_not_exists(next_sequence)"
+        cursor_key = self.cursor_key(Item)
+        with self._lock:
+            self.put_calls += 1
+            if cursor_key in self.cursors:
+                raise self.condition_failed("PutItem")
+            self.cursors[cursor_key] = int(Item["next_sequence"]["N"])
+
+
+def test_concurrent_first_reservations_get_disjoint_ranges():
+    table = StubNonceTable()
+    workers = 8
+    # all callers miss the cursor and read the chain before any of them initializes it
+    chain_reads = threading.Barrier(workers, timeout=5)
+
+    def get_chain_nonce(account: str, key: int) -> int:
+        chain_reads.wait()
+        return compose_nonce(key, 3)
+
+    manager = NonceManager(table, "nonces", get_chain_nonce)
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        ranges = list(
+            executor.map(
+                lambda _: manager.reserve(ACCOUNT, NONCE_KEY, count=4), range(workers)
+            )
+        )
+
+    nonces = [nonce for reserved in ranges for nonce in reserved]
+    assert sorted(nonces) == [
+        compose_nonce(NONCE_KEY, sequence) for sequence in range(3, 3 + 4 * workers)
+    ]
+    # every range is consecutive
+    assert all(
+        reserved == list(range(reserved[0], reserved[0] + 4)) for reserved in ranges
+    )
+    assert table.put_calls == workers
+    assert table.cursors[(ACCOUNT, NONCE_KEY)] == 3 + 4 * workers
+
+
+def test_lost_init_race_still_reserves():
+    table = StubNonceTable()
+
+    def get_chain_nonce(account: str, key: int) -> int:
+        # a concurrent request initializes the cursor and reserves two nonces while this one reads the chain
+        table.cursors[(account, key)] = 9
+        return compose_nonce(key, 7)
+
+    manager = NonceManager(table, "nonces", get_chain_nonce)
+
+    assert manager.reserve(ACCOUNT.lower(), NONCE_KEY, count=2) == [
+        compose_nonce(NONCE_KEY, 9),
+        compose_nonce(NONCE_KEY, 10),
+    ]
+    assert table.cursors[(ACCOUNT, NONCE_KEY)] == 11
+
+
+def test_resync_rewinds_only_while_cursor_is_ahead_of_failed_nonce():
+    table = StubNonceTable()
+    table.cursors[(ACCOUNT, NONCE_KEY)] = 12
+    manager = NonceManager(table, "nonces", lambda account, key: compose_nonce(key, 8))
+
+    assert manager.resync(ACCOUNT, NONCE_KEY, compose_nonce(NONCE_KEY, 9)) == {
+        "resynced": True,
+        "previous_nonce": compose_nonce(NONCE_KEY, 12),
+        "next_nonce": compose_nonce(NONCE_KEY, 8),
+    }
+    assert manager.reserve(ACCOUNT, NONCE_KEY) == [compose_nonce(NONCE_KEY, 8)]
+
+    # a second failure reported for the same gap must not hand out nonce 8 again
+    assert manager.resync(ACCOUNT, NONCE_KEY, compose_nonce(NONCE_KEY, 10)) == {
+        "resynced": False
+    }
+    assert table.cursors[(ACCOUNT, NONCE_KEY)] == 9
+
+    with pytest.raises(ValueError):
+        manager.resync(ACCOUNT, NONCE_KEY, compose_nonce(NONCE_KEY + 1, 9))
@@ -0,0 +1,182 @@
+#  Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#  SPDX-License-Identifier: MIT-0
+import importlib.util
+import json
+import os
+import threading
+
+import pytest
+
+from tests.unit.conftest import LAMBDA_DIR, StubSSMClient
+
+SUB = "68090fe5-1c30-4292-b92a-90e29afb35c4"
+KEY_ID = "acb2ff44-db6a-4bf0-ad00-c499c64d676c"
+CLAIMS = {
+    "key_id": KEY_ID,
+    "address": "0x9d8A62f656a8d1615C1294fd71e9CFb3E4855A4F",
+    "account": "0x7BC12c4D795e513E7C86a720FC577d22b587Be05",
+    "backend": "kms",
+}
+
+
+class StubBackend:
+    """
+    key tables without account address and a state machine blocking until released while block_executions is set
+    """
+
+    def __init__(self) -> None:
+        self.block_executions = True
+        self.key_item = {"address": {"S": CLAIMS["address"]}}
+        self.release = threading.Event()
+        self.sync_executions = []
+        self.async_executions = []
+
+    def get_item(self, TableName, Key, ProjectionExpression):
+        if TableName == "mapping":
+            return {"Item": {"key_id": {"S": KEY_ID}, "backend": {"S": "kms"}}}
+        return {"Item": self.key_item}
+
+    def start_sync_execution(self, stateMachineArn, name, input):
+        self.sync_executions.append(name)
+        if self.block_executions:
+            self.release.wait(10)
+        return {"output": json.dumps(CLAIMS)}
+
+    def start_execution(self, stateMachineArn, name, input):
+        self.async_executions.append(name)
+
+
+@pytest.fixture
+def pre_token_gen(monkeypatch):
+    spec = importlib.util.spec_from_file_location(
+        "pre_token_gen_lambda_function",
+        os.path.join(LAMBDA_DIR, "pre_token_gen", "lambda_function.py"),
+    )
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+
+    backend = StubBackend()
+    monkeypatch.setattr(module, "client_ddb", backend)
+    monkeypatch.setattr(module, "client_stepfunctions", backend)
+    monkeypatch.setattr(
+        module,
+        "client_ssm",
+        StubSSMClient(
+            {
+                "/app/log_level": "WARNING",
+                "/web3/aa/factory": "0x01",
+                "/web3/aa/entrypoint": "0x02",
+                "/web3/aa/salt": "0",
+            }
+        ),
+    )
+    monkeypatch.setattr(module, "TRIGGER_DEADLINE_MS", 300)
+    monkeypatch.setattr(module, "DEADLINE_MARGIN_MS", 100)
+    for env, value in {
+        "LOG_LEVEL_SSM_PARAM": "/app/log_level",
+        "KEY_MODE": "KMS",
+        "KMS_PRE_TOKEN_SF": "arn:aws:states:us-east-1:123456789012:stateMachine:kms",
+        "KEY_MAPPING_TABLE": "mapping",
+        "KMS_KEY_TABLE": "keys",
+        "AA_ACCOUNT_FACTORY_ADDRESS_SSM_PARAM": "/web3/aa/factory",
+        "AA_ENTRYPOINT_ADDRESS_SSM_PARAM": "/web3/aa/entrypoint",
+        "AA_ACCOUNT_SALT_SSM_PARAM": "/web3/aa/salt",
+    }.items():
+        monkeypatch.setenv(env, value)
+
+    module.backend = backend
+    yield module
+    backend.release.set()
+
+
+def login() -> dict:
+    return {
+        "request": {"userAttributes": {"sub": SUB, "email": "user@example.com"}},
+        "response": {},
+    }
+
+
+def test_degraded_login_does_not_start_backfill(pre_token_gen):
+    event = pre_token_gen.lambda_handler(login(), None)
+
+    claims = event["response"]["claimsOverrideDetails"]["claimsToAddOrOverride"]
+    assert claims == {
+        "key_id": KEY_ID,
+        "public_address": CLAIMS["address"],
+        "backend": "kms",
+    }
+    # the in-flight synchronous execution stores the account address
+    assert pre_token_gen.backend.async_executions == []
+    assert len(pre_token_gen.stale_futures) == 1
+
+
+def test_executor_replaced_when_blocked_by_abandoned_executions(pre_token_gen):
+    executor = pre_token_gen.sf_executor
+    for _ in range(pre_token_gen.SF_MAX_WORKERS):
+        pre_token_gen.lambda_handler(login(), None)
+
+    assert len(pre_token_gen.backend.sync_executions) == pre_token_gen.SF_MAX_WORKERS
+    assert pre_token_gen.backend.async_executions == []
+
+    # all workers blocked, the next login runs on a fresh executor instead of queueing
+    pre_token_gen.backend.block_executions = False
+    event = pre_token_gen.lambda_handler(login(), None)
+
+    assert pre_token_gen.sf_executor is not executor
+    assert (
+        event["response"]["claimsOverrideDetails"]["claimsToAddOrOverride"][
+            "account_address"
+        ]
+        == CLAIMS["account"]
+    )
+
+
+@pytest.mark.parametrize(
+    "name, value, fast_path",
+    [
+        (None, None, True),
+        ("account_factory", "0x03", False),
+        ("account_entrypoint", "0x03", False),
+        ("account_salt", "1", False),
+    ],
+)
+def test_fast_path_requires_unchanged_address_inputs(
+    pre_token_gen, name, value, fast_path
+):
+    address_inputs = {
+        "account_factory": "0x01",
+        "account_entrypoint": "0x02",
+        "account_salt": "0",
+    }
+    stored = {**address_inputs, **({name: value} if name else {})}
+    pre_token_gen.backend.key_item = {
+        "address": {"S": CLAIMS["address"]},
+        "account": {"S": CLAIMS["account"]},
+        **{
+            attribute: {"S": stored_value} for attribute, stored_value in stored.items()
+        },
+    }
+
+    claims = pre_token_gen.lookup_claims_fast_path(SUB, address_inputs)
+
+    # an account calculated for other inputs is recalculated by the state machine
+    assert bool(claims) == fast_path
+    if fast_path:
+        assert claims["account"] == CLAIMS["account"]
+
+
+def test_metrics_emitted_as_single_emf_line(pre_token_gen, capsys):
+    pre_token_gen.emit_metrics("fast_path", False, 12.3456)
+
+    (line,) = capsys.readouterr().out.splitlines()
+    record = json.loads(line)
+    (directive,) = record["_aws"]["CloudWatchMetrics"]
+    assert directive["Namespace"] == pre_token_gen.METRICS_NAMESPACE
+    assert directive["Dimensions"] == [[], ["path"]]
+    assert (record["path"], record["Degraded"], record["Latency"]) == (
+        "fast_path",
+        0,
+        12.346,
+    )
+    # the trigger ships without the web3 layer and its powertools dependency
+    assert not hasattr(pre_token_gen, "metrics_logger")
@@ -0,0 +1,275 @@
+#  Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#  SPDX-License-Identifier: MIT-0
+import json
+
+import aws_cdk as cdk
+import pytest
+from aws_cdk import (
+    assertions,
+    aws_dynamodb as ddb,
+    aws_lambda as lambda_,
+    aws_ssm as ssm,
+)
+
+from lib.stepfunctions.kms_sf import JWTStepFunctionConstruct
+from lib.stepfunctions.nitro_sf import NitroJWTStepFunctionConstruct
+
+# states that cost a service round trip
+TASK_TYPES = {"Task", "Parallel"}
+
+
+def synth_definition(construct_class, signing_backend: str) -> dict:
+    app = cdk.App(context={"aws:cdk:bundling-stacks": []})
+    stack = cdk.Stack(
+        app,
+        "PreTokenStateMachine",
+        env=cdk.Environment(account="123456789012", region="us-east-1"),
+    )
+    construct_class(
+        stack,
+        "StateMachine",
+        signing_backend,
+        ddb.Table.from_table_name(stack, "mappingTable", "mapping"),
+        ddb.Table.from_table_name(stack, "keyTable", "keys"),
+        lambda_.Function.from_function_arn(
+            stack,
+            "aaLambda",
+            "arn:aws:lambda:us-east-1:123456789012:function:aa",
+        ),
+        lambda_.Function.from_function_arn(
+            stack,
+            "keyLambda",
+            "arn:aws:lambda:us-east-1:123456789012:function:key",
+        ),
+        ssm.StringParameter.from_string_parameter_name(
+            stack, "factoryParameter", "/web3/aa/account_factory_address"
+        ),
+        ssm.StringParameter.from_string_parameter_name(
+            stack, "entrypointParameter", "/web3/aa/entrypoint_address"
+        ),
+        ssm.StringParameter.from_string_parameter_name(
+            stack, "saltParameter", "/web3/aa/account_salt"
+        ),
+    )
+
+    template = assertions.Template.from_stack(stack).to_json()
+    (state_machine,) = [
+        resource
+        for resource in template["Resources"].values()
+        if resource["Type"] == "AWS::StepFunctions::StateMachine"
+    ]
+    # tokens (table names, function arns) are irrelevant for the graph
+    parts = state_machine["Properties"]["DefinitionString"]["Fn::Join"][1]
+
+    return json.loads(
+        "".join(part if isinstance(part, str) else "token" for part in parts)
+    )
+
+
+def successors(state: dict) -> list:
+    if state["Type"] == "Choice":
+        return [choice["Next"] for choice in state["Choices"]] + [state["Default"]]
+
+    return [state["Next"]] if "Next" in state else []
+
+
+def table_writes(state: dict) -> list:
+    """
+    tables written by a DynamoDB task state, in the order of the items of a transaction
+    """
+    resource = state.get("Resource", "")
+    if resource.endswith(":dynamodb:transactWriteItems"):
+        return [
+            next(iter(item.values()))["TableName"]
+            for item in state["Parameters"]["TransactItems"]
+        ]
+    if resource.endswith((":dynamodb:putItem", ":dynamodb:updateItem")):
+        return [state["Parameters"]["TableName"]]
+
+    return []
+
+
+def state_cost(state: dict) -> int:
+    if state["Type"] == "Parallel":
+        return max(
+            longest_path(branch, branch["StartAt"]) for branch in state["Branches"]
+        )
+
+    return int(state["Type"] in TASK_TYPES)
+
+
+def longest_path(machine: dict, name: str, target: str = None, visited=()) -> int:
+    """
+    maximum number of sequential task states from name to target (any end state if None), -1 if unreachable
+    """
+    state = machine["States"][name]
+    if name == target or (target is None and not successors(state)):
+        return state_cost(state)
+
+    paths = [
+        longest_path(machine, successor, target, visited + (name,))
+        for successor in successors(state)
+        if successor not in visited
+    ]
+    reachable = [path for path in paths if path >= 0]
+    if not reachable:
+        return -1
+
+    return state_cost(state) + max(reachable)
+
+
+@pytest.mark.parametrize(
+    "construct_class, signing_backend, branches",
+    [(JWTStepFunctionConstruct, "kms", 2), (NitroJWTStepFunctionConstruct, "nitro", 2)],
+)
+def test_new_key_critical_path(construct_class, signing_backend, branches):
+    definition = synth_definition(construct_class, signing_backend)
+
+    parallel = definition["States"][f"{signing_backend}NewKeyParallel"]
+    assert len(parallel["Branches"]) == branches
+    assert all(
+        longest_path(branch, branch["StartAt"]) == 1 for branch in parallel["Branches"]
+    )
+
+    # mapping lookup, key generation, parallel key and mapping write and account address, account address update
+    assert (
+        longest_path(
+            definition, definition["StartAt"], f"{signing_backend}NewKeySucceed"
+        )
+        == 4
+    )
+
+
+@pytest.mark.parametrize(
+    "construct_class, signing_backend, writes",
+    [
+        # key and mapping in one transaction, the key item first
+        (JWTStepFunctionConstruct, "kms", [["keys", "mapping"]]),
+        # the enclave stores the key during key generation, before the parallel state
+        (NitroJWTStepFunctionConstruct, "nitro", [["mapping"]]),
+    ],
+)
+def test_new_key_stored_before_mapping(construct_class, signing_backend, writes):
+    definition = synth_definition(construct_class, signing_backend)
+
+    parallel = definition["States"][f"{signing_backend}NewKeyParallel"]
+    branch_writes = [
+        [table_writes(state) for state in branch["States"].values()]
+        for branch in parallel["Branches"]
+    ]
+
+    # only the account address calculation runs alongside the write, never a key write alongside a mapping write
+    assert [
+        [tables for tables in states if tables]
+        for states in branch_writes
+        if any(states)
+    ] == [writes]
+
+
+def test_new_key_transaction_race_resolves_existing_mapping():
+    definition = synth_definition(JWTStepFunctionConstruct, "kms")
+
+    parallel = definition["States"]["kmsNewKeyParallel"]
+    ((branch, transaction),) = [
+        (branch, state)
+        for branch in parallel["Branches"]
+        for state in branch["States"].values()
+        if state.get("Resource", "").endswith(":aws-sdk:dynamodb:transactWriteItems")
+    ]
+    conditions = [
+        item["Put"]["ConditionExpression"]
+        for item in transaction["Parameters"]["TransactItems"]
+    ]
+    assert conditions == ["attribute_not_exists(key_id)", "attribute_not_exists(#sub)"]
+    ((retry_errors, max_attempts),) = [
+        (retry["ErrorEquals"], retry["MaxAttempts"]) for retry in transaction["Retry"]
+    ]
+    assert "DynamoDb.TransactionConflictException" in retry_errors
+    assert "DynamoDb.ThrottlingException" in retry_errors
+    assert max_attempts == 2
+
+    # cancellations are told apart by their reasons, only a failed condition resolves the existing mapping
+    (transaction_catch,) = transaction["Catch"]
+    assert transaction_catch["ErrorEquals"] == ["DynamoDb.TransactionCanceledException"]
+    reason = branch["States"][transaction_catch["Next"]]
+    (condition_failed,) = reason["Choices"]
+    assert condition_failed["StringMatches"] == "*ConditionalCheckFailed*"
+    assert branch["States"][condition_failed["Next"]]["Error"] == "NewKeyMappingExists"
+    assert branch["States"][reason["Default"]]["Error"] == "NewKeyTransactionConflict"
+
+    ((retry_errors, max_attempts),) = [
+        (retry["ErrorEquals"], retry["MaxAttempts"]) for retry in parallel["Retry"]
+    ]
+    assert (retry_errors, max_attempts) == (["NewKeyTransactionConflict"], 2)
+    (catch,) = parallel["Catch"]
+    assert catch["ErrorEquals"] == ["NewKeyMappingExists"]
+    assert catch["Next"] == "kmsLookupKeyIDForSub"
+    assert definition["States"][catch["Next"]]["Parameters"]["ConsistentRead"] is True
+
+
+def test_new_mapping_race_resolves_existing_mapping_nitro():
+    definition = synth_definition(NitroJWTStepFunctionConstruct, "nitro")
+
+    parallel = definition["States"]["nitroNewKeyParallel"]
+    (put,) = [
+        state
+        for branch in parallel["Branches"]
+        for state in branch["States"].values()
+        if state.get("Resource", "").endswith(":dynamodb:putItem")
+    ]
+    assert put["Parameters"]["ConditionExpression"] == "attribute_not_exists(#sub)"
+    ((retry_errors, max_attempts),) = [
+        (retry["ErrorEquals"], retry["MaxAttempts"]) for retry in put["Retry"]
+    ]
+    assert "DynamoDb.ThrottlingException" in retry_errors
+    assert max_attempts == 2
+
+    (catch,) = parallel["Catch"]
+    assert catch["ErrorEquals"] == ["DynamoDb.ConditionalCheckFailedException"]
+    assert catch["Next"] == "nitroLookupKeyIDForSub"
+    assert definition["States"][catch["Next"]]["Parameters"]["ConsistentRead"] is True
+
+
+@pytest.mark.parametrize(
+    "construct_class, signing_backend",
+    [(JWTStepFunctionConstruct, "kms"), (NitroJWTStepFunctionConstruct, "nitro")],
+)
+def test_stored_account_compared_against_all_address_inputs(
+    construct_class, signing_backend
+):
+    definition = synth_definition(construct_class, signing_backend)
+    inputs = ["account_factory", "account_entrypoint", "account_salt"]
+
+    lookup = definition["States"][f"{signing_backend}LookupAccountAddressInputs"]
+    assert [
+        branch["States"][branch["StartAt"]]["Parameters"]["Name"]
+        for branch in lookup["Branches"]
+    ] == [
+        "/web3/aa/account_factory_address",
+        "/web3/aa/entrypoint_address",
+        "/web3/aa/account_salt",
+    ]
+    # the parameters are read concurrently, a single round trip
+    assert state_cost(lookup) == 1
+
+    (unchanged,) = definition["States"][
+        f"{signing_backend}ChoiceAccountAddressInputsUnchanged"
+    ]["Choices"]
+    assert [
+        (condition["Variable"], condition["StringEqualsPath"])
+        for condition in unchanged["And"]
+        if "StringEqualsPath" in condition
+    ] == [
+        (f"$.KeyParamsForKeyID.Item.{name}.S", f"$.AccountAddressInputs.{name}")
+        for name in inputs
+    ]
+
+    # the inputs are stored next to every calculated account
+    for store in [
+        "ExistingKeyDDBUpdateAAAccountAddress",
+        "NewKeyDDBUpdateAAAccountAddress",
+    ]:
+        names = definition["States"][f"{signing_backend}{store}"]["Parameters"][
+            "ExpressionAttributeNames"
+        ]
+        assert sorted(names.values()) == sorted(["account"] + inputs)
@@ -0,0 +1,56 @@
+#  Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#  SPDX-License-Identifier: MIT-0
+import pytest
+from ecdsa import NIST256p, SECP256k1, SigningKey
+
+from tests.unit.conftest import SIGNING_PRIVATE_KEY, pkcs8_private_key
+
+
+def test_extract_private_key_kms_layout(signing_lambda):
+    key_der = pkcs8_private_key(SIGNING_PRIVATE_KEY)
+
+    assert signing_lambda.extract_secp256k1_private_key(key_der) == SIGNING_PRIVATE_KEY
+    # same scalar as the generic ecdsa parser the fast path replaces
+    assert SigningKey.from_der(key_der).to_string() == SIGNING_PRIVATE_KEY
+
+
+def test_extract_private_key_without_public_key(signing_lambda):
+    # OneAsymmetricKey (version 1) without the optional ECPrivateKey fields as written by ecdsa
+    key_der = SigningKey.from_string(SIGNING_PRIVATE_KEY, curve=SECP256k1).to_der(
+        format="pkcs8"
+    )
+
+    assert signing_lambda.extract_secp256k1_private_key(key_der) == SIGNING_PRIVATE_KEY
+
+
+@pytest.mark.parametrize(
+    "key_der, error",
+    [
+        (pkcs8_private_key(SIGNING_PRIVATE_KEY) + b"\x00", "trailing data"),
+        (
+            SigningKey.from_string(SIGNING_PRIVATE_KEY, curve=NIST256p).to_der(
+                format="pkcs8"
+            ),
+            "algorithm identifier",
+        ),
+        (pkcs8_private_key(SIGNING_PRIVATE_KEY)[:-1], "exceeds input"),
+        (b"\x04\x00", "unexpected DER tag"),
+    ],
+)
+def test_extract_private_key_rejects_other_layouts(signing_lambda, key_der, error):
+    with pytest.raises(ValueError, match=error):
+        signing_lambda.extract_secp256k1_private_key(key_der)
+
+
+def test_parse_private_key_falls_back_to_ecdsa(signing_lambda):
+    # SEC1 ECPrivateKey without PKCS#8 wrapper is not handled by the fast path
+    key_der = SigningKey.from_string(SIGNING_PRIVATE_KEY, curve=SECP256k1).to_der()
+
+    assert signing_lambda.parse_der_encoded_private_key(key_der) == SIGNING_PRIVATE_KEY
+
+    with pytest.raises(Exception, match="different from SECP256K1"):
+        signing_lambda.parse_der_encoded_private_key(
+            SigningKey.from_string(SIGNING_PRIVATE_KEY, curve=NIST256p).to_der(
+                format="pkcs8"
+            )
+        )
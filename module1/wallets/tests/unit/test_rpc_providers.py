@@ -0,0 +1,114 @@
+#  Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#  SPDX-License-Identifier: MIT-0
+import json
+import threading
+import time
+
+import pytest
+import requests
+
+from rpc_providers import FailoverHTTPProvider, RPCEndpointClient
+
+
+class FakeResponse:
+    def __init__(self, content: bytes) -> None:
+        self.content = content
+
+    def raise_for_status(self) -> None:
+        pass
+
+
+class FakeSession:
+    """
+    transport of a single endpoint, answers eth_chainId with its chain id or raises error
+
+    with release set, requests block until the event is set
+    """
+
+    def __init__(self, chain_id: int, error: Exception = None) -> None:
+        self.chain_id = chain_id
+        self.error = error
+        self.release = None
+        self.calls = 0
+
+    def post(self, url, data, headers, timeout):
+        self.calls += 1
+        if self.release is not None:
+            self.release.wait(timeout)
+        if self.error is not None:
+            raise self.error
+
+        request = json.loads(data)
+        return FakeResponse(
+            json.dumps(
+                {"jsonrpc": "2.0", "id": request["id"], "result": hex(self.chain_id)}
+            ).encode()
+        )
+
+
+def endpoint(url: str, session: FakeSession) -> RPCEndpointClient:
+    client = RPCEndpointClient(url, pool_maxsize=1, timeout=5)
+    client.session = session
+    return client
+
+
+def chain_id(provider: FailoverHTTPProvider) -> int:
+    return int(provider.make_request("eth_chainId", [])["result"], 16)
+
+
+def test_failing_endpoint_is_demoted():
+    failing = FakeSession(1, requests.ConnectionError("connection refused"))
+    healthy = FakeSession(2)
+    provider = FailoverHTTPProvider(
+        [endpoint("https://a.example", failing), endpoint("https://b.example", healthy)]
+    )
+
+    # the configured order is kept until statistics are available, the request fails over to the second endpoint
+    assert chain_id(provider) == 2
+    assert (failing.calls, healthy.calls) == (1, 1)
+
+    # the failed endpoint ranks behind the healthy one and is not tried first anymore
+    assert [e.label for e in provider.ranked_endpoints()] == ["b.example", "a.example"]
+    assert chain_id(provider) == 2
+    assert (failing.calls, healthy.calls) == (1, 2)
+    assert provider.metrics()["a.example"]["errors"] == 1
+
+
+def test_hedged_request_returns_first_success():
+    slow = FakeSession(1)
+    slow.release = threading.Event()
+    fast = FakeSession(2)
+    provider = FailoverHTTPProvider(
+        [endpoint("https://a.example", slow), endpoint("https://b.example", fast)],
+        hedge_after_ms=20,
+    )
+
+    start = time.perf_counter()
+    try:
+        assert chain_id(provider) == 2
+        # answered by the hedged request while the first one is still in flight
+        assert time.perf_counter() - start < 1
+        assert (slow.calls, fast.calls) == (1, 1)
+    finally:
+        slow.release.set()
+
+
+@pytest.mark.parametrize("hedge_after_ms", [0, 20])
+def test_all_endpoints_failing_raises_last_error(hedge_after_ms):
+    first_error = requests.ConnectionError("connection refused")
+    last_error = requests.Timeout("read timed out")
+    provider = FailoverHTTPProvider(
+        [
+            endpoint("https://a.example", FakeSession(1, first_error)),
+            endpoint("https://b.example", FakeSession(2, last_error)),
+        ],
+        hedge_after_ms=hedge_after_ms,
+    )
+
+    with pytest.raises(Exception) as exc_info:
+        provider.make_request("eth_chainId", [])
+
+    assert exc_info.value.__cause__ is last_error
+    assert str(exc_info.value) == (
+        "all RPC endpoints failed: a.example: connection refused; b.example: read timed out"
+    )
@@ -0,0 +1,80 @@
+#  Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#  SPDX-License-Identifier: MIT-0
+import rlp
+from eth_account import Account
+from eth_utils import keccak
+
+from tests.unit.conftest import SIGNING_KEY_ID, SIGNING_PRIVATE_KEY, SIGNING_SUB
+from tests.unit.dev_chain import CHAIN_ID
+
+# https://eips.ethereum.org/EIPS/eip-155#example
+EIP155_TRANSACTION = {
+    "nonce": 9,
+    "gasPrice": 20 * 10**9,
+    "gas": 21000,
+    "to": "0x3535353535353535353535353535353535353535",
+    "value": 10**18,
+    "data": "0x",
+    "chainId": 1,
+}
+EIP155_SIGNED_TRANSACTION = (
+    "0xf86c098504a817c800825208943535353535353535353535353535353535353535880de0b6b3a76400008025a028ef61340bd939bc"
+    "2195fe537567866003e1a15d3c71ff63e1590620aa636276a067cbe9d8997f761aecb703304b3800ccf555c9f3dc64214b297fb196"
+    "6a3b6d83"
+)
+
+EIP1559_TRANSACTION = {
+    "type": 2,
+    "nonce": 0,
+    "to": "0x4159186832d06a97732c6c25bA8bF58F46E457f4",
+    "value": 1000000000000000,
+    "gas": 21000,
+    "maxFeePerGas": 2000000000,
+    "maxPriorityFeePerGas": 1000000000,
+    "data": "0x",
+}
+
+
+def sign_transaction(signing_lambda, transaction: dict) -> dict:
+    return signing_lambda.lambda_handler(
+        {
+            "operation": "sign_transaction",
+            "transaction": transaction,
+            "key_id": SIGNING_KEY_ID,
+            "sub": SIGNING_SUB,
+        },
+        None,
+    )
+
+
+def test_sign_transaction_eip155_vector(signing_lambda):
+    response = sign_transaction(signing_lambda, EIP155_TRANSACTION)
+
+    assert response["raw_transaction"] == EIP155_SIGNED_TRANSACTION
+    assert (
+        response["transaction_hash"]
+        == "0x" + keccak(hexstr=EIP155_SIGNED_TRANSACTION).hex()
+    )
+
+
+def test_sign_transaction_resolves_chain_id(signing_lambda, dev_chain):
+    signing_lambda.ssm.parameters["/web3/rpc_endpoint"] = dev_chain.url
+
+    response = sign_transaction(signing_lambda, EIP1559_TRANSACTION)
+
+    raw_transaction = bytes.fromhex(response["raw_transaction"][2:])
+    assert raw_transaction[0] == 2
+    assert (
+        Account.recover_transaction(raw_transaction)
+        == Account.from_key(SIGNING_PRIVATE_KEY).address
+    )
+    # typed transactions carry the chain id as first field of the rlp payload
+    assert int.from_bytes(rlp.decode(raw_transaction[1:])[0], "big") == CHAIN_ID
+
+    # the chain id is resolved once per RPC endpoint
+    sign_transaction(signing_lambda, dict(EIP1559_TRANSACTION, nonce=1))
+    assert [
+        request["method"]
+        for request in dev_chain.http_requests
+        if isinstance(request, dict)
+    ] == ["eth_chainId"]
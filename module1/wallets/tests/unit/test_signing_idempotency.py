@@ -0,0 +1,36 @@
+#  Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#  SPDX-License-Identifier: MIT-0
+from tests.unit.conftest import SIGNING_KEY_ID, SIGNING_SUB
+
+USEROP_HASH = "5033589a303c005b7e7818f4bf00e7361335f51f648be16c028951f90a1585d4"
+
+
+def sign_batch(signing_lambda, items: list) -> dict:
+    return signing_lambda.lambda_handler(
+        {
+            "operation": "sign_batch",
+            "items": items,
+            "key_id": SIGNING_KEY_ID,
+            "sub": SIGNING_SUB,
+        },
+        None,
+    )
+
+
+def test_batch_without_item_errors_is_replayed(signing_lambda):
+    items = [{"userop_hash": USEROP_HASH}]
+
+    first = sign_batch(signing_lambda, items)
+    assert sign_batch(signing_lambda, items) == first
+    assert signing_lambda.key_store.decrypt_calls == 1
+
+
+def test_batch_with_item_errors_is_not_persisted(signing_lambda):
+    items = [{"userop_hash": USEROP_HASH}, {"tx_hash": "0x00"}]
+
+    response = sign_batch(signing_lambda, items)
+    assert "error" in response["signatures"][1]
+
+    # the retry signs again instead of replaying the item error
+    sign_batch(signing_lambda, items)
+    assert signing_lambda.key_store.decrypt_calls == 2
@@ -0,0 +1,122 @@
+#  Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#  SPDX-License-Identifier: MIT-0
+import json
+
+import pytest
+from botocore.exceptions import ClientError
+
+from tests.unit.conftest import SIGNING_KEY_ID, SIGNING_PRIVATE_KEY, StubKeyStore
+
+USEROP_HASH = "5033589a303c005b7e7818f4bf00e7361335f51f648be16c028951f90a1585d4"
+
+
+class StubBackend(StubKeyStore):
+    """
+    key table, KMS and SQS stand-in, decryption is throttled or denied for the configured subs
+    """
+
+    def __init__(self, private_key: bytes, errors: dict) -> None:
+        super().__init__(private_key)
+        self.errors = errors
+        self.results = {}
+        self.visibility_changes = []
+        self.decrypted_subs = []
+
+    def decrypt(self, KeyId, CiphertextBlob, EncryptionContext):
+        self.decrypted_subs.append(EncryptionContext["sub"])
+        code = self.errors.get(EncryptionContext["sub"])
+        if code:
+            raise ClientError({"Error": {"Code": code, "Message": code}}, "Decrypt")
+        return super().decrypt(KeyId, CiphertextBlob, EncryptionContext)
+
+    def batch_write_item(self, RequestItems):
+        for requests in RequestItems.values():
+            for request in requests:
+                item = request["PutRequest"]["Item"]
+                self.results[item["request_id"]["S"]] = item["signature"]["S"]
+        return {"UnprocessedItems": {}}
+
+    def change_message_visibility_batch(self, QueueUrl, Entries):
+        self.visibility_changes.extend(Entries)
+        return {"Successful": [{"Id": entry["Id"]} for entry in Entries]}
+
+
+def record(message_id: str, body, receive_count: int = 1) -> dict:
+    return {
+        "messageId": message_id,
+        "receiptHandle": f"handle-{message_id}",
+        "body": body if isinstance(body, str) else json.dumps(body),
+        "attributes": {"ApproximateReceiveCount": str(receive_count)},
+    }
+
+
+def request(sub: str, request_id: str) -> dict:
+    return {
+        "request_id": request_id,
+        "operation": "sign_userop",
+        "userop_hash": USEROP_HASH,
+        "key_id": SIGNING_KEY_ID,
+        "sub": sub,
+    }
+
+
+@pytest.fixture
+def backend(signing_lambda, monkeypatch):
+    stub = StubBackend(
+        SIGNING_PRIVATE_KEY,
+        {"throttled": "ThrottlingException", "denied": "AccessDeniedException"},
+    )
+    for client in ["client_ddb", "client_kms", "client_sqs"]:
+        monkeypatch.setattr(signing_lambda, client, stub)
+    monkeypatch.setenv("SIGNING_RESULTS_TABLE", "results")
+    monkeypatch.setenv("SIGNING_REQUEST_QUEUE_URL", "https://sqs/requests")
+    return stub
+
+
+def test_sqs_handler_fails_only_offending_messages(signing_lambda, backend):
+    response = signing_lambda.sqs_handler(
+        {
+            "Records": [
+                record("1", request("ok", "r1")),
+                record("2", "not json"),
+                record("3", dict(request("ok", "r3"), operation="sign_message")),
+                record("4", request("denied", "r4")),
+                record("5", request("ok", "r5")),
+            ]
+        },
+        None,
+    )
+
+    assert response == {
+        "batchItemFailures": [
+            {"itemIdentifier": "2"},
+            {"itemIdentifier": "3"},
+            {"itemIdentifier": "4"},
+        ]
+    }
+    assert sorted(backend.results) == ["r1", "r5"]
+    assert backend.visibility_changes == []
+
+
+def test_sqs_handler_defers_throttled_messages(signing_lambda, backend):
+    response = signing_lambda.sqs_handler(
+        {
+            "Records": [
+                record("1", request("ok", "r1")),
+                record("2", request("throttled", "r2"), receive_count=3),
+                record("3", request("later", "r3")),
+            ]
+        },
+        None,
+    )
+
+    assert response == {
+        "batchItemFailures": [{"itemIdentifier": "2"}, {"itemIdentifier": "3"}]
+    }
+    assert list(backend.results) == ["r1"]
+    # groups after the throttled one are not attempted in this invocation
+    assert backend.decrypted_subs == ["ok", "throttled"]
+    assert backend.visibility_changes == [
+        {"Id": "0", "ReceiptHandle": "handle-2", "VisibilityTimeout": 120},
+        {"Id": "1", "ReceiptHandle": "handle-3", "VisibilityTimeout": 30},
+    ]
@@ -0,0 +1,138 @@
+#  Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#  SPDX-License-Identifier: MIT-0
+import copy
+
+import pytest
+from eth_account import Account
+from eth_account.messages import encode_typed_data
+from eth_utils import keccak, to_bytes
+
+from typed_data import hash_typed_data
+
+from tests.unit.conftest import SIGNING_KEY_ID, SIGNING_PRIVATE_KEY, SIGNING_SUB
+
+# https://eips.ethereum.org/EIPS/eip-712 example, signed with keccak256("cow")
+MAIL = {
+    "types": {
+        "EIP712Domain": [
+            {"name": "name", "type": "string"},
+            {"name": "version", "type": "string"},
+            {"name": "chainId", "type": "uint256"},
+            {"name": "verifyingContract", "type": "address"},
+        ],
+        "Person": [
+            {"name": "name", "type": "string"},
+            {"name": "wallet", "type": "address"},
+        ],
+        "Mail": [
+            {"name": "from", "type": "Person"},
+            {"name": "to", "type": "Person"},
+            {"name": "contents", "type": "string"},
+        ],
+    },
+    "primaryType": "Mail",
+    "domain": {
+        "name": "Ether Mail",
+        "version": "1",
+        "chainId": 1,
+        "verifyingContract": "0xCcCCccccCCCCcCCCCCCcCcCccCcCCCcCcccccccC",
+    },
+    "message": {
+        "from": {"name": "Cow", "wallet": "0xCD2a3d9F938E13CD947Ec05AbC7FE734Df8DD826"},
+        "to": {"name": "Bob", "wallet": "0xbBbBBBBbbBBBbbbBbbBbbbbBBbBbbbbBbBbbBBbB"},
+        "contents": "Hello, Bob!",
+    },
+}
+MAIL_DOMAIN_SEPARATOR = (
+    "f2cee375fa42b42143804025fc449deafd50cc031ca257e0b194a650a912090f"
+)
+MAIL_DIGEST = "be609aee343fb3c4b28e1df9e632fca64fcfaede20f02e86244efddf30957bd2"
+MAIL_SIGNATURE = (
+    0x4355C47D63924E8A72E509B65029052EB6C299D53A04E167C5775FD466751C9D,
+    0x07299936D304C153F6443DFA05F40FF007D72911B6F72307F996231605B91562,
+    28,
+)
+
+NESTED_ARRAYS = {
+    "types": {
+        "EIP712Domain": [{"name": "name", "type": "string"}],
+        "Point": [{"name": "x", "type": "uint256"}],
+        "Path": [
+            {"name": "grid", "type": "Point[][]"},
+            {"name": "tags", "type": "string[2][]"},
+        ],
+    },
+    "primaryType": "Path",
+    "domain": {"name": "Paths"},
+    "message": {
+        "grid": [[{"x": 1}, {"x": 2}], [{"x": 3}]],
+        "tags": [["a", "b"], ["c", "d"]],
+    },
+}
+
+
+def reference_digest(typed_data: dict) -> str:
+    signable = encode_typed_data(full_message=typed_data)
+
+    return keccak(b"\x19" + signable.version + signable.header + signable.body).hex()
+
+
+def test_mail_vector():
+    digest = hash_typed_data(MAIL)
+
+    assert digest.hex() == MAIL_DIGEST
+    signature = Account.signHash(digest, keccak(text="cow"))
+    assert (signature.r, signature.s, signature.v) == MAIL_SIGNATURE
+
+
+def test_domain_type_derived_from_domain():
+    typed_data = copy.deepcopy(MAIL)
+    del typed_data["types"]["EIP712Domain"]
+
+    assert hash_typed_data(typed_data).hex() == MAIL_DIGEST
+
+
+def test_domain_primary_type():
+    typed_data = dict(MAIL, primaryType="EIP712Domain", message={})
+
+    assert hash_typed_data(typed_data) == keccak(
+        b"\x19\x01" + bytes.fromhex(MAIL_DOMAIN_SEPARATOR)
+    )
+
+
+def test_undefined_primary_type():
+    with pytest.raises(ValueError, match="primaryType Letter not defined"):
+        hash_typed_data(dict(MAIL, primaryType="Letter"))
+
+
+def test_nested_arrays():
+    assert hash_typed_data(NESTED_ARRAYS).hex() == reference_digest(NESTED_ARRAYS)
+
+
+def test_fixed_size_array_length():
+    typed_data = copy.deepcopy(NESTED_ARRAYS)
+    typed_data["message"]["tags"][1].append("e")
+
+    with pytest.raises(ValueError, match="expects 2 items"):
+        hash_typed_data(typed_data)
+
+
+def test_sign_typed_data_operation(signing_lambda):
+    response = signing_lambda.lambda_handler(
+        {
+            "operation": "sign_typed_data",
+            "typed_data": MAIL,
+            "key_id": SIGNING_KEY_ID,
+            "sub": SIGNING_SUB,
+        },
+        None,
+    )
+
+    assert response["typed_data_hash"] == MAIL_DIGEST
+    assert (
+        Account._recover_hash(
+            bytes.fromhex(MAIL_DIGEST),
+            signature=to_bytes(hexstr=response["typed_data_signature"]),
+        )
+        == Account.from_key(SIGNING_PRIVATE_KEY).address
+    )
@@ -0,0 +1,95 @@
+#  Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#  SPDX-License-Identifier: MIT-0
+from eth_account import Account
+from eth_utils import keccak, to_bytes
+
+from userop import eth_signed_message_hash, hash_userop
+
+from tests.unit.conftest import (
+    ENTRYPOINT_ADDRESS,
+    SIGNING_KEY_ID,
+    SIGNING_PRIVATE_KEY,
+    SIGNING_SUB,
+)
+from tests.unit.dev_chain import CHAIN_ID
+
+USEROP = {
+    "sender": "0x7BC12c4D795e513E7C86a720FC577d22b587Be05",
+    "nonce": "0x0",
+    "initCode": "0x",
+    "callData": "0xb61d27f6",
+    "callGasLimit": "0x88b8",
+    "verificationGasLimit": "0x11170",
+    "preVerificationGas": "0xb7d8",
+    "maxFeePerGas": "0x77359400",
+    "maxPriorityFeePerGas": "0x3b9aca00",
+    "paymasterAndData": "0x",
+    "signature": "0x",
+}
+
+
+def word(value: int) -> bytes:
+    return value.to_bytes(32, "big")
+
+
+def reference_userop_hash(userop: dict, entrypoint: str, chain_id: int) -> bytes:
+    # abi encoding of UserOperationLib.pack and getUserOpHash spelled out word by word
+    packed = (
+        word(int(userop["sender"], 16))
+        + word(int(userop["nonce"], 16))
+        + keccak(to_bytes(hexstr=userop["initCode"]))
+        + keccak(to_bytes(hexstr=userop["callData"]))
+        + word(int(userop["callGasLimit"], 16))
+        + word(int(userop["verificationGasLimit"], 16))
+        + word(int(userop["preVerificationGas"], 16))
+        + word(int(userop["maxFeePerGas"], 16))
+        + word(int(userop["maxPriorityFeePerGas"], 16))
+        + keccak(to_bytes(hexstr=userop["paymasterAndData"]))
+    )
+
+    return keccak(keccak(packed) + word(int(entrypoint, 16)) + word(chain_id))
+
+
+def test_hash_userop():
+    assert hash_userop(USEROP, ENTRYPOINT_ADDRESS, 1) == reference_userop_hash(
+        USEROP, ENTRYPOINT_ADDRESS, 1
+    )
+    # decimal strings and ints encode the same quantities
+    assert hash_userop(
+        dict(USEROP, nonce=0, callGasLimit=str(0x88B8)), ENTRYPOINT_ADDRESS, 1
+    ) == hash_userop(USEROP, ENTRYPOINT_ADDRESS, 1)
+
+
+def test_sign_userop_struct_back_to_back(signing_lambda, dev_chain):
+    signing_lambda.ssm.parameters["/web3/rpc_endpoint"] = dev_chain.url
+    signer = Account.from_key(SIGNING_PRIVATE_KEY).address
+
+    responses = []
+    for nonce in ["0x0", "0x1"]:
+        userop = dict(USEROP, nonce=nonce)
+        response = signing_lambda.lambda_handler(
+            {
+                "operation": "sign_userop_struct",
+                "userop": userop,
+                "key_id": SIGNING_KEY_ID,
+                "sub": SIGNING_SUB,
+            },
+            None,
+        )
+
+        userop_hash = reference_userop_hash(userop, ENTRYPOINT_ADDRESS, CHAIN_ID)
+        assert response["userop_hash"] == userop_hash.hex()
+        assert response["chain_id"] == CHAIN_ID
+        assert (
+            Account._recover_hash(
+                eth_signed_message_hash(userop_hash),
+                signature=to_bytes(hexstr=response["userop_hash_signature"]),
+            )
+            == signer
+        )
+        responses.append(response)
+
+    # different structs must not be served from the same idempotency record
+    assert (
+        responses[0]["userop_hash_signature"] != responses[1]["userop_hash_signature"]
+    )
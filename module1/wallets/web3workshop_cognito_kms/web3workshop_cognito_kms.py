@@ -9,6 +9,11 @@ from aws_cdk import (
     aws_lambda as lambda_,
     aws_dynamodb as ddb,
     aws_lambda_python_alpha as lambda_python,
+    aws_lambda_event_sources as lambda_event_sources,
+    aws_sqs as sqs,
+    aws_events as events,
+    aws_events_targets as events_targets,
+    aws_s3 as s3,
     Fn,
     aws_kms as kms,
     PhysicalName,
@@ -47,6 +52,35 @@ class Web3WorkshopCognitoKMSStack(Stack):
             )
         )
 
+        # inputs for the offline (CREATE2) counterfactual address calculation
+        ssm_aa_address_mode_parameter = ssm.StringParameter.from_string_parameter_name(
+            self,
+            "ssmAAAddressModeParameter",
+            string_parameter_name="/web3/aa/address_mode",
+        )
+
+        ssm_aa_account_salt_parameter = ssm.StringParameter.from_string_parameter_name(
+            self,
+            "ssmAAAccountSaltParameter",
+            string_parameter_name="/web3/aa/account_salt",
+        )
+
+        ssm_aa_account_implementation_address_parameter = (
+            ssm.StringParameter.from_string_parameter_name(
+                self,
+                "ssmAAAccountImplementationAddressParameter",
+                string_parameter_name="/web3/aa/account_implementation_address",
+            )
+        )
+
+        ssm_aa_account_proxy_creation_code_parameter = (
+            ssm.StringParameter.from_string_parameter_name(
+                self,
+                "ssmAAAccountProxyCreationCodeParameter",
+                string_parameter_name="/web3/aa/account_proxy_creation_code",
+            )
+        )
+
         ssm_log_level_parameter = ssm.StringParameter.from_string_parameter_name(
             self,
             "ssmLogLevelParameter",
@@ -89,6 +123,37 @@ class Web3WorkshopCognitoKMSStack(Stack):
             compatible_runtimes=[lambda_.Runtime.PYTHON_3_9],
         )
 
+        # helper modules of the web3 layer without its dependencies, for Lambdas that only use boto3
+        shared_helpers_layer = lambda_python.PythonLayerVersion(
+            self,
+            "lambdaSharedHelpersLayer",
+            entry="lib/lambda/web3_layer",
+            compatible_runtimes=[lambda_.Runtime.PYTHON_3_9],
+            bundling=lambda_python.BundlingOptions(
+                asset_excludes=["requirements.txt", "rpc_providers.py"]
+            ),
+        )
+
+        # pre-generated data key pairs claimed on the first login of new users
+        key_pool_table = ddb.Table(
+            self,
+            "kmsKeyPool",
+            partition_key=ddb.Attribute(name="slot", type=ddb.AttributeType.NUMBER),
+            encryption=ddb.TableEncryption.AWS_MANAGED,
+            removal_policy=RemovalPolicy.DESTROY,
+            point_in_time_recovery=True,
+        )
+        # filled slots only, claims query it instead of probing slots at random
+        key_pool_table.add_global_secondary_index(
+            index_name="availableSlots",
+            partition_key=ddb.Attribute(
+                name="pool_state", type=ddb.AttributeType.STRING
+            ),
+            sort_key=ddb.Attribute(name="slot", type=ddb.AttributeType.NUMBER),
+            projection_type=ddb.ProjectionType.KEYS_ONLY,
+        )
+        key_pool_size = "100"
+
         kms_key_management_lambda = lambda_python.PythonFunction(
             self,
             "kmsKeyManagementLambda",
@@ -101,14 +166,101 @@ class Web3WorkshopCognitoKMSStack(Stack):
             environment={
                 "LOG_LEVEL_SSM_PARAM": ssm_log_level_parameter.parameter_name,
                 "KMS_KEY_ID": kms_key.key_id,
+                "KEY_POOL_TABLE": key_pool_table.table_name,
+                "KEY_POOL_SIZE": key_pool_size,
             },
             layers=[web3_dependency_layer],
         )
         kms_key.grant(
-            kms_key_management_lambda, "kms:GenerateDataKeyPairWithoutPlaintext"
+            kms_key_management_lambda,
+            "kms:GenerateDataKeyPairWithoutPlaintext",
+            "kms:ReEncryptFrom",
+            "kms:ReEncryptTo",
         )
+        key_pool_table.grant_read_write_data(kms_key_management_lambda)
         ssm_log_level_parameter.grant_read(kms_key_management_lambda)
 
+        key_pool_refill_lambda = lambda_python.PythonFunction(
+            self,
+            "kmsKeyPoolRefillLambda",
+            entry="lib/lambda/kms_key_management",
+            handler="refill_handler",
+            index="lambda_function.py",
+            runtime=lambda_.Runtime.PYTHON_3_9,
+            timeout=Duration.minutes(5),
+            memory_size=256,
+            environment={
+                "LOG_LEVEL_SSM_PARAM": ssm_log_level_parameter.parameter_name,
+                "KMS_KEY_ID": kms_key.key_id,
+                "KEY_POOL_TABLE": key_pool_table.table_name,
+                "KEY_POOL_SIZE": key_pool_size,
+                "KEY_POOL_REFILL_WORKERS": "8",
+            },
+            layers=[web3_dependency_layer],
+            # a single refill run at a time, runs overlapping the schedule would only race on the same slots
+            reserved_concurrent_executions=1,
+        )
+        kms_key.grant(key_pool_refill_lambda, "kms:GenerateDataKeyPairWithoutPlaintext")
+        key_pool_table.grant_read_write_data(key_pool_refill_lambda)
+        ssm_log_level_parameter.grant_read(key_pool_refill_lambda)
+
+        events.Rule(
+            self,
+            "kmsKeyPoolRefillSchedule",
+            schedule=events.Schedule.rate(Duration.minutes(5)),
+            targets=[events_targets.LambdaFunction(key_pool_refill_lambda)],
+        )
+
+        # manifests (subs) and checkpoints of bulk key provisioning runs for user migrations
+        key_provisioning_bucket = s3.Bucket(
+            self,
+            "keyProvisioningManifests",
+            encryption=s3.BucketEncryption.S3_MANAGED,
+            block_public_access=s3.BlockPublicAccess.BLOCK_ALL,
+            enforce_ssl=True,
+            removal_policy=RemovalPolicy.DESTROY,
+        )
+
+        key_bulk_provisioning_lambda = lambda_python.PythonFunction(
+            self,
+            "kmsKeyBulkProvisioningLambda",
+            entry="lib/lambda/kms_key_management",
+            handler="bulk_provision_handler",
+            index="lambda_function.py",
+            runtime=lambda_.Runtime.PYTHON_3_9,
+            timeout=Duration.minutes(15),
+            memory_size=1024,
+            environment={
+                "LOG_LEVEL_SSM_PARAM": ssm_log_level_parameter.parameter_name,
+                "KMS_KEY_ID": kms_key.key_id,
+                "KMS_KEY_TABLE": kms_key_table.table_name,
+                "KEY_MAPPING_TABLE": key_mapping_table.table_name,
+                "BULK_PROVISION_WORKERS": "16",
+                "BULK_PROVISION_CHUNK_SIZE": "250",
+            },
+            layers=[web3_dependency_layer],
+            # concurrent runs would share the KMS request quota and slow each other down
+            reserved_concurrent_executions=1,
+        )
+        kms_key.grant(
+            key_bulk_provisioning_lambda, "kms:GenerateDataKeyPairWithoutPlaintext"
+        )
+        kms_key_table.grant_write_data(key_bulk_provisioning_lambda)
+        key_mapping_table.grant_read_write_data(key_bulk_provisioning_lambda)
+        key_provisioning_bucket.grant_read_write(key_bulk_provisioning_lambda)
+        ssm_log_level_parameter.grant_read(key_bulk_provisioning_lambda)
+
+        # nonce cursors per (account, nonce key) for parallel user operations of the same smart account
+        nonce_table = ddb.Table(
+            self,
+            "aaNonceTable",
+            partition_key=ddb.Attribute(name="account", type=ddb.AttributeType.STRING),
+            sort_key=ddb.Attribute(name="nonce_key", type=ddb.AttributeType.STRING),
+            encryption=ddb.TableEncryption.AWS_MANAGED,
+            removal_policy=RemovalPolicy.DESTROY,
+            point_in_time_recovery=True,
+        )
+
         aa_processing_lambda = lambda_python.PythonFunction(
             self,
             "aaProcessingLambda",
@@ -124,6 +276,11 @@ class Web3WorkshopCognitoKMSStack(Stack):
                 "RPC_ENDPOINT_SSM_PARAM": ssm_rpc_endpoint_parameter.parameter_name,
                 "AA_ACCOUNT_FACTORY_ADDRESS_SSM_PARAM": ssm_aa_account_factory_address_parameter.parameter_name,
                 "AA_ENTRYPOINT_ADDRESS_SSM_PARAM": ssm_aa_entrypoint_address_parameter.parameter_name,
+                "AA_ADDRESS_MODE_SSM_PARAM": ssm_aa_address_mode_parameter.parameter_name,
+                "AA_ACCOUNT_SALT_SSM_PARAM": ssm_aa_account_salt_parameter.parameter_name,
+                "AA_ACCOUNT_IMPLEMENTATION_ADDRESS_SSM_PARAM": ssm_aa_account_implementation_address_parameter.parameter_name,
+                "AA_ACCOUNT_PROXY_CREATION_CODE_SSM_PARAM": ssm_aa_account_proxy_creation_code_parameter.parameter_name,
+                "NONCE_TABLE": nonce_table.table_name,
             },
             layers=[web3_dependency_layer],
         )
@@ -133,6 +290,22 @@ class Web3WorkshopCognitoKMSStack(Stack):
         ssm_rpc_endpoint_parameter.grant_read(aa_processing_lambda)
         ssm_aa_account_factory_address_parameter.grant_read(aa_processing_lambda)
         ssm_aa_entrypoint_address_parameter.grant_read(aa_processing_lambda)
+        ssm_aa_address_mode_parameter.grant_read(aa_processing_lambda)
+        ssm_aa_account_salt_parameter.grant_read(aa_processing_lambda)
+        ssm_aa_account_implementation_address_parameter.grant_read(aa_processing_lambda)
+        ssm_aa_account_proxy_creation_code_parameter.grant_read(aa_processing_lambda)
+        nonce_table.grant_read_write_data(aa_processing_lambda)
+
+        # idempotency records of the signing lambda - absorbs client retries without additional key decryption
+        signing_idempotency_table = ddb.Table(
+            self,
+            "signingIdempotency",
+            partition_key=ddb.Attribute(name="id", type=ddb.AttributeType.STRING),
+            encryption=ddb.TableEncryption.AWS_MANAGED,
+            removal_policy=RemovalPolicy.DESTROY,
+            point_in_time_recovery=True,
+            time_to_live_attribute="expiration",
+        )
 
         userop_tx_signing_lambda = lambda_python.PythonFunction(
             self,
@@ -146,8 +319,13 @@ class Web3WorkshopCognitoKMSStack(Stack):
             environment={
                 "LOG_LEVEL_SSM_PARAM": ssm_log_level_parameter.parameter_name,
                 "RPC_ENDPOINT_SSM_PARAM": ssm_rpc_endpoint_parameter.parameter_name,
+                "AA_ENTRYPOINT_ADDRESS_SSM_PARAM": ssm_aa_entrypoint_address_parameter.parameter_name,
                 "KMS_KEY_TABLE": kms_key_table.table_name,
                 "KMS_KEY_ID": kms_key.key_id,
+                "SIGNING_ACCOUNT_CACHE_TTL_SECONDS": "30",
+                "SIGNING_ACCOUNT_CACHE_MAX_ENTRIES": "256",
+                "IDEMPOTENCY_TABLE": signing_idempotency_table.table_name,
+                "IDEMPOTENCY_TTL_SECONDS": "300",
             },
             layers=[web3_dependency_layer],
         )
@@ -158,6 +336,73 @@ class Web3WorkshopCognitoKMSStack(Stack):
         ssm_aa_entrypoint_address_parameter.grant_read(userop_tx_signing_lambda)
         kms_key_table.grant_read_data(userop_tx_signing_lambda)
         kms_key.grant_decrypt(userop_tx_signing_lambda)
+        signing_idempotency_table.grant_read_write_data(userop_tx_signing_lambda)
+
+        # asynchronous bulk signing (airdrops, batched mints) via sqs
+        signing_results_table = ddb.Table(
+            self,
+            "signingResults",
+            partition_key=ddb.Attribute(
+                name="request_id", type=ddb.AttributeType.STRING
+            ),
+            encryption=ddb.TableEncryption.AWS_MANAGED,
+            removal_policy=RemovalPolicy.DESTROY,
+            point_in_time_recovery=True,
+            time_to_live_attribute="expires_at",
+        )
+
+        signing_request_dlq = sqs.Queue(
+            self,
+            "signingRequestDLQ",
+            encryption=sqs.QueueEncryption.SQS_MANAGED,
+            enforce_ssl=True,
+            retention_period=Duration.days(14),
+        )
+
+        signing_request_queue = sqs.Queue(
+            self,
+            "signingRequestQueue",
+            encryption=sqs.QueueEncryption.SQS_MANAGED,
+            enforce_ssl=True,
+            # at least 6 times the consumer timeout as recommended for lambda event sources
+            visibility_timeout=Duration.minutes(12),
+            dead_letter_queue=sqs.DeadLetterQueue(
+                max_receive_count=3, queue=signing_request_dlq
+            ),
+        )
+
+        signing_queue_consumer_lambda = lambda_python.PythonFunction(
+            self,
+            "signingQueueConsumerLambda",
+            entry="lib/lambda/userop_tx_signing",
+            handler="sqs_handler",
+            index="lambda_function.py",
+            runtime=lambda_.Runtime.PYTHON_3_9,
+            timeout=Duration.minutes(2),
+            memory_size=256,
+            environment={
+                "LOG_LEVEL_SSM_PARAM": ssm_log_level_parameter.parameter_name,
+                "KMS_KEY_TABLE": kms_key_table.table_name,
+                "KMS_KEY_ID": kms_key.key_id,
+                "SIGNING_RESULTS_TABLE": signing_results_table.table_name,
+                # throttled messages are made visible again with an exponential backoff
+                "SIGNING_REQUEST_QUEUE_URL": signing_request_queue.queue_url,
+            },
+            layers=[web3_dependency_layer],
+        )
+        signing_queue_consumer_lambda.add_event_source(
+            lambda_event_sources.SqsEventSource(
+                signing_request_queue,
+                batch_size=100,
+                max_batching_window=Duration.seconds(5),
+                report_batch_item_failures=True,
+            )
+        )
+
+        ssm_log_level_parameter.grant_read(signing_queue_consumer_lambda)
+        kms_key_table.grant_read_data(signing_queue_consumer_lambda)
+        kms_key.grant_decrypt(signing_queue_consumer_lambda)
+        signing_results_table.grant_write_data(signing_queue_consumer_lambda)
 
         pre_token_gen_lambda = lambda_python.PythonFunction(
             self,
@@ -171,10 +416,23 @@ class Web3WorkshopCognitoKMSStack(Stack):
             environment={
                 "LOG_LEVEL_SSM_PARAM": ssm_log_level_parameter.parameter_name,
                 "KEY_MODE": "KMS",
+                # returning users are resolved from the tables directly, the state machine handles new users
+                "KEY_MAPPING_TABLE": key_mapping_table.table_name,
+                "KMS_KEY_TABLE": kms_key_table.table_name,
+                "AA_ACCOUNT_FACTORY_ADDRESS_SSM_PARAM": ssm_aa_account_factory_address_parameter.parameter_name,
+                "AA_ENTRYPOINT_ADDRESS_SSM_PARAM": ssm_aa_entrypoint_address_parameter.parameter_name,
+                "AA_ACCOUNT_SALT_SSM_PARAM": ssm_aa_account_salt_parameter.parameter_name,
             },
+            # TTL cached SSM parameters, the trigger does not load the web3 dependencies
+            layers=[shared_helpers_layer],
         )
         self.pre_token_gen_lambda = pre_token_gen_lambda
         ssm_log_level_parameter.grant_read(pre_token_gen_lambda)
+        ssm_aa_account_factory_address_parameter.grant_read(pre_token_gen_lambda)
+        ssm_aa_entrypoint_address_parameter.grant_read(pre_token_gen_lambda)
+        ssm_aa_account_salt_parameter.grant_read(pre_token_gen_lambda)
+        key_mapping_table.grant_read_data(pre_token_gen_lambda)
+        kms_key_table.grant_read_data(pre_token_gen_lambda)
 
         pre_token_gen_express_sf = JWTStepFunctionConstruct(
             self,
@@ -184,11 +442,18 @@ class Web3WorkshopCognitoKMSStack(Stack):
             kms_key_table,
             aa_processing_lambda,
             kms_key_management_lambda,
+            ssm_aa_account_factory_address_parameter,
+            ssm_aa_entrypoint_address_parameter,
+            ssm_aa_account_salt_parameter,
         )
 
         pre_token_gen_express_sf.step_function.grant_start_sync_execution(
             pre_token_gen_lambda
         )
+        # asynchronous account address backfill if the state machine misses the trigger deadline
+        pre_token_gen_express_sf.step_function.grant_start_execution(
+            pre_token_gen_lambda
+        )
 
         # sf to update key storage and mapping table
         kms_key_table.grant_write_data(pre_token_gen_express_sf.step_function)
@@ -235,7 +500,7 @@ class Web3WorkshopCognitoKMSStack(Stack):
             "userPoolAppClient",
             user_pool=user_pool,
             auth_flows=cognito.AuthFlow(user_password=True, user_srp=True),
-            id_token_validity=Duration.days(1)
+            id_token_validity=Duration.days(1),
         )
 
         # unique suffix to avoid duplicates
@@ -283,6 +548,22 @@ class Web3WorkshopCognitoKMSStack(Stack):
         )
         ssm_signing_lambda_arn.node.add_dependency(userop_tx_signing_lambda)
 
+        ssm_signing_request_queue_url = ssm.StringParameter(
+            self,
+            "signingRequestQueueURL",
+            parameter_name="/app/signing/request_queue_url",
+            string_value=signing_request_queue.queue_url,
+        )
+        ssm_signing_request_queue_url.node.add_dependency(signing_request_queue)
+
+        ssm_signing_results_table = ssm.StringParameter(
+            self,
+            "signingResultsTableName",
+            parameter_name="/app/signing/results_table",
+            string_value=signing_results_table.table_name,
+        )
+        ssm_signing_results_table.node.add_dependency(signing_results_table)
+
         ssm_key_mapping_table = ssm.StringParameter(
             self,
             "mappingTableName",
@@ -307,6 +588,14 @@ class Web3WorkshopCognitoKMSStack(Stack):
         )
         ssm_aa_processing_lambda.node.add_dependency(aa_processing_lambda)
 
+        ssm_key_provisioning_bucket = ssm.StringParameter(
+            self,
+            "keyProvisioningBucketName",
+            parameter_name="/app/provisioning/manifest_bucket",
+            string_value=key_provisioning_bucket.bucket_name,
+        )
+        ssm_key_provisioning_bucket.node.add_dependency(key_provisioning_bucket)
+
         NagSuppressions.add_resource_suppressions(
             construct=self,
             suppressions=[
@@ -326,6 +615,10 @@ class Web3WorkshopCognitoKMSStack(Stack):
                     id="AwsSolutions-IAM4",
                     reason="All policies managed by CDK and reflect best practices",
                 ),
+                NagPackSuppression(
+                    id="AwsSolutions-S1",
+                    reason="Provisioning manifest bucket is only accessed by the bulk provisioning Lambda",
+                ),
             ],
             apply_to_children=True,
         )
@@ -76,6 +76,26 @@ class Web3WorkshopNitroIntegrationStack(Stack):
             same_environment=True,
         )
 
+        aa_account_factory_address_parameter = (
+            ssm.StringParameter.from_string_parameter_name(
+                self,
+                "AAAccountFactoryAddressParameter",
+                string_parameter_name="/web3/aa/account_factory_address",
+            )
+        )
+        aa_entrypoint_address_parameter = (
+            ssm.StringParameter.from_string_parameter_name(
+                self,
+                "AAEntrypointAddressParameter",
+                string_parameter_name="/web3/aa/entrypoint_address",
+            )
+        )
+        aa_account_salt_parameter = ssm.StringParameter.from_string_parameter_name(
+            self,
+            "AAAccountSaltParameter",
+            string_parameter_name="/web3/aa/account_salt",
+        )
+
         # todo implicit permissions for invoke lambda
         nitro_sf = NitroJWTStepFunctionConstruct(
             self,
@@ -85,6 +105,9 @@ class Web3WorkshopNitroIntegrationStack(Stack):
             nitro_secrets_table,
             aa_processing_lambda,
             nitro_invoke_lambda,
+            aa_account_factory_address_parameter,
+            aa_entrypoint_address_parameter,
+            aa_account_salt_parameter,
         )
 
         nitro_sf.step_function.grant_start_sync_execution(pre_token_gen_lambda)